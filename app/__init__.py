@@ -2,11 +2,9 @@ import os
 from flask import Flask
 from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 from dotenv import load_dotenv
 from config import Config, DevelopmentConfig, ProductionConfig
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.interval import IntervalTrigger
-import atexit
 
 # Load environment variables from .env
 load_dotenv()
@@ -17,13 +15,18 @@ login_manager.login_view = 'auth.login'
 login_manager.login_message_category = "info"
 
 db = SQLAlchemy()
+migrate = Migrate(render_as_batch=True)  # batch mode so SQLite can alter tables
 
 # Import hard-coded user
 from .user import HARDCODED_USER
 
-def create_app():
+def create_app(check_schema=True):
     app = Flask(__name__)
 
+    # orjson-backed JSON for jsonify/request.json when available
+    from .utils.json_codec import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
     # Pick config based on FLASK_ENV
     config_type = os.getenv("FLASK_ENV", "development").lower()
     config_map = {
@@ -33,6 +36,14 @@ def create_app():
     }
     app.config.from_object(config_map.get(config_type, DevelopmentConfig))
 
+    from .utils import log
+    log.configure(app.config["LOG_LEVEL"], app.config["LOG_FORMAT"], app.config["LOG_DEBUG_SAMPLE"])
+
+    from .utils import product_cache
+    product_cache.configure(
+        app.config["PRODUCT_CACHE_TTL_SECONDS"], app.config["PRODUCT_CACHE_MAX_ENTRIES"], app.config["PRODUCT_CACHE_URL"]
+    )
+
     # Ensure persistent directory exists
     os.makedirs("/var/data", exist_ok=True)
 
@@ -47,6 +58,7 @@ def create_app():
     # Initialize extensions
     login_manager.init_app(app)
     db.init_app(app)
+    migrate.init_app(app, db)
 
     # Flask-Login user loader
     @login_manager.user_loader
@@ -61,36 +73,40 @@ def create_app():
     app.register_blueprint(main)
     app.register_blueprint(auth_bp)
 
-    # Initialize database tables
+    from .utils import profiling
+    profiling.init_app(app)
+
+    # Tables are managed by migrations (create_db.py / `flask db upgrade`)
     with app.app_context():
-        db.create_all()
-
-        # --- Scheduler setup ---
-        from .routes.api import loop_over_all_stores
-        scheduler = BackgroundScheduler()
-
-        # Wrap job inside app.app_context()
-        def job_wrapper():
-            with app.app_context():
-                loop_over_all_stores()
-
-        # ✅ Run once immediately on startup
-        # job_wrapper()
-
-        # Schedule for repeated runs
-        scheduler.add_job(
-            func=job_wrapper,
-            trigger=IntervalTrigger(hours=3),   # change interval as needed
-            id="loop_over_all_stores_job",
-            name="Run loop_over_all_stores every 3 hours",
-            max_instances=1,
-            coalesce=True
-        )
+        from .utils.sync_run import instrument_engine
+        from .utils.sync_plan import instrument_session
+        from .utils import metrics
+        instrument_engine(db.engine)
+        metrics.instrument_engine(db.engine)
+        instrument_session(db.session)
+        if check_schema:
+            _check_schema(app)
 
-        scheduler.start()
-        print("[Scheduler] Started loop_over_all_stores job")
+    return app
 
-        # Shut down scheduler on exit
-        atexit.register(lambda: scheduler.shutdown())
 
-    return app
+def _check_schema(app):
+    """Warn when the database is behind the migrations: queries on the new columns would fail."""
+    from alembic.script import ScriptDirectory
+    from sqlalchemy import inspect, text
+    from .utils.log import get_logger
+    log = get_logger(__name__)
+    try:
+        head = ScriptDirectory(os.path.join(os.path.dirname(app.root_path), "migrations")).get_current_head()
+        with db.engine.connect() as conn:
+            current = None
+            if inspect(conn).has_table("alembic_version"):
+                current = conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except Exception as e:
+        log.warning("Could not check the database schema: %s", e)
+        return
+    if current != head:
+        log.warning(
+            "Database schema is at %s but the code expects %s; run `python create_db.py` to apply the pending migrations",
+            current or "no revision", head
+        )
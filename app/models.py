@@ -1,22 +1,34 @@
+from datetime import datetime, timezone
 from . import db
 from sqlalchemy.dialects.sqlite import JSON
 
+
+def utcnow():
+    # SQLite stores naive datetimes, so keep everything in naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class Shop(db.Model):
     __tablename__ = "shop"
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
     domain = db.Column(db.String(255), unique=True, nullable=False)
+    last_synced_at = db.Column(db.DateTime, nullable=True)  # end of the last full store sync
     products = db.relationship('Product', backref='shop', lazy=True)
 
 
 class Product(db.Model):
     __tablename__ = "product"
+    __table_args__ = (
+        db.Index("ix_product_shop_id_updated_at", "shop_id", "updated_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     shop_id = db.Column(db.Integer, db.ForeignKey('shop.id'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     shopify_id = db.Column(db.String(100), unique=True, nullable=False)  # Shopify product ID
+    updated_at = db.Column(db.DateTime, nullable=True)  # last time the sync changed this product
     variants = db.relationship('Variant', backref='product', lazy=True)
 
 
@@ -24,6 +36,183 @@ class Variant(db.Model):
     __tablename__ = "variant"
 
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     shopify_id = db.Column(db.String(100), unique=True, nullable=False)  # Shopify variant ID
     urls = db.Column(JSON, nullable=True)  # store URLs as a JSON array
+
+
+class SyncRun(db.Model):
+    __tablename__ = "sync_run"
+
+    id = db.Column(db.Integer, primary_key=True)
+    shop_id = db.Column(db.Integer, db.ForeignKey('shop.id'), nullable=True, index=True)
+    store_name = db.Column(db.String(150), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default="running")  # running / succeeded / failed / cancelled
+    started_at = db.Column(db.DateTime, nullable=False, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Work done
+    pages = db.Column(db.Integer, nullable=False, default=0)
+    products = db.Column(db.Integer, nullable=False, default=0)
+    products_changed = db.Column(db.Integer, nullable=False, default=0)
+    uploads = db.Column(db.Integer, nullable=False, default=0)
+    metafield_writes = db.Column(db.Integer, nullable=False, default=0)
+    api_calls = db.Column(db.Integer, nullable=False, default=0)
+    api_cost = db.Column(db.Integer, nullable=False, default=0)  # GraphQL cost points actually used
+    errors = db.Column(JSON, nullable=True)
+
+    # Exclusive wall time per stage, in seconds
+    fetch_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    diff_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    db_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    write_seconds = db.Column(db.Float, nullable=False, default=0.0)
+
+    def to_dict(self):
+        duration = None
+        if self.finished_at:
+            duration = (self.finished_at - self.started_at).total_seconds()
+        return {
+            "id": self.id,
+            "shop_id": self.shop_id,
+            "store_name": self.store_name,
+            "status": self.status,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "duration_seconds": duration,
+            "pages": self.pages,
+            "products": self.products,
+            "products_changed": self.products_changed,
+            "uploads": self.uploads,
+            "metafield_writes": self.metafield_writes,
+            "api_calls": self.api_calls,
+            "api_cost": self.api_cost,
+            "errors": self.errors or [],
+            "stages": {
+                "fetch": self.fetch_seconds,
+                "diff": self.diff_seconds,
+                "db": self.db_seconds,
+                "write": self.write_seconds,
+            },
+        }
+
+
+class Lease(db.Model):
+    """A named, expiring lock held by one process (see app/utils/lease.py)."""
+    __tablename__ = "lease"
+
+    name = db.Column(db.String(150), primary_key=True)  # e.g. "scheduler-leader", "sync:US"
+    owner = db.Column(db.String(255), nullable=False)  # host:pid:token of the holder
+    acquired_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "owner": self.owner,
+            "acquired_at": self.acquired_at.isoformat() if self.acquired_at else None,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+
+class StoreSchedule(db.Model):
+    """Adaptive sync interval of one store (see app/utils/schedule.py)."""
+    __tablename__ = "store_schedule"
+
+    id = db.Column(db.Integer, primary_key=True)
+    domain = db.Column(db.String(255), unique=True, nullable=False)  # same key as Shop.domain
+    store_name = db.Column(db.String(150), nullable=True)
+    interval_seconds = db.Column(db.Integer, nullable=False)
+    next_run_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_run_at = db.Column(db.DateTime, nullable=True)
+
+    # Smoothed rates, per hour, between full syncs
+    change_rate = db.Column(db.Float, nullable=False, default=0.0)  # changes the sync had to make
+    webhook_rate = db.Column(db.Float, nullable=False, default=0.0)  # product webhooks received
+    webhooks_since_run = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "domain": self.domain,
+            "store_name": self.store_name,
+            "interval_seconds": self.interval_seconds,
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "change_rate_per_hour": round(self.change_rate, 3),
+            "webhook_rate_per_hour": round(self.webhook_rate, 3),
+            "webhooks_since_run": self.webhooks_since_run,
+        }
+
+
+class Job(db.Model):
+    """A unit of queued work run by the worker (see app/utils/jobs.py)."""
+    __tablename__ = "job"
+    __table_args__ = (
+        db.Index("ix_job_status_priority_id", "status", "priority", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # handler name, e.g. "sync_store"
+    priority = db.Column(db.Integer, nullable=False)  # 0 interactive, 1 webhook, 2 periodic
+    store_key = db.Column(db.String(50), nullable=True)  # key into STORES
+    payload = db.Column(JSON, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued / running / succeeded / failed / cancelled
+    result = db.Column(JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(255), nullable=True)  # lease owner of the process running it
+    enqueued_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    progress = db.Column(JSON, nullable=True)  # e.g. pages, products, products_total (see jobs.progress)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+
+    @property
+    def finished(self):
+        return self.status not in ("queued", "running")
+
+    def eta_seconds(self):
+        """Remaining time at the products/second rate so far, if it can be told."""
+        progress = self.progress or {}
+        done, total = progress.get("products", 0), progress.get("products_total")
+        if self.status != "running" or not self.started_at or not done or not total:
+            return None
+        elapsed = (utcnow() - self.started_at).total_seconds()
+        return round(max(total - done, 0) * elapsed / done, 1)
+
+    def to_dict(self):
+        wait = None
+        if self.started_at:
+            wait = (self.started_at - self.enqueued_at).total_seconds()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "priority": self.priority,
+            "store_key": self.store_key,
+            "payload": self.payload,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "enqueued_at": self.enqueued_at.isoformat() if self.enqueued_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "wait_seconds": wait,
+            "progress": self.progress or {},
+            "eta_seconds": self.eta_seconds(),
+            "cancel_requested": self.cancel_requested,
+        }
+
+
+class JobEvent(db.Model):
+    """A progress event of a job, streamed to the UI (see /api/jobs/<id>/events)."""
+    __tablename__ = "job_event"
+    __table_args__ = (
+        db.Index("ix_job_event_job_id_id", "job_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.id'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)  # page / product / upload / metafield / dropped
+    data = db.Column(JSON, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {"id": self.id, "kind": self.kind, "data": self.data or {}, "at": self.created_at.isoformat()}
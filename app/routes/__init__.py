@@ -2,4 +2,4 @@ from flask import Blueprint
 
 main = Blueprint('main', __name__)
 
-from . import index, api, products, about, guidelines
\ No newline at end of file
+from . import index, api, products, about, guidelines, metrics
\ No newline at end of file
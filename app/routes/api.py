@@ -1,53 +1,118 @@
+import time
 from app.graphql_queries.query_builders.query_builders import AllProductQueryBuilder, ProductQueryBuilder
-from app.models import Shop
-from app.utils.helper import STORES, ShopifyGIDBuilder, ShopifyProductBuilder, fetch_single_product, shopify_request
+from app import db
+from app.models import Job, Product, Shop, SyncRun, utcnow
+from app.utils.helper import STORES, ShopifyGIDBuilder, ShopifyProductBuilder, fetch_single_product, response_json, shopify_request
 from . import main
-from flask import jsonify, request
-from app.utils.response import success_response, error_response
+from flask import Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy.orm import selectinload
+from app.utils.response import error_result, error_response, job_response, success_result, success_response
+from app.utils import bulk, jobs, json_codec, lease, product_cache, profiling, schedule, sharding, sync_plan, sync_run, tracing
+from app.utils.log import context as log_context, get_logger
+
+log = get_logger(__name__)
 
 @main.route('/api/print', methods=['POST'])
 def print_api():
-    print('API button was clicked!')
-    loop_over_all_stores()
-    return jsonify({"message": "API button was clicked!"}), 200
-
-    shops_data = []
-
-    shops = Shop.query.all()
-    for shop in shops:
-        shop_dict = {
-            "id": shop.id,
-            "name": shop.name,
-            "domain": shop.domain,
-            "products": []
-        }
+    """Queue a sync of every store in the background; poll /api/jobs/<id> for progress.
+
+    One sync_store job per store, at periodic priority like the scheduled
+    syncs, so webhook resyncs still go first and JOB_STORE_CONCURRENCY
+    applies. ``{"profile": true}`` in the body profiles the syncs (see
+    app/utils/profiling.py).
+    """
+    log.info("Sync of all stores requested")
+    payload = {"profile": True} if (request.get_json(silent=True) or {}).get("profile") else None
+    store_jobs = [
+        jobs.pending("sync_store", key) or jobs.enqueue("sync_store", key, payload=payload, priority="periodic")
+        for key, store in STORES.items() if store.get("url")
+    ]
+    return success_response(
+        message="Sync of all stores started.",
+        data={"job_ids": [job.id for job in store_jobs], "job_statuses": [job.status for job in store_jobs]},
+        code=202
+    )
 
-        for product in shop.products:
-            product_dict = {
-                "id": product.id,
-                "title": product.title,
-                "shopify_id": product.shopify_id,
-                "variants": []
-            }
-
-            for variant in product.variants:
-                variant_dict = {
-                    "id": variant.id,
-                    "shopify_id": variant.shopify_id,
-                    "urls": variant.urls
+CATALOG_BATCH_SIZE = 200
+CATALOG_MAX_LIMIT = 5000
+
+@main.route('/api/catalog', methods=['GET'])
+def catalog_dump():
+    """Stream the local mirror as JSON, one product batch at a time.
+
+    Query params: ``store`` (store key, e.g. shop1) or ``shop_id`` to filter,
+    ``limit`` for the page size (omit for the whole mirror) and ``after``
+    (product id from the previous page's ``next_after``).
+    """
+    shops_query = Shop.query.order_by(Shop.id)
+    store_key = request.args.get('store')
+    if store_key:
+        store = STORES.get(store_key)
+        if not store:
+            return error_response(f"Store '{store_key}' not configured.", 404)
+        shops_query = shops_query.filter(Shop.domain == store['url'])
+    shop_id = request.args.get('shop_id', type=int)
+    if shop_id is not None:
+        shops_query = shops_query.filter(Shop.id == shop_id)
+
+    limit = request.args.get('limit', type=int)
+    if limit is not None and not 0 < limit <= CATALOG_MAX_LIMIT:
+        return error_response(f"limit must be between 1 and {CATALOG_MAX_LIMIT}", 400)
+    after = request.args.get('after', 0, type=int)
+
+    shops = [{"id": shop.id, "name": shop.name, "domain": shop.domain} for shop in shops_query.all()]
+    shop_ids = [shop["id"] for shop in shops]
+
+    def generate():
+        yield '{"ok": true, "shops": ' + json_codec.dumps(shops) + ', "products": ['
+        cursor, sent, last_id = after, 0, None
+        while shop_ids:
+            batch_size = CATALOG_BATCH_SIZE if limit is None else min(CATALOG_BATCH_SIZE, limit - sent)
+            if batch_size <= 0:
+                break
+            # Keyset paging plus selectinload: one query for the products and
+            # one for all of their variants per batch.
+            batch = (
+                Product.query
+                .options(selectinload(Product.variants))
+                .filter(Product.shop_id.in_(shop_ids), Product.id > cursor)
+                .order_by(Product.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+            chunk = []
+            for product in batch:
+                product_dict = {
+                    "id": product.id,
+                    "shop_id": product.shop_id,
+                    "title": product.title,
+                    "shopify_id": product.shopify_id,
+                    "variants": [
+                        {"id": variant.id, "shopify_id": variant.shopify_id, "urls": variant.urls}
+                        for variant in product.variants
+                    ]
                 }
-                product_dict["variants"].append(variant_dict)
-
-            shop_dict["products"].append(product_dict)
-
-        shops_data.append(shop_dict)
-
-    return jsonify({
-        "ok": True,
-        "shops": shops_data
-    }), 200
-
-def fetch_all_products(store, limit=250, after=None, before=None):
+                chunk.append(json_codec.dumps(product_dict))
+            yield (',' if sent else '') + ','.join(chunk)
+            sent += len(batch)
+            cursor = last_id = batch[-1].id
+            # Drop the batch from the identity map so memory stays flat
+            db.session.expunge_all()
+            if len(batch) < batch_size:
+                last_id = None
+                break
+        # A full page is only followed by another if one more product exists
+        more = limit is not None and sent == limit and db.session.query(Product.id).filter(
+            Product.shop_id.in_(shop_ids), Product.id > cursor
+        ).first() is not None
+        next_after = last_id if more else None
+        yield '], "count": ' + str(sent) + ', "next_after": ' + json_codec.dumps(next_after) + '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def fetch_all_products(store, limit=250, after=None, before=None, query=None):
     builder = AllProductQueryBuilder()
     graphql_query = builder.build(
         include_media=True,
@@ -58,6 +123,7 @@ def fetch_all_products(store, limit=250, after=None, before=None):
     products = []
     has_next_page = True
     after_cursor = after  # Start cursor (None by default)
+    first_page = True
 
     while has_next_page:
         variables = {
@@ -65,23 +131,35 @@ def fetch_all_products(store, limit=250, after=None, before=None):
             "last": limit if before else None,
             "after": after_cursor,
             "before": before,
+            "query": query,
         }
 
-        response = shopify_request(
-            query=graphql_query,
-            shop_url=store["url"],
-            access_token=store["token"],
-            variables=variables
-        )
-        json_data = response.json()
-
-        if "errors" in json_data:
-            raise Exception(f"Shopify API error: {json_data['errors']}")
-
-        # Add products from this page
-        for edge in json_data['data']['products']['edges']:
-            product = ShopifyProductBuilder(edge['node'], store)
-            products.append(product)
+        with tracing.trace("fetch_products_page", "sync", store=store["name"], after=after_cursor):
+            response = shopify_request(
+                query=graphql_query,
+                shop_url=store["url"],
+                access_token=store["token"],
+                variables=variables
+            )
+            json_data = response_json(response)
+
+            if "errors" in json_data:
+                raise Exception(f"Shopify API error: {json_data['errors']}")
+
+            # Add products from this page
+            with sync_run.stage("fetch"):
+                for edge in json_data['data']['products']['edges']:
+                    product = ShopifyProductBuilder(edge['node'], store)
+                    products.append(product)
+            tracing.tag(products=len(json_data['data']['products']['edges']))
+        sync_run.count("pages")
+        if first_page:
+            # Size the job's progress bar from the listing's total
+            jobs.advance("products_total", (json_data['data'].get('productsCount') or {}).get('count', 0))
+            first_page = False
+        jobs.advance("pages")
+        jobs.emit("page", store=store["name"], products=len(json_data['data']['products']['edges']))
+        jobs.checkpoint()
 
         # Pagination info
         page_info = json_data['data']['products']['pageInfo']
@@ -90,11 +168,257 @@ def fetch_all_products(store, limit=250, after=None, before=None):
 
     return products
 
+@profiling.profiled("sync")
 def loop_over_all_stores():
-    for store in STORES.values():
-        products = fetch_all_products(store)
-        for product in products:
+    stores = [store for store in STORES.values() if store.get("url")]
+    jobs.progress(stores_total=len(stores), stores_done=0)
+    for store in stores:
+        jobs.progress(store=store["name"])
+        sync_store(store)
+        jobs.advance("stores_done")
+
+def sync_due_stores():
+    """Queue a sync of every store whose adaptive interval has elapsed.
+
+    A store that fails here is logged and skipped; the others are still checked.
+    """
+    for key, store in STORES.items():
+        if not store.get("url"):
+            continue
+        try:
+            if schedule.is_due(store) and not jobs.pending("sync_store", key):
+                jobs.enqueue("sync_store", key, priority="periodic")
+        except Exception as e:
+            db.session.rollback()
+            log.error("Could not check whether %s is due: %s", store.get("name") or key, e)
+
+def sync_products(store, query=None):
+    for product in fetch_all_products(store, query=query):
+        with tracing.trace("sync_product", "sync", store=store["name"], product=product.product_id):
+            saved = product.save_product_with_variants()
+        sync_run.count("products")
+        jobs.advance("products")
+        jobs.emit("product", id=product.product_data.get("id"), title=product.product_data.get("title"), saved=bool(saved))
+        jobs.checkpoint()
+
+def sync_shard(store, query):
+    """One shard of a sharded store sync; runs in a shard worker process."""
+    with sync_run.collect_run(store) as tracker:
+        sync_products(store, query)
+    return tracker.snapshot()
+
+@jobs.handler("sync_store")
+def sync_store_job(store, payload):
+    synced = sync_store(store)
+    return success_result(message="Store synced" if synced else "Store is already being synced elsewhere")
+
+@profiling.profiled("sync")
+def sync_store(store, shards=None):
+    """Full sync of one store, unless another process is already syncing it.
+
+    With more than one shard (SYNC_SHARDS) the catalog is split by product ID
+    and the shards are synced in parallel processes, reported as one run.
+    """
+    shards = shards or current_app.config["SYNC_SHARDS"]
+    with lease.hold_lease(f"sync:{store['url']}") as held:
+        if held is None:
+            log.info("%s is already being synced elsewhere, skipping", store['name'])
+            return False
+        try:
+            with log_context(store=store["name"]), sync_run.track_sync_run(store) as tracker:
+                queries = sharding.plan_shards(store, shards)
+                if len(queries) == 1:
+                    sync_products(store)
+                else:
+                    failed = 0
+                    for query, result in zip(queries, sharding.run_shards(store, queries, sync_shard)):
+                        if isinstance(result, Exception):
+                            failed += 1
+                            tracker.error(f"Shard '{query}' failed: {result}")
+                        else:
+                            tracker.merge(result)
+                    if failed:
+                        raise Exception(f"{failed} of {len(queries)} shards failed")
+        except Exception:
+            schedule.record_failure(store)
+            raise
+        mark_store_synced(store)
+        schedule.record_sync(store, tracker.counts["products_changed"])
+    return True
+
+def plan_store_sync(store):
+    """Dry run of one store sync: fetch and diff every product, write nothing."""
+    with sync_plan.planning() as plan:
+        for product in fetch_all_products(store):
+            product.save_product_with_variants()
+            plan.products += 1
+    return plan
+
+def plan_single_product(store, product_gid, action="populate"):
+    """Dry run of the populate (save) or delete path for one product."""
+    builder = ProductQueryBuilder()
+    query = builder.build(include_media=True, variants_limit=100, include_filled_variant_images_assets=False)
+    with sync_plan.planning() as plan:
+        product = fetch_single_product(query, {"id": product_gid}, store)
+        if isinstance(product, dict) and "errors" in product:
+            raise Exception(f"Shopify API error: {product['errors']}")
+        if not product.product_data:
+            raise Exception(f"Product {product_gid} not found")
+        plan.products += 1
+        if action == "delete":
+            product.delete_asset_images_from_metafield()
+        else:
             product.save_product_with_variants()
+    return plan
+
+def mark_store_synced(store):
+    shop = Shop.query.filter_by(domain=store["url"]).first()
+    if not shop:
+        shop = Shop(domain=store["url"], name=store["name"])
+        db.session.add(shop)
+    shop.last_synced_at = utcnow()
+    db.session.commit()
+
+@main.route('/api/sync-runs', methods=['GET'])
+def list_sync_runs():
+    """Most recent sync runs, newest first. Filter with ``store`` (store key)."""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    query = SyncRun.query
+    store_key = request.args.get('store')
+    if store_key:
+        store = STORES.get(store_key)
+        if not store:
+            return error_response(f"Store '{store_key}' not configured.", 404)
+        query = query.filter(SyncRun.store_name == store['name'])
+    runs = query.order_by(SyncRun.started_at.desc()).limit(limit).all()
+    return success_response(data=[run.to_dict() for run in runs])
+
+@main.route('/api/sync-schedule', methods=['GET'])
+def sync_schedule():
+    """Current adaptive sync interval and next run of every configured store."""
+    data = {}
+    for key, store in STORES.items():
+        if not store.get("url"):
+            continue
+        data[key] = schedule.get_schedule(store).to_dict()
+    return success_response(data=data)
+
+@main.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return error_response(f"Job {job_id} not found.", 404)
+    return success_response(data=job.to_dict())
+
+JOB_EVENTS_POLL_SECONDS = 1.0
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
+# Each stream holds a web server thread; end it soon and let the browser
+# reconnect with Last-Event-ID, so the thread is handed back regularly
+JOB_EVENTS_MAX_SECONDS = 30
+
+def sse(event, data, event_id=None):
+    lines = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{lines}event: {event}\ndata: {json_codec.dumps(data)}\n\n"
+
+@main.route('/api/jobs/<int:job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events for one job: progress snapshots and page/product/upload/metafield events.
+
+    The job writes its events to the DB in batches (see jobs.JobProgress), so
+    watching a job never slows it down. The stream ends with a ``done`` event.
+    """
+    if not db.session.get(Job, job_id):
+        return error_response(f"Job {job_id} not found.", 404)
+    after_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('after', 0, type=int)
+
+    def generate():
+        last_id = after_id
+        last_progress = None
+        started = last_sent = time.monotonic()
+        yield "retry: 2000\n\n"
+        while True:
+            db.session.rollback()  # see what the worker committed since
+            job = db.session.get(Job, job_id)
+            for event in jobs.events_since(job_id, last_id):
+                last_id = event.id
+                last_sent = time.monotonic()
+                yield sse(event.kind, event.to_dict(), event.id)
+            if job.progress != last_progress or job.finished:
+                last_progress = job.progress
+                last_sent = time.monotonic()
+                yield sse("progress", {"status": job.status, "progress": job.progress or {}, "eta_seconds": job.eta_seconds()})
+            if job.finished:
+                yield sse("done", job.to_dict())
+                return
+            if time.monotonic() - started > JOB_EVENTS_MAX_SECONDS:
+                return
+            if time.monotonic() - last_sent > JOB_EVENTS_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            time.sleep(JOB_EVENTS_POLL_SECONDS)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@main.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job, or stop a running one at its next safe point."""
+    job = jobs.cancel(job_id)
+    if not job:
+        return error_response(f"Job {job_id} not found.", 404)
+    message = "Cancellation requested." if job.status == "running" else f"Job is {job.status}."
+    return success_response(message=message, data=job.to_dict())
+
+@main.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    """Queue depth and wait times per priority over the last ``window`` seconds."""
+    window = min(request.args.get('window', 3600, type=int), 7 * 24 * 3600)
+    return success_response(data=jobs.queue_stats(window))
+
+@main.route('/api/plan', methods=['POST'])
+def plan_sync():
+    """Dry run the populate/delete path of one product, or queue a dry run of a store sync.
+
+    A store plan needs the whole catalog, so it runs as a ``plan_store`` job:
+    the reply is 202 with its ID; poll /api/jobs/<id> for the plan.
+    """
+    data = request.get_json(silent=True) or {}
+
+    store_key = data.get('current_store_key')
+    store = STORES.get(store_key)
+    if not store:
+        return error_response(f"Store '{store_key}' not configured.", 404)
+
+    action = data.get('action', 'populate')
+    if action not in ('populate', 'delete'):
+        return error_response("action must be 'populate' or 'delete'", 400)
+
+    if not data.get('product_id'):
+        # Fetching the whole catalog takes as long as a sync: run it as a job, poll /api/jobs/<id>
+        job = jobs.pending("plan_store", store_key) or jobs.enqueue("plan_store", store_key, priority="periodic")
+        return job_response(job)
+
+    try:
+        product_gid = ShopifyGIDBuilder('Product').build(data['product_id'])
+        plan = plan_single_product(store, product_gid, action=action)
+    except Exception as e:
+        return error_response(f"Could not build plan: {e}", 502)
+
+    return success_response(
+        message="Dry run complete, nothing was written.",
+        data={"store": store['name'], "product_id": product_gid, "action": action, **plan.to_dict()}
+    )
+
+@jobs.handler("plan_store")
+def plan_store_job(store, payload):
+    plan = plan_store_sync(store)
+    return success_result(
+        message="Dry run complete, nothing was written.",
+        data={"store": store['name'], "action": "sync", **plan.to_dict()}
+    )
 
 @main.route('/api/delete-populated-single-product', methods=['POST'])
 def delete_populated_single_product():
@@ -108,20 +432,31 @@ def delete_populated_single_product():
         return error_response(f"Store '{data.get('current_store_key')}' not configured.", 404)
 
     product_id = ShopifyGIDBuilder('Product').build(data['product_id'])
-    builder = ProductQueryBuilder()
-    query = builder.build(include_media=False, variants_limit=100, include_filled_variant_images_assets=False)
-    variables = {"id": product_id}
+    job = jobs.enqueue("delete_product", data['current_store_key'], {"product_id": product_id})
+    return job_response(jobs.wait(job, current_app.config["JOB_WAIT_SECONDS"]))
 
-    product = fetch_single_product(query, variables, store)
+@jobs.handler("delete_product")
+def delete_product(store, payload):
+    with tracing.trace("delete_product", "populate", store=store["name"], product=payload["product_id"]):
+        builder = ProductQueryBuilder()
+        # Same query as populate, so both share the cached product
+        query = builder.build(include_media=True, variants_limit=100, include_filled_variant_images_assets=False)
+        variables = {"id": payload["product_id"]}
 
-    if isinstance(product, dict) and "errors" in product:
-        return error_response("Could not fetch product from Shopify.", data={"errors": product["errors"]})
+        product = fetch_single_product(query, variables, store)
 
+        if isinstance(product, dict) and "errors" in product:
+            return error_result("Could not fetch product from Shopify.", data={"errors": product["errors"]})
+
+        return delete_fetched_product(product)
+
+def delete_fetched_product(product):
+    """Empty the variant images metafields of a fetched product; returns the job result."""
     if not product.product_data:
-        return error_response("Product data not available", 404)
+        return error_result("Product data not available", 404)
 
     if not product.is_filled_images():
-        return error_response(
+        return error_result(
             message="No asset images found to delete ⚠️",
             data={"next_step": "populate_first", "details": []}
         )
@@ -132,12 +467,12 @@ def delete_populated_single_product():
 
     if result.get("errors"):
         response_data["errors"] = result["errors"]
-        return error_response(
+        return error_result(
             "Failed to delete images from Shopify metafields.",
             data=response_data
         )
 
-    return success_response(
+    return success_result(
         message="Images successfully deleted",
         status="success",
         data=response_data
@@ -146,26 +481,47 @@ def delete_populated_single_product():
 @main.route('/api/canada-webhook', methods=['POST'])
 def canada_webhook():
     data = request.json
-    store = STORES.get('shop2')
-    response = handle_product_change(data, store)
+    enqueue_product_change(data, 'shop2')
     return jsonify({"status": "received"}), 200
 
 @main.route('/api/us-webhook', methods=['POST'])
 def us_webhook():
     data = request.json
-    store = STORES.get('shop1')
-    response = handle_product_change(data, store)
+    enqueue_product_change(data, 'shop1')
     return jsonify({"status": "received"}), 200
 
+def enqueue_product_change(data, store_key):
+    """Queue the webhook's product for a resync and return right away (Shopify times out at 5s)."""
+    store = STORES[store_key]
+    if not store.get("url"):
+        log.warning("Webhook for %s ignored: store has no URL configured", store_key)
+        return
+    schedule.record_webhook(store)
+    product_cache.invalidate(store, data.get('admin_graphql_api_id'), "webhook")
+    jobs.enqueue(
+        "product_change",
+        store_key,
+        {"admin_graphql_api_id": data.get('admin_graphql_api_id')},
+        priority="webhook"
+    )
+
+@jobs.handler("product_change")
+def product_change_job(store, payload):
+    handle_product_change(payload, store)
+    return success_result(message="Product resynced")
+
+@profiling.profiled("webhook")
 def handle_product_change(data, store):
-    print("\n\nproduct id: ", data.get('admin_graphql_api_id'), ", store: ", store["name"])
-    print("\n\n")
+    log.info("Product changed: %s", data.get('admin_graphql_api_id'), extra={"store": store["name"]})
     product_id = data.get('admin_graphql_api_id')
+    # Dropped here too: the entry the webhook endpoint dropped may have been another process's
+    product_cache.invalidate(store, product_id, "webhook")
     builder = ProductQueryBuilder()
     query = builder.build(include_media=True, variants_limit=100, include_filled_variant_images_assets=False)
     variables = {"id": product_id}
-    product = fetch_single_product(query, variables, store)
-    saving = product.save_product_with_variants()
+    with tracing.trace("product_change", "webhook", store=store["name"], product=product_id):
+        product = fetch_single_product(query, variables, store, fresh=True)
+        saving = product.save_product_with_variants()
 
 @main.route('/api/populate-single-product', methods=['POST'])
 def populate_single_product():
@@ -179,91 +535,171 @@ def populate_single_product():
         return error_response(f"Store '{data.get('current_store_key')}' not configured.", 404)
 
     product_id = ShopifyGIDBuilder('Product').build(data['product_id'])
+    job = jobs.enqueue("populate_product", data['current_store_key'], {"product_id": product_id})
+    return job_response(jobs.wait(job, current_app.config["JOB_WAIT_SECONDS"]))
 
-    builder = ProductQueryBuilder()
-    query = builder.build(include_media=True, variants_limit=100, include_filled_variant_images_assets=False)
-    variables = {"id": product_id}
+@jobs.handler("populate_product")
+def populate_product(store, payload):
+    with tracing.trace("populate_product", "populate", store=store["name"], product=payload["product_id"]):
+        builder = ProductQueryBuilder()
+        query = builder.build(include_media=True, variants_limit=100, include_filled_variant_images_assets=False)
+        variables = {"id": payload["product_id"]}
+
+        product = fetch_single_product(query, variables, store)
 
-    product = fetch_single_product(query, variables, store)
+        if isinstance(product, dict) and "errors" in product:
+            return error_result("Could not fetch product from Shopify.", data={"errors": product["errors"]})
 
-    if isinstance(product, dict) and "errors" in product:
-        return error_response("Could not fetch product from Shopify.", data={"errors": product["errors"]})
+        return populate_fetched_product(product)
 
+def populate_fetched_product(product):
+    """Fill the variant images metafields of a fetched product; returns the job result."""
     if not product.product_data:
-        return error_response("Product data not available", 404)
+        return error_result("Product data not available", 404)
 
     if not product.has_errors():
-        return success_response(
+        return success_result(
             message="All images are already populated 🎉",
             status="success",
             data={"details": "All images are already populated"}
         )
 
-    data_to_upload = product.data_for_put_into_metafield()
+    with tracing.span("match_images"):
+        data_to_upload = product.data_for_put_into_metafield()
+        tracing.tag(unmatched=data_to_upload.get("unmatched_count"))
 
     # No images found to populate
     if not any(variant.get("data_images") for variant in data_to_upload.get("results", [])):
-        return error_response(
+        return error_result(
             "No images found to populate.",
             data={"details": data_to_upload.get("results"), "next_step": "populate_first"}
         )
-    
+
     result = product.save_product_with_variants()
     if result:
-        return success_response(
+        return success_result(
             message="Images successfully populated",
             status="success",
             data="Product and variants saved successfully."
         )
     else:
-        return error_response("Failed to save product and variants.", 500)
-    
-    return
+        return error_result("Failed to save product and variants.", 500)
 
-    # Create unmatched images if any
-    if data_to_upload.get("unmatched_count", 0) > 0:
-        product.create_not_found_images(data_to_upload.get("results"), parent_dict=data_to_upload)
+@main.route('/api/populate-products', methods=['POST'])
+def populate_products_api():
+    """Populate many products at once: ``{"product_ids": [...], "current_store_key": ...}``."""
+    return enqueue_bulk("populate_products")
 
-    # No images found to populate
-    if not data_to_upload.get("results"):
-        return error_response("No images found to populate.", data={"details": data_to_upload.get("results")})
-
-    # Check if any images are still pending upload
-    still_pending = any(
-        img.get("needs_upload")
-        for variant in data_to_upload.get("results", [])
-        for img in variant.get("data_images", [])
-    )
+@main.route('/api/delete-populated-products', methods=['POST'])
+def delete_populated_products():
+    """Delete the asset images of many products at once; same body as /api/populate-products."""
+    return enqueue_bulk("delete_products")
 
-    if still_pending:
-        return error_response(
-            message="Some images are still being uploaded. Please retry shortly.",
-            data={
-                "details": data_to_upload.get("results"),
-                "unmatched_count": data_to_upload.get("unmatched_count"),
-                "next_step": "retry_upload"
-            }
-        )
+def enqueue_bulk(kind):
+    """Queue a bulk action as jobs of BULK_CHUNK_SIZE products and wait for them.
 
-    # Push images into metafield
-    result = product.put_images_into_metafield(data_to_upload.get("results"), delete_existing=False)
+    The jobs run side by side on the worker, at most JOB_STORE_CONCURRENCY
+    per store, and share the store's API cost budget. Replies with a result
+    per product, or 202 with the IDs of the jobs still running.
+    """
+    data = request.get_json()
 
-    response_data = {
-        "details": data_to_upload.get("results"),
-        "image_creation_summary": data_to_upload.get("image_creation_summary", {})
-    }
+    if not data or not data.get('product_ids') or 'current_store_key' not in data:
+        return error_response("Missing product_ids or current_store_key in request body", 400)
+
+    store_key = data['current_store_key']
+    if not STORES.get(store_key):
+        return error_response(f"Store '{store_key}' not configured.", 404)
+
+    max_products = current_app.config["BULK_MAX_PRODUCTS"]
+    if len(data['product_ids']) > max_products:
+        return error_response(f"At most {max_products} products per request.", 400)
+
+    builder = ShopifyGIDBuilder('Product')
+    product_ids = list(dict.fromkeys(builder.build(str(pid).split("/")[-1]) for pid in data['product_ids']))
+    size = current_app.config["BULK_CHUNK_SIZE"]
+    batch = [
+        jobs.enqueue(kind, store_key, {"product_ids": product_ids[start:start + size]})
+        for start in range(0, len(product_ids), size)
+    ]
+
+    deadline = time.monotonic() + current_app.config["JOB_WAIT_SECONDS"]
+    batch = [jobs.wait(job, max(0.0, deadline - time.monotonic())) for job in batch]
+    return bulk_response(batch)
+
+def bulk_response(batch):
+    results, pending = [], []
+    for job in batch:
+        if not job.finished:
+            pending.append(job.id)
+        elif job.status == "succeeded" and job.result:
+            results.extend(job.result["data"]["results"])
+        else:
+            results.extend(
+                {"product_id": product_id, "status": "error", "message": f"Job {job.status}: {job.error}", "data": None}
+                for product_id in job.payload["product_ids"]
+            )
 
-    if result.get("errors"):
-        response_data["errors"] = result["errors"]
-        return error_response(
-            "Failed to populate images into Shopify metafields.",
-            data=response_data
+    if pending:
+        return success_response(
+            message="Some products are queued behind other work. Check the jobs for their results.",
+            status="queued",
+            data={"job_ids": pending, "results": results},
+            code=202
         )
-
+    succeeded = sum(1 for r in results if r["status"] == "success")
     return success_response(
-        message="Images successfully populated",
-        status="success",
-        data=response_data
+        message=f"{succeeded} of {len(results)} products done",
+        status="success" if succeeded == len(results) else "partial",
+        data={"results": results}
+    )
+
+def fetch_products_by_id(store, product_ids):
+    """Fetch products by GID with a listing query rather than one request each; {gid: product}."""
+    search = " OR ".join(f"id:{product_id.rsplit('/', 1)[-1]}" for product_id in product_ids)
+    return {product.product_id: product for product in fetch_all_products(store, limit=len(product_ids), query=search)}
+
+@jobs.handler("populate_products")
+def populate_products(store, payload):
+    product_ids = payload["product_ids"]
+    with tracing.trace("populate_products", "populate", store=store["name"], products=len(product_ids)):
+        products = fetch_products_by_id(store, product_ids)
+        bulk.upload_images(store, [p for p in products.values() if p.product_data and p.has_errors()])
+        return run_bulk(store, product_ids, products, populate_fetched_product)
+
+@jobs.handler("delete_products")
+def delete_products(store, payload):
+    product_ids = payload["product_ids"]
+    with tracing.trace("delete_products", "populate", store=store["name"], products=len(product_ids)):
+        products = fetch_products_by_id(store, product_ids)
+        return run_bulk(store, product_ids, products, delete_fetched_product)
+
+def run_bulk(store, product_ids, products, action):
+    """Run ``action`` on each fetched product with its metafield writes batched."""
+    jobs.progress(products_total=len(product_ids))
+    results = {}
+    with bulk.batching(store) as batch:
+        for product_id in product_ids:
+            product = products.get(product_id)
+            if product is None:
+                results[product_id] = error_result("Product not found in Shopify.", 404)
+            else:
+                with tracing.span(action.__name__, product=product_id):
+                    results[product_id] = action(product)
+            jobs.advance("products")
+            jobs.emit("product", id=product_id, status=results[product_id]["status"])
+            jobs.checkpoint()
+
+    # Writes only go out when the batch ends; a failed one fails its product
+    for product_id, product in products.items():
+        errors = batch.errors_for(variant.variant_id for variant in product.variant_records)
+        if errors and results.get(product_id, {}).get("status") == "success":
+            results[product_id] = error_result("Failed to write variant metafields.", 500, data={"errors": errors})
+
+    succeeded = sum(1 for result in results.values() if result["status"] == "success")
+    return success_result(
+        message=f"{succeeded} of {len(product_ids)} products done",
+        data={"results": [{"product_id": product_id, **results[product_id]} for product_id in product_ids]}
     )
 
 @main.route('/api/populate-unmatched-images', methods=['POST'])
@@ -0,0 +1,8 @@
+from . import main
+from flask import Response
+from app.utils import metrics
+
+@main.route('/metrics')
+def metrics_endpoint():
+    # Counters are per process: each web and worker process is scraped on its own
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -1,6 +1,7 @@
 from flask_login import login_required
-from app.graphql_queries.query_builders.query_builders import AllProductQueryBuilder
-from app.utils.helper import STORES, ShopifyProductBuilder, shopify_request
+from app.graphql_queries.query_builders.query_builders import AllProductQueryBuilder, ProductQueryBuilder
+from app.utils import jobs, product_cache
+from app.utils.helper import STORES, ShopifyProductBuilder, response_json, shopify_request
 from . import main
 from flask import render_template, request
 
@@ -31,15 +32,26 @@ def products():
         include_filled_variant_images_assets=False
     )
     response = shopify_request(query=graphql_query, shop_url=store["url"], access_token=store["token"], variables=variables)
-    json_data = response.json()
+    json_data = response_json(response)
     if "errors" in json_data:
         return render_template('products.html', data={"ok": False, "store": store['name'], "errors": json_data["errors"] })
     
     end = (start + limit) - 1
     current_page = ((start - 1) // limit) + 1
 
+    # The listing has the same fields as a single product fetch, so the
+    # populate/delete buttons on this page can start from these payloads.
+    # Only worth it if their jobs can see this process's cache.
+    fill_cache = product_cache.shared() or not jobs.dispatcher_alive()
+    product_query = ProductQueryBuilder().build(
+        include_media=True,
+        variants_limit=100,
+        include_filled_variant_images_assets=False
+    )
     products = []
     for edge in json_data['data']['products']['edges']:
+        if fill_cache:
+            product_cache.put(store, edge['node']['id'], product_query, edge['node'])
         product = ShopifyProductBuilder(edge['node'], store)
         if product.has_errors() == bool(show_incompleted):
             products.append(product.details())
@@ -146,12 +146,62 @@ function getIcon(name) {
   return icon;
 }
 
+// Follows a background job through its Server-Sent Events stream
+class JobEventStream {
+  constructor(jobId, { onProgress, onEvent } = {}) {
+    this.jobId = jobId;
+    this.onProgress = onProgress || (() => {});
+    this.onEvent = onEvent || (() => {});
+  }
+
+  // Resolves with the finished job (see /api/jobs/<id>)
+  wait() {
+    return new Promise((resolve, reject) => {
+      const source = new EventSource(`/api/jobs/${this.jobId}/events`);
+      source.addEventListener("progress", e => this.onProgress(JSON.parse(e.data)));
+      ["page", "product", "upload", "metafield", "dropped"].forEach(kind => {
+        source.addEventListener(kind, e => this.onEvent(kind, JSON.parse(e.data)));
+      });
+      source.addEventListener("done", e => {
+        source.close();
+        resolve(JSON.parse(e.data));
+      });
+      source.onerror = () => {
+        // EventSource reconnects by itself; give up only once the server is gone
+        if (source.readyState === EventSource.CLOSED) reject(new Error("Lost the job event stream"));
+      };
+    });
+  }
+
+  static describe(update) {
+    const p = update.progress || {};
+    let text = `${update.status}`;
+    if (p.store) text += ` — ${p.store} (${p.stores_done || 0}/${p.stores_total || "?"} stores)`;
+    if (p.pages) text += `, ${p.pages} pages`;
+    if (p.products_total) text += `, ${p.products || 0}/${p.products_total} products`;
+    if (update.eta_seconds !== null && update.eta_seconds !== undefined) text += `, about ${Math.ceil(update.eta_seconds)}s left`;
+    return text;
+  }
+}
+
 class ProductHandler {
+  // A 202 reply means the request is queued; follow the job and return its reply instead
+  async awaitJob(response, resultEl) {
+    if (response.status !== "queued" || !response.data?.job_id) return response;
+    resultEl.innerHTML = `<p>${response.message}</p>`;
+    const job = await new JobEventStream(response.data.job_id, {
+      onProgress: update => { resultEl.innerHTML = `<p>⏳ ${JobEventStream.describe(update)}</p>`; },
+    }).wait();
+    if (job.status !== "succeeded" || !job.result) {
+      return { status: "error", message: `Job ${job.status}: ${job.error || "no result"}`, data: null };
+    }
+    return job.result;
+  }
+
   async populate(button) {
     const productId = button.dataset.productId.split("/").pop();
     const card = button.closest(".card-body");
     const currentStoreKey = card.dataset.currentStoreKey;
-    const deleteBtn = card.querySelector('button[data-populate-button-delete]');
     const resultEl = card.querySelector(".result");
     const errorsEl = card.querySelector(".errors");
 
@@ -163,23 +213,12 @@ class ProductHandler {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ product_id: productId, current_store_key: currentStoreKey }),
-      }).then(res => res.json());
+      }).then(res => res.json()).then(res => this.awaitJob(res, resultEl));
 
-      resultEl.innerHTML = `<p>${response.message}</p>`;
-      if (response.data?.details?.length) {
+      this.applyResult(card, response, "populate");
+      if (Array.isArray(response.data?.details) && response.data.details.length) {
         resultEl.innerHTML += `<ol>${response.data.details.map(d => `<li>${d.variant_title}</li>`).join('')}</ol>`;
       }
-      if (response.data?.errors?.length && errorsEl) {
-        errorsEl.classList.remove("d-none");
-        errorsEl.innerHTML = `<strong>Errors:</strong><ol class="mb-0">${response.data.errors.map(e => `<li>${e}</li>`).join("")}</ol>`;
-      }
-
-      if (response.status === "success") {
-        button.classList.add("d-none");
-        deleteBtn.classList.remove("d-none");
-        card.querySelector(".is_filled").innerHTML = `<strong>Images Filled:</strong> ✅ Yes`;
-      } else {
-      }
       button.disabled = false;
       button.innerHTML = "Populate Images";
     } catch (err) {
@@ -194,7 +233,6 @@ class ProductHandler {
     const productId = button.dataset.productId.split("/").pop();
     const card = button.closest(".card-body");
     const currentStoreKey = card.dataset.currentStoreKey;
-    const populateBtn = card.querySelector('button[data-populate-button]');
     const resultEl = card.querySelector(".result");
     const errorsEl = card.querySelector(".errors");
 
@@ -206,23 +244,12 @@ class ProductHandler {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ product_id: productId, current_store_key: currentStoreKey }),
-      }).then(res => res.json());
+      }).then(res => res.json()).then(res => this.awaitJob(res, resultEl));
 
-      resultEl.innerHTML = `<p>${response.message}</p>`;
+      this.applyResult(card, response, "delete");
       if (response.data?.details?.length) {
         resultEl.innerHTML += `<ul>${response.data.details.map(d => `<li>${d.variant_title}: ${d.data_images?.map(img => `<a href="${img.src}" target="_blank">image</a>`).join(", ") || "No images"}</li>`).join("")}</ul>`;
       }
-      if (response.data?.errors?.length && errorsEl) {
-        errorsEl.classList.remove("d-none");
-        errorsEl.innerHTML = `<strong>Errors:</strong><ol class="mb-0">${response.data.errors.map(e => `<li>${e}</li>`).join("")}</ol>`;
-      }
-
-      if (response.status === "success") {
-        button.classList.add("d-none");
-        populateBtn.classList.remove("d-none");
-        card.querySelector(".is_filled").innerHTML = `<strong>Images Filled:</strong> ❌ No`;
-      } else {
-      }
       button.disabled = false;
       button.innerHTML = "Delete Asset Images";
     } catch (err) {
@@ -233,6 +260,27 @@ class ProductHandler {
     }
   }
 
+  // Shows a populate/delete reply on the product's card and swaps its buttons on success
+  applyResult(card, response, action) {
+    const resultEl = card.querySelector(".result");
+    const errorsEl = card.querySelector(".errors");
+    const populateBtn = card.querySelector('button[data-populate-button]');
+    const deleteBtn = card.querySelector('button[data-populate-button-delete]');
+
+    resultEl.innerHTML = `<p>${response.message}</p>`;
+    if (response.data?.errors?.length && errorsEl) {
+      errorsEl.classList.remove("d-none");
+      errorsEl.innerHTML = `<strong>Errors:</strong><ol class="mb-0">${response.data.errors.map(e => `<li>${e}</li>`).join("")}</ol>`;
+    }
+
+    if (response.status === "success") {
+      const [done, next] = action === "populate" ? [populateBtn, deleteBtn] : [deleteBtn, populateBtn];
+      done?.classList.add("d-none");
+      next?.classList.remove("d-none");
+      card.querySelector(".is_filled").innerHTML = `<strong>Images Filled:</strong> ${action === "populate" ? "✅ Yes" : "❌ No"}`;
+    }
+  }
+
   showUnmatchedImages(response, productId) {
     const mainImages = response.data.media.map(item => `
       <div class="image-wrap position-relative border p-2">
@@ -387,7 +435,7 @@ class UIManager {
 
   initialize() {
     this.setupIndividualButtons();
-    this.setupBulkButton();
+    this.setupBulkActions();
     this.setupImagePopups();
     this.setupDeleteButtons();
   }
@@ -412,11 +460,35 @@ class UIManager {
     });
   }
 
-  setupBulkButton() {
-    document.getElementById("perform_all")?.addEventListener("click", () => {
-      const buttons = Array.from(document.querySelectorAll("button[data-populate-button]")).filter(btn => !btn.disabled);
-      const bulk = new BulkProcessor(buttons, this.handler);
-      bulk.start();
+  setupBulkActions() {
+    const selectAll = document.getElementById("select_all");
+    if (!selectAll) return;
+    const boxes = Array.from(document.querySelectorAll("input[data-select-product]"));
+    const populateBtn = document.getElementById("populate_selected");
+    const deleteBtn = document.getElementById("delete_selected");
+    const selectedCards = () => boxes.filter(box => box.checked).map(box => box.closest(".card-body"));
+
+    const refresh = () => {
+      const count = selectedCards().length;
+      selectAll.checked = count > 0 && count === boxes.length;
+      selectAll.indeterminate = count > 0 && count < boxes.length;
+      populateBtn.disabled = deleteBtn.disabled = count === 0;
+      populateBtn.textContent = count ? `Populate selected (${count})` : "Populate selected";
+      deleteBtn.textContent = count ? `Delete selected (${count})` : "Delete selected";
+    };
+
+    selectAll.addEventListener("change", () => {
+      boxes.forEach(box => { box.checked = selectAll.checked; });
+      refresh();
+    });
+    boxes.forEach(box => box.addEventListener("change", refresh));
+
+    [[populateBtn, "populate"], [deleteBtn, "delete"]].forEach(([button, action]) => {
+      button.addEventListener("click", async () => {
+        populateBtn.disabled = deleteBtn.disabled = true;
+        await new BulkProcessor(action, selectedCards(), this.handler).start();
+        refresh();
+      });
     });
   }
 
@@ -451,24 +523,29 @@ class UIManager {
   }
 }
 
+// Populates or deletes the selected products with one bulk request per store
 class BulkProcessor {
-  constructor(buttons, handler) {
-    this.buttons = buttons;
+  static endpoints = { populate: "/api/populate-products", delete: "/api/delete-populated-products" };
+  static buttons = { populate: "button[data-populate-button]", delete: "button[data-populate-button-delete]" };
+  static labels = { populate: "Populate Images", delete: "Delete Asset Images" };
+
+  constructor(action, cards, handler) {
+    this.action = action;
+    this.cards = cards;
     this.handler = handler;
-    this.total = buttons.length;
+    this.total = cards.length;
     this.completed = 0;
     this.errors = 0;
-    this.maxConcurrency = 3;
-    this.queueIndex = 0;
-    this.inProgress = 0;
 
     this.setupModal();
   }
 
   setupModal() {
     this.modalEl = document.getElementById("bulkProgressModal") || this.createModal();
-    this.modal = new bootstrap.Modal(this.modalEl);
+    this.modal = bootstrap.Modal.getOrCreateInstance(this.modalEl);
+    this.modalEl.querySelector(".modal-title").textContent = this.action === "populate" ? "Bulk Image Population" : "Bulk Image Deletion";
     this.progressBar = this.modalEl.querySelector("#bulkProgressBar");
+    this.progressBar.classList.remove("bg-success", "bg-warning", "bg-danger");
     this.statusText = this.modalEl.querySelector("#bulkProgressStatus");
     this.errorText = this.modalEl.querySelector("#bulkProgressErrors");
   }
@@ -493,7 +570,7 @@ class BulkProcessor {
     return modal;
   }
 
-  start() {
+  async start() {
     if (this.total === 0) {
       this.progressBar.style.width = "100%";
       this.progressBar.classList.add("bg-warning");
@@ -501,37 +578,74 @@ class BulkProcessor {
       return;
     }
 
-    this.buttons.forEach(button => {
+    const buttons = this.cards.map(card => card.querySelector(BulkProcessor.buttons[this.action])).filter(Boolean);
+    buttons.forEach(button => {
       button.disabled = true;
       button.innerHTML = `<span class="spinner-border spinner-border-sm me-1" role="status"></span>`;
     });
 
     this.modal.show();
     this.updateProgress();
-    this.processNext();
-  }
-
-  async processNext() {
-    while (this.inProgress < this.maxConcurrency && this.queueIndex < this.total) {
-      const button = this.buttons[this.queueIndex++];
-      this.inProgress++;
-
-      const success = await this.handler.populate(button).catch(() => false);
-      this.completed++;
-      this.inProgress--;
 
-      if (!success) this.errors++;
-
-      this.updateProgress();
-      this.processNext();
-    }
+    const cardsByStore = new Map();
+    this.cards.forEach(card => {
+      const storeKey = card.dataset.currentStoreKey;
+      cardsByStore.set(storeKey, [...(cardsByStore.get(storeKey) || []), card]);
+    });
 
-    if (this.queueIndex >= this.total && this.inProgress === 0) {
+    try {
+      await Promise.all(Array.from(cardsByStore, ([storeKey, cards]) => this.run(storeKey, cards)));
       this.statusText.textContent = `✅ Completed ${this.completed} of ${this.total}`;
-      this.progressBar.classList.add("bg-success");
+      this.progressBar.classList.add(this.errors ? "bg-warning" : "bg-success");
+    } catch (err) {
+      console.error(err);
+      this.statusText.textContent = `🚨 ${err.message || "Something went wrong. Please try again."}`;
+      this.progressBar.classList.add("bg-danger");
+    } finally {
+      buttons.forEach(button => {
+        button.disabled = false;
+        button.innerHTML = BulkProcessor.labels[this.action];
+      });
     }
   }
 
+  async run(storeKey, cards) {
+    const cardsById = new Map(cards.map(card => [card.dataset.productId, card]));
+    const response = await fetch(BulkProcessor.endpoints[this.action], {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        product_ids: cards.map(card => card.dataset.productId.split("/").pop()),
+        current_store_key: storeKey,
+      }),
+    }).then(res => res.json());
+    if (!response.data?.results) throw new Error(response.message);
+    this.apply(response.data.results, cardsById);
+
+    // Jobs the server stopped waiting for: follow each one to its end
+    await Promise.all((response.data.job_ids || []).map(async jobId => {
+      const job = await new JobEventStream(jobId).wait();
+      const results = job.result?.data?.results || (job.payload?.product_ids || []).map(productId => ({
+        product_id: productId,
+        status: "error",
+        message: `Job ${job.status}: ${job.error || "no result"}`,
+        data: null,
+      }));
+      this.apply(results, cardsById);
+    }));
+  }
+
+  apply(results, cardsById) {
+    results.forEach(result => {
+      const card = cardsById.get(result.product_id);
+      if (!card) return;
+      this.handler.applyResult(card, result, this.action);
+      this.completed++;
+      if (result.status !== "success") this.errors++;
+    });
+    this.updateProgress();
+  }
+
   updateProgress() {
     const percent = Math.round((this.completed / this.total) * 100);
     this.progressBar.style.width = `${percent}%`;
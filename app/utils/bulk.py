@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from app.utils import product_cache, sync_plan, tracing
+from app.utils.sync_plan import PlannedResponse
+from app.utils.log import get_logger
+
+# Shopify accepts at most 25 metafields per metafieldsSet call
+METAFIELDS_PER_CALL = 25
+FILES_PER_CALL = 50
+
+log = get_logger(__name__)
+
+_current_batch = ContextVar("current_write_batch", default=None)
+
+
+def _field_index(field):
+    # userErrors point at their input as e.g. ["metafields", "3", "ownerId"]
+    try:
+        return int(field[1])
+    except (IndexError, ValueError, TypeError):
+        return None
+
+
+class WriteBatch:
+    """Metafield writes of a bulk action, held back and sent together by flush().
+
+    Errors are kept per owner (variant GID) so each product gets its own result.
+    The cached payloads of ``products`` are dropped once the writes are sent.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.metafields = []
+        self.products = set()
+        self.errors = {}
+        self.calls = 0
+
+    def record(self, variables):
+        """Hold the write back and answer the way Shopify would on success."""
+        metafields = variables.get("metafields") or []
+        self.metafields.extend(metafields)
+        return PlannedResponse({"data": {"metafieldsSet": {
+            "metafields": [{"id": None, "key": mf.get("key"), "namespace": mf.get("namespace")} for mf in metafields],
+            "userErrors": [],
+        }}})
+
+    def flush(self):
+        from app.graphql_queries.query_builders.query_builders import MetafieldMutationBuilder
+        from app.utils.helper import response_json, shopify_request
+
+        # A later write to the same metafield replaces the earlier one, as it would have one by one
+        pending = list({(mf.get("ownerId"), mf.get("namespace"), mf.get("key")): mf for mf in self.metafields}.values())
+        self.metafields = []
+        if not pending:
+            return
+        query = MetafieldMutationBuilder().build()
+        token = _current_batch.set(None)  # these go out for real
+        try:
+            for start in range(0, len(pending), METAFIELDS_PER_CALL):
+                chunk = pending[start:start + METAFIELDS_PER_CALL]
+                self.calls += 1
+                try:
+                    response = shopify_request(query, self.store["url"], self.store["token"], {"metafields": chunk})
+                    json_data = response_json(response)
+                except Exception as e:
+                    self._fail(chunk, str(e))
+                    continue
+                if json_data.get("errors"):
+                    self._fail(chunk, "; ".join(str(e.get("message")) for e in json_data["errors"]))
+                    continue
+                for err in ((json_data.get("data") or {}).get("metafieldsSet") or {}).get("userErrors") or []:
+                    index = _field_index(err.get("field"))
+                    if index is not None and index < len(chunk):
+                        self.errors[chunk[index].get("ownerId")] = err.get("message")
+                    else:
+                        self._fail(chunk, err.get("message"))
+        finally:
+            _current_batch.reset(token)
+            for product_id in self.products:
+                product_cache.invalidate(self.store, product_id, "write")
+            self.products = set()
+        if self.errors:
+            log.warning("%d of %d batched metafield write(s) failed", len(self.errors), len(pending))
+
+    def _fail(self, chunk, message):
+        for mf in chunk:
+            self.errors[mf.get("ownerId")] = message
+
+    def errors_for(self, owner_ids):
+        return [f"{owner}: {self.errors[owner]}" for owner in owner_ids if owner in self.errors]
+
+
+def current_batch():
+    return _current_batch.get()
+
+
+@contextmanager
+def batching(store):
+    """Hold back metafield writes made in the block and send them in batches when it ends.
+
+    They are sent even if the block fails, since the products saved so far
+    have already been committed.
+    """
+    batch = WriteBatch(store)
+    token = _current_batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _current_batch.reset(token)
+        batch.flush()
+
+
+def upload_images(store, products):
+    """Upload every image the products' save would upload, FILES_PER_CALL per fileCreate.
+
+    Which images those are is found with a dry run of each save on a copy of
+    the product. The new File IDs go into the products' image indexes, so the
+    real save finds them and uploads nothing itself (it still would for an
+    image whose batched upload failed). Returns the number of files uploaded.
+    """
+    from app.graphql_queries.query_builders.query_builders import ImageMutationBuilder
+    from app.utils.helper import ShopifyProductBuilder, get_normalized_name, response_json, shopify_request
+
+    needed_by = {}
+    for product in products:
+        with tracing.span("plan_uploads", product=product.product_id), sync_plan.planning() as plan:
+            ShopifyProductBuilder(product.product_data, store).save_product_with_variants()
+        for upload in plan.uploads:
+            needed_by.setdefault(upload["source"], []).append(product)
+
+    urls = list(needed_by)
+    uploaded = 0
+    query = ImageMutationBuilder().build()
+    for start in range(0, len(urls), FILES_PER_CALL):
+        chunk = urls[start:start + FILES_PER_CALL]
+        files = [
+            {"alt": f"{start + i}_{get_normalized_name(url)}", "contentType": "IMAGE", "originalSource": url}
+            for i, url in enumerate(chunk)
+        ]
+        urls_by_alt = {f["alt"]: f["originalSource"] for f in files}
+        try:
+            json_data = response_json(shopify_request(query, store["url"], store["token"], {"files": files}))
+        except Exception as e:
+            log.error("Batched upload of %d image(s) failed: %s", len(chunk), e)
+            continue
+        file_create = (json_data.get("data") or {}).get("fileCreate") or {}
+        for f in file_create.get("files") or []:
+            url = urls_by_alt.get(f.get("alt"))
+            if url and f.get("id"):
+                uploaded += 1
+                for product in needed_by[url]:
+                    product.image_index.add(url, f["id"])
+        if json_data.get("errors") or file_create.get("userErrors"):
+            log.warning("Batched upload errors: %s", json_data.get("errors") or file_create.get("userErrors"))
+    return uploaded
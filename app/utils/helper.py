@@ -1,9 +1,16 @@
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from functools import cached_property, lru_cache
+import re
+import time
 from urllib.parse import urlparse, unquote
-from flask import json
 import requests
 import os
 from app.graphql_queries.query_builders.query_builders import ImageMutationBuilder, MetafieldMutationBuilder
-from app.models import Product, Shop, Variant
+from app.models import Job, Product, Shop, Variant, utcnow
+from app.utils import bulk, jobs, json_codec, metrics, product_cache, single_flight, sync_plan, sync_run, throttle, tracing
+from app.utils.log import get_logger
 from app import db
 
 SHOPIFY_API_VERSION = os.getenv("SHOPIFY_API_VERSION")
@@ -15,6 +22,12 @@ STORES = {
     "shop3": {"name": os.getenv("SHOP3_NAME"), "url": os.getenv("SHOP3_URL"), "token": os.getenv("SHOP3_TOKEN")},
 }
 
+log = get_logger(__name__)
+
+OPERATION_NAME = re.compile(r"^\s*(?:query|mutation)\s+(\w+)")
+# Trace span of a request by operation; everything else is a fetch
+SPAN_NAMES = {"FileCreate": "upload", "metafieldSet": "metafield_write"}
+
 def shopify_headers(access_token):
     return {
         "Content-Type": "application/json",
@@ -27,9 +40,89 @@ def shopify_request(query, shop_url, access_token, variables=None):
         payload["variables"] = variables
     headers = shopify_headers(access_token=access_token)
     shopify_graphql_url = f"{shop_url}/admin/api/{SHOPIFY_API_VERSION}/graphql.json"
-    response = requests.post(shopify_graphql_url, json=payload, headers=headers)
+
+    plan = sync_plan.current_plan()
+    if plan is not None and sync_run.is_mutation(query):
+        # Dry run: record the write and answer as if it succeeded
+        return plan.record_mutation(variables)
+    batch = bulk.current_batch()
+    if batch is not None and variables and "metafields" in variables:
+        # Bulk action: sent later with the other products' writes
+        return batch.record(variables)
+
+    store_label = store_name(shop_url)
+    operation = operation_name(query)
+    with tracing.span(SPAN_NAMES.get(operation, "fetch"), store=store_label, operation=operation):
+        if variables and "files" in variables:
+            tracing.tag(files=len(variables["files"]))
+        if variables and "metafields" in variables:
+            tracing.tag(metafields=len(variables["metafields"]))
+        with sync_run.stage("write" if sync_run.is_mutation(query) else "fetch"):
+            waited = throttle.wait_for_budget(shop_url, query)
+            if waited:
+                metrics.shopify_throttle_wait.inc(store_label, amount=waited)
+                tracing.tag(throttle_wait_seconds=round(waited, 3))
+            started = time.perf_counter()
+            try:
+                response = requests.post(shopify_graphql_url, data=json_codec.dumps_bytes(payload), headers=headers)
+            except Exception:
+                metrics.shopify_requests.inc(store_label, operation, "exception")
+                raise
+            metrics.shopify_request_seconds.observe(time.perf_counter() - started, store_label, operation)
+
+        try:
+            json_data = response_json(response)
+        except ValueError:
+            json_data = None
+        throttle.observe(shop_url, query, json_data)
+        outcome, cost = record_request_metrics(store_label, operation, response, json_data)
+        tracing.tag(outcome=outcome, cost=cost)
+    if variables and "files" in variables:
+        jobs.emit("upload", count=len(variables["files"]))
+    if variables and "metafields" in variables:
+        jobs.emit("metafield", owners=[mf.get("ownerId") for mf in variables["metafields"]])
+    if sync_run.current_run() is not None:
+        sync_run.record_api_response(query, variables, json_data)
+    if plan is not None:
+        plan.record_read(json_data)
     return response
 
+@lru_cache(maxsize=None)
+def store_name(shop_url):
+    """Metric label of a shop: its configured name, or the URL if unknown."""
+    for store in STORES.values():
+        if store["url"] == shop_url:
+            return store["name"] or shop_url
+    return shop_url
+
+@lru_cache(maxsize=64)
+def operation_name(query):
+    match = OPERATION_NAME.match(query)
+    return match.group(1) if match else "anonymous"
+
+def record_request_metrics(store_label, operation, response, json_data):
+    """Count the request by outcome and its query cost; returns (outcome, cost)."""
+    if response.status_code != 200:
+        outcome = "http_error"
+    elif json_data and json_data.get("errors"):
+        throttled = any((e.get("extensions") or {}).get("code") == "THROTTLED" for e in json_data["errors"])
+        outcome = "throttled" if throttled else "error"
+    else:
+        outcome = "ok"
+    metrics.shopify_requests.inc(store_label, operation, outcome)
+    cost = (((json_data or {}).get("extensions") or {}).get("cost") or {}).get("actualQueryCost")
+    if cost is not None:
+        metrics.shopify_query_cost.inc(store_label, operation, amount=cost)
+    return outcome, cost
+
+def response_json(response):
+    """Parse a Shopify response body once with the fast codec; repeat calls reuse it."""
+    cached = getattr(response, "_parsed_json", None)
+    if cached is None:
+        cached = json_codec.loads(response.content)
+        response._parsed_json = cached
+    return cached
+
 class ShopifyGIDBuilder:
     def __init__(self, object_type: str):
         self.object_type = object_type
@@ -37,40 +130,190 @@ class ShopifyGIDBuilder:
     def build(self, object_id: str) -> str:
         return f"gid://shopify/{self.object_type}/{object_id}"
 
+@lru_cache(maxsize=8192)
 def get_normalized_name(url):
     filename = os.path.basename(urlparse(url).path)
     normalized_name = unquote(filename).replace(" ", "_20")
     return normalized_name
 
+
+@dataclass(slots=True, frozen=True)
+class MediaRecord:
+    id: str
+    img_url: str
+    name: str
+
+    def as_dict(self):
+        return {"id": self.id, "img_url": self.img_url, "name": self.name}
+
+
+@dataclass(slots=True, frozen=True)
+class VariantRecord:
+    variant_id: str
+    variant_title: str
+    image_urls: tuple          # raw URLs from the variant_images_url metafield
+    image_names: tuple         # normalized file name for each raw URL
+    asset_images_json: tuple   # File IDs currently in the variant_images metafield
+    asset_images: tuple        # (media_id, image_url) pairs, when references were queried
+
+    @property
+    def images_count(self):
+        return len(self.image_urls)
+
+    @property
+    def filled_images(self):
+        return bool(self.asset_images_json)
+
+    def raw_image_urls(self):
+        return [{"url": url, "name": name} for url, name in zip(self.image_urls, self.image_names)]
+
+    def as_dict(self):
+        # Fresh lists every time: callers are free to mutate what they get back
+        return {
+            "variant_title": self.variant_title,
+            "variant_id": self.variant_id,
+            "raw_image_urls": self.raw_image_urls(),
+            "asset_images": [{"id": media_id, "image_url": img_url} for media_id, img_url in self.asset_images],
+            "asset_images_json": list(self.asset_images_json),
+            "images_count": self.images_count,
+            "filled_images": self.filled_images,
+        }
+
 # Helper to resolve variant info from index
-def resolve_variant_info(idx, payload, data):
+def resolve_variant_info(idx, payload, variant_titles):
     variant_info = payload[idx] if idx is not None and idx < len(payload) else {}
     variant_id = variant_info.get("ownerId", "unknown")
-    variant_title = next(
-        (v.get("variant_title") for v in data if v.get("variant_id") == variant_id),
-        ""
-    )
-    return variant_id, variant_title
+    return variant_id, variant_titles.get(variant_id, "")
+
+def diff_variant_images(existing_urls, existing_ids, incoming_urls):
+    """Carry a variant's File IDs over to its new list of image URLs.
+
+    ``existing_ids[i]`` is the File ID stored for ``existing_urls[i]``. Images
+    are identified by normalized file name rather than position: the longest
+    common subsequence keeps its IDs in place, and images that only moved
+    reuse the ID of their old slot. Returns ``(ids, report)`` where ``ids`` has
+    one entry per incoming URL (``None`` when the image still needs a File ID).
+    """
+    # Positional pairing of stored URLs and IDs, padded/trimmed to match
+    existing_ids = list(existing_ids[:len(existing_urls)])
+    existing_ids += [None] * (len(existing_urls) - len(existing_ids))
+    existing_keys = [get_normalized_name(url) for url in existing_urls]
+    incoming_keys = [get_normalized_name(url) for url in incoming_urls]
+
+    ids = [None] * len(incoming_urls)
+    used = [False] * len(existing_urls)
+    placed = [False] * len(incoming_urls)
+
+    matcher = SequenceMatcher(None, existing_keys, incoming_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(i2 - i1):
+                ids[j1 + offset] = existing_ids[i1 + offset]
+                used[i1 + offset] = placed[j1 + offset] = True
+
+    spare = defaultdict(deque)
+    for i, key in enumerate(existing_keys):
+        if not used[i]:
+            spare[key].append(i)
+
+    moved, added = [], []
+    for j, key in enumerate(incoming_keys):
+        if placed[j]:
+            continue
+        if spare[key]:
+            i = spare[key].popleft()
+            used[i] = True
+            ids[j] = existing_ids[i]
+            moved.append((i, j, incoming_urls[j]))
+        else:
+            added.append((j, incoming_urls[j]))
+
+    removed = [(i, url) for i, url in enumerate(existing_urls) if not used[i]]
+    return ids, {"moved": moved, "added": added, "removed": removed}
+
+def fetch_single_product(query, variables, store, fresh=False):
+    """Fetch a product, from the product cache unless ``fresh``; what Shopify returns is cached.
+
+    Concurrent fetches of the same product share one request. A ``fresh``
+    fetch (after a webhook) never takes the answer of a request that was
+    already on its way, it waits for it and sends its own.
+    """
+    def fetch(previous):
+        with tracing.span("fetch_product", product=product_id):
+            response = shopify_request(
+                query=query,
+                shop_url=store['url'],
+                access_token=store['token'],
+                variables=variables
+            )
+        return response_json(response)
 
-def fetch_single_product(query, variables, store):
     try:
-        response = shopify_request(
-            query=query,
-            shop_url=store['url'],
-            access_token=store['token'],
-            variables=variables
+        product_id = variables.get("id")
+        product_data = None if fresh else product_cache.get(
+            store, product_id, query, stale=lambda: webhook_pending(product_id)
         )
-        json_data = response.json()
-        if "errors" in json_data:
-            return {"errors": json_data["errors"]}
-        
-        product_data = json_data.get("data", {}).get("product")
+        if product_data is None:
+            if sync_plan.current_plan() is None:
+                key = ("fetch", store['url'], product_id, query)
+                json_data = single_flight.do(key, fetch, joins=lambda flight: not fresh)
+            else:
+                json_data = fetch(None)
+            if "errors" in json_data:
+                return {"errors": json_data["errors"]}
+
+            product_data = json_data.get("data", {}).get("product")
+            product_cache.put(store, product_id, query, product_data)
+        else:
+            tracing.tag(cached=True)
         product = ShopifyProductBuilder(product_data, store)
         return product
 
     except Exception as e:
         return {"errors": [f"Request or JSON parsing error: {e}"]}
 
+def webhook_pending(product_id):
+    """Whether a webhook resync of the product is queued or running.
+
+    The web process that took the webhook cannot drop the worker's in-process
+    cache entry, so the worker checks this before serving one.
+    """
+    return db.session.query(Job.id).filter(
+        Job.kind == "product_change",
+        Job.status.in_(("queued", "running")),
+        Job.payload["admin_graphql_api_id"].as_string() == product_id,
+    ).first() is not None
+
+class ImageIndex:
+    """Hash lookup of a product's images by normalized file name.
+
+    When several media share a name, each lookup resolves them the way the
+    code it replaces did: media_by_name (data_for_put_into_metafield's dict)
+    keeps the last one, ids_by_name (get_id_from_image_url's scan) the first.
+    Files uploaded during a sync are added, by name and by source URL, so
+    repeats reuse the new File ID.
+    """
+    __slots__ = ("media_by_name", "ids_by_name", "ids_by_url")
+
+    def __init__(self, media_records):
+        self.media_by_name = {}
+        self.ids_by_name = {}
+        self.ids_by_url = {}
+        for media in media_records:
+            self.media_by_name[media.name] = media
+            self.ids_by_name.setdefault(media.name, media.id)
+
+    def find(self, url):
+        media_id = self.ids_by_url.get(url)
+        if media_id:
+            return media_id
+        return self.ids_by_name.get(get_normalized_name(url))
+
+    def add(self, url, media_id):
+        self.ids_by_url.setdefault(url, media_id)
+        self.ids_by_name.setdefault(get_normalized_name(url), media_id)
+
+
 class ShopifyProductBuilder:
     def __init__(self, product_data, store):
         self.product_data = product_data
@@ -80,15 +323,9 @@ class ShopifyProductBuilder:
         self._check_errors()
 
     def _check_errors(self):
-        variants = self.get_variants()
-        all_variant_image_count = 0
-        
-        for idx, variant in enumerate(variants, start=1):
-            title = variant.get("variant_title") or f"Variant {idx}"
-            assets = variant.get("asset_images_json") or []
-            urls = variant.get("raw_image_urls") or []
-            count_assets, count_urls = len(assets), len(urls)
-            all_variant_image_count += count_urls
+        for idx, variant in enumerate(self.variant_records, start=1):
+            title = variant.variant_title or f"Variant {idx}"
+            count_assets, count_urls = len(variant.asset_images_json), len(variant.image_urls)
 
             # Case 1: Both empty
             if count_assets == 0 and count_urls == 0:
@@ -135,24 +372,30 @@ class ShopifyProductBuilder:
         count = self.product_data.get("variantsCount", {}).get("count")
         return count
 
-    def get_media(self):
+    @cached_property
+    def media_records(self):
+        """Product media parsed once into MediaRecord tuples."""
         if not self.product_data:
-            return []
+            return ()
 
-        media_nodes = self.product_data.get("media", {}).get("nodes", [])
-        formatted = []
+        records = []
+        for node in (self.product_data.get("media") or {}).get("nodes", []):
+            img_url = (node.get("image") or {}).get("url")
+            records.append(MediaRecord(node.get("id"), img_url, get_normalized_name(img_url)))
+        return tuple(records)
+
+    def get_media(self):
+        return [media.as_dict() for media in self.media_records]
 
-        for node in media_nodes:
-            media_id = node.get("id")
-            img_url = node.get("image", {}).get("url")
-            assumed_name = get_normalized_name(img_url)
-            formatted.append({"id": media_id, "img_url": img_url, "name": assumed_name})
-        return formatted
+    @cached_property
+    def image_index(self):
+        """Media lookup by normalized name and by URL, shared by every matching path."""
+        return ImageIndex(self.media_records)
 
     def get_id_from_image_url(self, url):
-        for media in self.get_media():
-            if media.get("name") == get_normalized_name(url):
-                return media.get("id")
+        media_id = self.image_index.find(url)
+        if media_id:
+            return media_id
         
         # build GraphQL query
         image_builder = ImageMutationBuilder()
@@ -173,7 +416,7 @@ class ShopifyProductBuilder:
                 access_token=self.store['token'],
                 variables={"files": files_input}
             )
-            json_data = response.json()
+            json_data = response_json(response)
 
             file_create = json_data.get("data", {}).get("fileCreate", {})
             returned_files = file_create.get("files", [])
@@ -181,77 +424,68 @@ class ShopifyProductBuilder:
 
             # map success back to images
             for f in returned_files:
+                # Later variants referencing the same image reuse this upload
+                self.image_index.add(url, f["id"])
                 return f["id"]
 
         except Exception as e:
             return None
 
-    def get_variants(self):
+    @cached_property
+    def variant_records(self):
+        """Variants parsed once into VariantRecord tuples."""
         if not self.product_data:
-            return []
-
-        variants = self.product_data.get("variants", {}).get("nodes", [])
+            return ()
 
-        variant_data = []
-        for variant in variants:
-            raw_image_urls = []
+        records = []
+        for variant in (self.product_data.get("variants") or {}).get("nodes", []):
             image_urls = (variant.get("imagesUrl") or {}).get("jsonValue", [])
             asset_images_json = (variant.get("assetImagesJson") or {}).get("jsonValue", [])
             raw_asset_images = variant.get("assetImages") or []
-            nodes = []
 
+            asset_images = ()
             if isinstance(raw_asset_images, dict):
-                nodes = (
-                    raw_asset_images.get("images") or {}
-                ).get("nodes", [])
-
-            asset_images = []
-            for node in nodes:
-                media_id = node.get("id")
-                img_url = node.get("image", {}).get("url")
-                if media_id and img_url:
-                    asset_images.append({
-                        "id": media_id,
-                        "image_url": img_url
-                    })
+                nodes = (raw_asset_images.get("images") or {}).get("nodes", [])
+                asset_images = tuple(
+                    (node.get("id"), (node.get("image") or {}).get("url"))
+                    for node in nodes
+                    if node.get("id") and (node.get("image") or {}).get("url")
+                )
 
             # Ensure it's a list
-            if isinstance(image_urls, list):
-                for url in image_urls:
-                    raw_image_urls.append({"url": url, "name": get_normalized_name(url)})
-
-            variant_data.append({
-                "variant_title": variant.get("title"),
-                "variant_id": variant.get("id"),
-                "raw_image_urls": raw_image_urls,
-                "asset_images": asset_images,
-                "asset_images_json": asset_images_json,
-                "images_count": len(raw_image_urls),
-                # "all_data": variant,
-                "filled_images": bool(asset_images_json)
-            })
+            if not isinstance(image_urls, list):
+                image_urls = []
+
+            records.append(VariantRecord(
+                variant_id=variant.get("id"),
+                variant_title=variant.get("title"),
+                image_urls=tuple(image_urls),
+                image_names=tuple(get_normalized_name(url) for url in image_urls),
+                asset_images_json=tuple(asset_images_json or ()),
+                asset_images=asset_images,
+            ))
+        return tuple(records)
+
+    def get_variants(self):
+        return [variant.as_dict() for variant in self.variant_records]
+
+    @cached_property
+    def _is_filled_images(self):
+        return any(variant.filled_images for variant in self.variant_records)
 
-        return variant_data
+    @cached_property
+    def _total_variant_images_count(self):
+        return sum(variant.images_count for variant in self.variant_records)
 
     def is_filled_images(self):
-        variants = self.get_variants()
-        if not variants:
+        if not self.variant_records:
             return False
-
-        for variant in variants:
-            if variant.get("filled_images"):
-                return True
-        return False
+        return self._is_filled_images
 
     def get_total_variant_images_count(self):
-        variants = self.get_variants()
-        if not variants:
+        if not self.variant_records:
             return False
-
-        total = 0
-        for variant in variants:
-            total += variant.get("images_count", 0)
-        return total
+        return self._total_variant_images_count
     
     def details(self):
         return {
@@ -281,27 +515,77 @@ class ShopifyProductBuilder:
     def has_errors(self):
         return len(self.errors) > 0
 
+    def metafields_written(self):
+        # The cached payload still has the old metafields. Nothing was sent in
+        # a dry run, and a batched write is only sent when the batch flushes.
+        if sync_plan.current_plan() is not None:
+            return
+        batch = bulk.current_batch()
+        if batch is not None:
+            batch.products.add(self.product_id)
+        else:
+            product_cache.invalidate(self.store, self.product_id, "write")
+
     def save_product_with_variants(self):
+        """Save the product to the DB and fill its variants' metafields in Shopify.
+
+        Concurrent saves of one product run one at a time. A save of the same
+        payload as the one running shares its result; any other waits for it
+        and reuses the files it uploaded. The result of a save inside a bulk
+        batch is not shared: its writes have not been sent yet when it returns.
+        """
+        store = getattr(self, "store", None)
+        if sync_plan.current_plan() is not None or not isinstance(store, dict):
+            return self._timed_save(None)
+
+        def joins(flight):
+            leader, batched = flight.context
+            return not batched and leader.product_data == self.product_data
+
+        return single_flight.do(
+            ("save", store.get("url"), self.product_id),
+            self._timed_save,
+            context=(self, bulk.current_batch() is not None),
+            joins=joins,
+        )
+
+    def _timed_save(self, previous):
+        if previous is not None:
+            leader = previous.context[0]
+            for url, media_id in leader.image_index.ids_by_url.items():
+                self.image_index.add(url, media_id)
+        started = time.perf_counter()
+        with tracing.span("diff", product=self.product_id, variants=len(self.variant_records)), sync_run.stage("diff"):
+            saved = self._save_product_with_variants()
+            tracing.tag(saved=saved)
+        store = getattr(self, "store", None)
+        store_label = store.get("name") if isinstance(store, dict) else None
+        metrics.product_save_seconds.observe(time.perf_counter() - started, store_label, "saved" if saved else "failed")
+        if not saved:
+            sync_run.record_error(f"Failed to save product {self.product_id}")
+        return saved
+
+    def _save_product_with_variants(self):
         anything_changed = False
 
         # Defensive: ensure required attributes exist
         try:
             store = getattr(self, "store", None)
             if not store or not isinstance(store, dict):
-                print("[DB] Invalid store info on self.store")
+                log.error("Invalid store info on self.store")
                 return False
 
             shop_domain = store.get("url")
             shop_name = store.get("name")
             if not shop_domain:
-                print("[DB] store['url'] (shop domain) is missing")
+                log.error("store['url'] (shop domain) is missing")
                 return False
 
             if not hasattr(self, "product_id") or not self.product_id:
-                print("[DB] Missing self.product_id")
+                log.error("Missing self.product_id")
                 return False
         except Exception as e:
-            print(f"[DB] Pre-check failure: {e}")
+            log.error("Pre-check failure: %s", e)
             return False
 
         try:
@@ -317,10 +601,10 @@ class ShopifyProductBuilder:
                 except Exception as fe:
                     # If flush fails, rollback and abort safely
                     db.session.rollback()
-                    print(f"[DB] Failed to flush new Shop: {fe}")
+                    log.error("Failed to flush new Shop: %s", fe)
                     return False
                 anything_changed = True
-                print(f"[DB] Created new shop: {shop_name}")
+                log.info("Created new shop: %s", shop_name)
 
             # --- 2. Get or create product ---
             product = Product.query.filter_by(shopify_id=self.product_id).first()
@@ -332,7 +616,7 @@ class ShopifyProductBuilder:
                         db.session.flush()
                     except Exception as fe:
                         db.session.rollback()
-                        print(f"[DB] Failed to flush before creating Product: {fe}")
+                        log.error("Failed to flush before creating Product: %s", fe)
                         return False
 
                 # create product; use shop_id directly to avoid model-relationship assumptions
@@ -347,31 +631,32 @@ class ShopifyProductBuilder:
                     db.session.flush()
                 except Exception as fe:
                     db.session.rollback()
-                    print(f"[DB] Failed to flush new Product: {fe}")
+                    log.error("Failed to flush new Product: %s", fe)
                     return False
                 anything_changed = True
-                print(f"[DB] Created new product: {product.title}")
+                log.info("Created new product: %s", product.title, extra={"product_id": self.product_id})
 
             # --- 3. Process variants ---
             variants_iterable = []
             try:
-                variants_iterable = list(self.get_variants() or [])
+                variants_iterable = self.variant_records
             except Exception:
-                print("[DB] self.get_variants() failed or returned bad data; treating as empty list")
+                log.warning("Parsing variants failed or returned bad data; treating as empty list")
                 variants_iterable = []
 
             for variant_info in variants_iterable:
                 # Defensive extraction of expected fields
                 try:
-                    variant_id = variant_info.get("variant_id")
-                    incoming_urls = variant_info.get("raw_image_urls") or []
-                    asset_images_json = variant_info.get("asset_images_json") or []
+                    variant_id = variant_info.variant_id
+                    incoming_urls = variant_info.raw_image_urls()
+                    # Working copy: the diff below trims, pads and rewrites it
+                    asset_images_json = list(variant_info.asset_images_json)
                 except Exception:
-                    print("[DB] bad variant_info structure, skipping this variant:", variant_info)
+                    log.warning("Bad variant_info structure, skipping this variant: %r", variant_info)
                     continue
 
                 if not variant_id:
-                    print("[DB] variant_info missing variant_id, skipping:", variant_info)
+                    log.warning("variant_info missing variant_id, skipping: %r", variant_info)
                     continue
 
                 # isolate per-variant work to avoid a single failure bringing everything down
@@ -393,33 +678,34 @@ class ShopifyProductBuilder:
                         except Exception as fe:
                             # record and continue; variant may not have id but we still marked change
                             db.session.rollback()
-                            print(f"[DB] flush failed after adding variant {variant_id}: {fe}")
+                            log.error("Flush failed after adding variant %s: %s", variant_id, fe)
                             # re-add and attempt to continue to next variant
                             db.session.add(variant)
                             continue
 
-                        print(f"[DB] Created new variant ID: {variant_id}")
+                        log.debug("Created new variant %s", variant_id, extra={"product_id": self.product_id})
 
                         # After creating variant, perform uploads/metafields if needed.
                         # Wrap Shopify operations to prevent external errors causing crashes.
                         try:
                             data_to_upload = {}
                             if callable(getattr(self, "data_for_put_into_metafield", None)):
-                                data_to_upload = self.data_for_put_into_metafield()
+                                # Only this variant: the others are handled in their own iteration
+                                data_to_upload = self.data_for_put_into_metafield(variant_ids={variant_id})
                             if isinstance(data_to_upload, dict) and data_to_upload.get("results"):
                                 if data_to_upload.get("unmatched_count", 0) > 0 and callable(getattr(self, "create_not_found_images", None)):
                                     try:
                                         self.create_not_found_images(data_to_upload["results"], parent_dict=data_to_upload)
                                     except Exception as e:
-                                        print(f"[Shopify] create_not_found_images failed for variant {variant_id}: {e}")
+                                        log.error("create_not_found_images failed for variant %s: %s", variant_id, e)
 
                                 if callable(getattr(self, "put_images_into_metafield", None)):
                                     try:
                                         self.put_images_into_metafield(data_to_upload["results"], delete_existing=False)
                                     except Exception as e:
-                                        print(f"[Shopify] put_images_into_metafield failed for variant {variant_id}: {e}")
+                                        log.error("put_images_into_metafield failed for variant %s: %s", variant_id, e)
                         except Exception as e:
-                            print(f"[Shopify] Error preparing uploads for new variant {variant_id}: {e}")
+                            log.error("Error preparing uploads for new variant %s: %s", variant_id, e)
 
                     else:
                         # --- Existing variant: check for changes ---
@@ -429,7 +715,7 @@ class ShopifyProductBuilder:
                         if variant.urls:
                             try:
                                 if isinstance(variant.urls, str):
-                                    parsed = json.loads(variant.urls)
+                                    parsed = json_codec.loads(variant.urls)
                                 else:
                                     parsed = variant.urls  # already a list/dict
 
@@ -439,79 +725,34 @@ class ShopifyProductBuilder:
                                     for u in parsed
                                 ]
                             except Exception as e:
-                                print(f"[DB] Failed to parse variant.urls for {variant.id}: {e}")
+                                log.error("Failed to parse variant.urls for %s: %s", variant.id, e)
                                 existing_urls = []
                                 continue
 
-                        # Normalize incoming urls (raw_image_urls may be dicts or strings)
-                        incoming_urls = [
-                            u["url"] if isinstance(u, dict) else u
-                            for u in (variant_info.get("raw_image_urls") or [])
-                        ]
-
-                        changes, removed = [], []
-
-                        # Make a working copy of existing URLs
-                        updated_urls = list(existing_urls)
-
-                        # Ensure asset_images_json aligns with existing_urls
-                        trimmed_or_padded = False
-                        print(len(asset_images_json), len(existing_urls), '\n')
-                        if len(asset_images_json) > len(existing_urls):
-                            asset_images_json = asset_images_json[:len(existing_urls)]
-                            print(asset_images_json, '\n')
-                            trimmed_or_padded = True
-                        elif len(asset_images_json) < len(existing_urls):
-                            asset_images_json.extend([None] * (len(existing_urls) - len(asset_images_json)))
-                            print(asset_images_json, '\n')
-                            trimmed_or_padded = True
-
-                        # Compare incoming URLs with existing
-                        for idx, url in enumerate(incoming_urls):
-                            if idx >= len(updated_urls):
-                                # New URL → append URL and generate new ID
-                                updated_urls.append(url)
-                                new_id = self.get_id_from_image_url(url)
-                                asset_images_json.append(new_id)
-                                changes.append((idx, None, url))
-                            elif updated_urls[idx] != url:
-                                # URL changed → replace URL and generate new ID
-                                old_url = updated_urls[idx]
-                                updated_urls[idx] = url
-                                new_id = self.get_id_from_image_url(url)
-                                asset_images_json[idx] = new_id
-                                changes.append((idx, old_url, url))
-                            # else: URL unchanged → keep existing ID
-
-                        # Handle removals (existing longer than incoming)
-                        while len(updated_urls) > len(incoming_urls):
-                            removed_idx = len(updated_urls) - 1
-                            removed_url = updated_urls.pop()
-                            asset_images_json.pop()
-                            removed.append((removed_idx, removed_url))
-
-                        # Fill any None IDs (from external service or padding)
-                        for idx, aid in enumerate(asset_images_json):
+                        incoming_urls = list(variant_info.image_urls)
+
+                        # Match by image identity so reordered images keep their File IDs
+                        new_asset_ids, report = diff_variant_images(existing_urls, asset_images_json, incoming_urls)
+
+                        # Only images with no File ID yet (new, or never populated) need one;
+                        # get_id_from_image_url uploads only if the product media lacks it.
+                        for idx, aid in enumerate(new_asset_ids):
                             if aid is None:
-                                asset_images_json[idx] = self.get_id_from_image_url(updated_urls[idx])
-
-                        # Update existing_urls
-                        existing_urls[:] = updated_urls
-
-                        # --- Debug print before any DB or Shopify updates ---
-                        print(f"\n=== Variant: {variant_id} ===")
-                        print("\nChanges:", changes)
-                        print("\nRemoved:", removed)
-                        # print("\nExisting URLs:", existing_urls)
-                        # print("\nIncoming URLs:", incoming_urls)
-                        print("\nAsset Images JSON:", asset_images_json)
-                        print("\npassing:", trimmed_or_padded)
-                        print("===============================\n")
-                        # continue
-
-                        if changes or removed or trimmed_or_padded:
+                                new_asset_ids[idx] = self.get_id_from_image_url(incoming_urls[idx])
+
+                        urls_changed = incoming_urls != existing_urls
+                        ids_changed = new_asset_ids != asset_images_json
+                        asset_images_json = new_asset_ids
+
+                        # Sampled (LOG_DEBUG_SAMPLE): this runs for every variant of every product
+                        log.debug(
+                            "Variant %s diff: moved=%s added=%s removed=%s asset_images=%s",
+                            variant_id, report["moved"], report["added"], report["removed"], asset_images_json,
+                        )
+
+                        if urls_changed or ids_changed:
                             # Save full dicts back into DB, not just urls
-                            variant.urls = json.dumps(variant_info.get("raw_image_urls") or [])
+                            variant.urls = variant_info.raw_image_urls()
                             db.session.add(variant)
                             anything_changed = True
 
@@ -522,7 +763,7 @@ class ShopifyProductBuilder:
                                     "namespace": "custom",
                                     "key": "variant_images",
                                     "type": "list.file_reference",
-                                    "value": json.dumps(asset_images_json)
+                                    "value": json_codec.dumps(asset_images_json)
                                 }]
                                 response = shopify_request(
                                     query=MetafieldMutationBuilder().build(),
@@ -530,36 +771,47 @@ class ShopifyProductBuilder:
                                     access_token=store.get('token'),
                                     variables={"metafields": metafields_payload}
                                 )
+                                self.metafields_written()
                                 try:
-                                    print(f"[Shopify] Updated variant {variant_id} with {asset_images_json}")
-                                    print("[Shopify] Response:", response.json())
+                                    log.debug("Updated variant %s with %s: %s", variant_id, asset_images_json, response_json(response))
                                 except Exception:
-                                    print("[Shopify] Response (non-json or empty) for variant", variant_id)
+                                    log.warning("Response (non-json or empty) for variant %s", variant_id)
                             except Exception as e:
-                                print(f"[Shopify] Error updating variant {variant_id}: {e}")
+                                log.error("Error updating variant %s: %s", variant_id, e)
 
                 except Exception as e:
                     # Catch-all per-variant error — do not crash the whole process
-                    print(f"[DB] Error processing variant {variant_info!r}: {e}")
+                    log.error("Error processing variant %r: %s", variant_info, e)
                     # attempt to continue to next variant
                     continue
 
             # --- 4. Commit only if something changed ---
             try:
-                if anything_changed:
-                    db.session.commit()
-                    print("[DB] All changes committed.")
+                plan = sync_plan.current_plan()
+                if anything_changed and plan is not None:
+                    # Dry run: flush so the plan sees every row, then throw it away
+                    product.updated_at = utcnow()
+                    db.session.flush()
+                    db.session.rollback()
+                    plan.products_changed += 1
+                    log.debug("Dry run, changes planned and rolled back.")
+                elif anything_changed:
+                    product.updated_at = utcnow()
+                    with tracing.span("db_commit"), sync_run.stage("db"):
+                        db.session.commit()
+                    sync_run.count("products_changed")
+                    log.debug("All changes committed for product %s", self.product_id)
                 else:
                     # explicit rollback to clear any pending transactional state
                     db.session.rollback()
-                    print("[DB] No changes detected, nothing to commit.")
+                    log.debug("No changes detected for product %s, nothing to commit.", self.product_id)
             except Exception as e:
                 # final safeguard
                 try:
                     db.session.rollback()
                 except Exception:
                     pass
-                print(f"[DB] Failed to commit changes: {e}")
+                log.error("Failed to commit changes: %s", e)
                 return False
 
             return True
@@ -570,45 +822,38 @@ class ShopifyProductBuilder:
                 db.session.rollback()
             except Exception:
                 pass
-            print(f"[DB] Fatal error in save_product_with_variants: {e}")
+            log.exception("Fatal error in save_product_with_variants: %s", e)
             return False
 
     def get_errors(self):
         return self.errors
 
-    def data_for_put_into_metafield(self):
-        product_image_cache = {}
-        for img in self.get_media():
-            url = img.get("img_url")
-            name = img.get("name")
-            product_image_cache[name] = {
-                "id": img.get("id"),
-                "img_url": url
-            }
-
+    def data_for_put_into_metafield(self, variant_ids=None):
         results = []
         unmatched_count = 0
 
         # Match variant images
-        for var in self.get_variants():
-            variant_id = var.get("variant_id")
-            variant_title = var.get("variant_title")
+        for var in self.variant_records:
+            if variant_ids is not None and var.variant_id not in variant_ids:
+                continue
+            variant_id = var.variant_id
+            variant_title = var.variant_title
             data_images = []
 
-            for img in var.get("raw_image_urls", []):
-                old_url = img.get("url")
-                normalized_old_name = img.get("name")
-                match = product_image_cache.get(normalized_old_name)
+            for old_url, normalized_old_name in zip(var.image_urls, var.image_names):
+                match = self.image_index.media_by_name.get(normalized_old_name)
+                # Files uploaded earlier in this save have an ID but no product URL
+                uploaded_id = None if match else self.image_index.ids_by_name.get(normalized_old_name)
 
-                matched = bool(match)
+                matched = bool(match or uploaded_id)
                 needs_upload = not matched
                 if needs_upload:
                     unmatched_count += 1
 
                 data_images.append({
                     "raw_img_url": old_url,
-                    "product_img_url": match.get("img_url") if matched else "",
-                    "product_img_id": match.get("id") if matched else "",
+                    "product_img_url": match.img_url if match else "",
+                    "product_img_id": match.id if match else (uploaded_id or ""),
                     "matched": matched,
                     "needs_upload": needs_upload
                 })
@@ -687,22 +932,24 @@ class ShopifyProductBuilder:
                 access_token=self.store['token'],
                 variables={"files": files_input}
             )
-            json_data = response.json()
+            json_data = response_json(response)
 
             file_create = json_data.get("data", {}).get("fileCreate", {})
             returned_files = file_create.get("files", [])
             user_errors = file_create.get("userErrors", [])
 
             # map success back to images
+            candidates_by_alt = {c["alt"]: c for c in upload_candidates}
             for f in returned_files:
                 alt_key = f.get("alt")
-                candidate = next((c for c in upload_candidates if c["alt"] == alt_key), None)
+                candidate = candidates_by_alt.get(alt_key)
                 if not candidate:
                     continue
                 img = candidate["image_ref"]
                 img["product_img_id"] = f["id"]
                 img["needs_upload"] = False
                 img["matched"] = True
+                self.image_index.add(candidate["originalSource"], f["id"])
                 summary["successfully_uploaded"] += 1
 
             # map failures from userErrors
@@ -774,7 +1021,7 @@ class ShopifyProductBuilder:
                 "namespace": "custom",
                 "key": "variant_images",
                 "type": "list.file_reference",
-                "value": json.dumps(image_ids)
+                "value": json_codec.dumps(image_ids)
             })
         
         # If there's nothing to send
@@ -784,6 +1031,7 @@ class ShopifyProductBuilder:
         variables = {
             "metafields": metafields_payload
         }
+        variant_titles = {v.get("variant_id"): v.get("variant_title") for v in data}
 
         # Send request once
         try:
@@ -795,12 +1043,13 @@ class ShopifyProductBuilder:
                 access_token=self.store['token'],
                 variables=variables
             )
-            json_data = response.json()
+            self.metafields_written()
+            json_data = response_json(response)
 
             # 1. Top-level GraphQL errors
             if "errors" in json_data:
                 for idx, graphql_error in enumerate(json_data["errors"]):
-                    variant_id, variant_title = resolve_variant_info(idx, metafields_payload, data)
+                    variant_id, variant_title = resolve_variant_info(idx, metafields_payload, variant_titles)
                     summary["errors"].append({
                         "variant_id": variant_id,
                         "variant_title": variant_title,
@@ -821,7 +1070,7 @@ class ShopifyProductBuilder:
                 except (IndexError, ValueError, TypeError):
                     pass
 
-                variant_id, variant_title = resolve_variant_info(idx, metafields_payload, data)
+                variant_id, variant_title = resolve_variant_info(idx, metafields_payload, variant_titles)
                 summary["errors"].append({
                     "variant_id": variant_id,
                     "variant_title": variant_title,
@@ -855,7 +1104,9 @@ class ShopifyProductBuilder:
                 "message": str(e)
             })
 
-        print('\n\n', summary, '\n\n')
+        log.debug("Metafield summary: %s", summary)
+        if summary["errors"]:
+            log.warning("%d metafield write(s) failed for product %s", len(summary["errors"]), self.product_id)
 
         return summary
 
@@ -864,9 +1115,9 @@ class ShopifyProductBuilder:
 
     def delete_asset_images_from_metafield(self):
         data = []
-        for var in self.get_variants():
-            variant_id = var.get("variant_id")
-            variant_title = var.get("variant_title")
+        for var in self.variant_records:
+            variant_id = var.variant_id
+            variant_title = var.variant_title
             data_images = []
             data.append({
                 "variant_id": variant_id,
@@ -0,0 +1,533 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import timedelta
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.models import Job, JobEvent, Lease, utcnow
+from app.utils import lease, metrics
+from app.utils.log import context as log_context, get_logger
+
+# Lower runs first
+PRIORITIES = {"interactive": 0, "webhook": 1, "periodic": 2}
+
+WORKER_LEASE_PREFIX = "job-worker:"  # held by each running JobDispatcher
+INLINE_LEASE_PREFIX = "job-inline:"  # held while a web process runs a job itself
+
+# Progress is written at most this often, so reporting never slows the job down
+PROGRESS_FLUSH_SECONDS = 1.0
+
+# Events kept per flush; the rest are only counted (one "dropped" event)
+MAX_EVENTS_PER_FLUSH = 100
+
+# Counters a sharded sync's shard processes report back through the parent
+SHARD_COUNTERS = ("pages", "products", "products_total")
+
+# Writing a job's outcome is retried this often, backing off, while the DB is busy
+FINISH_ATTEMPTS = 8
+
+log = get_logger(__name__)
+
+_handlers = {}
+_priority_names = {value: name for name, value in PRIORITIES.items()}
+_job = Job.__table__
+_job_event = JobEvent.__table__
+_current_progress = ContextVar("current_job_progress", default=None)
+
+
+class Cancelled(Exception):
+    """Raised inside a job at its next checkpoint after a cancel request."""
+
+
+class JobProgress:
+    """Progress counters and events of the running job, flushed now and then.
+
+    Each flush also picks up a pending cancel request.
+    """
+
+    def __init__(self, engine, job_id):
+        self.engine = engine
+        self.job_id = job_id
+        self.values = {}
+        self.cancel_requested = False
+        self._events = []
+        self._dropped = 0
+        self._dirty = False
+        self._flushed_at = 0.0
+
+    def event(self, kind, data):
+        if len(self._events) < MAX_EVENTS_PER_FLUSH:
+            self._events.append({"job_id": self.job_id, "kind": kind, "data": data, "created_at": utcnow()})
+        else:
+            self._dropped += 1
+
+    def add(self, name, amount=1):
+        self.values[name] = self.values.get(name, 0) + amount
+        self._dirty = True
+
+    def set(self, name, value):
+        self.values[name] = value
+        self._dirty = True
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._flushed_at < PROGRESS_FLUSH_SECONDS:
+            return
+        self._flushed_at = now
+        try:
+            with self.engine.begin() as conn:
+                if self._dirty:
+                    conn.execute(update(_job).where(_job.c.id == self.job_id).values(progress=dict(self.values)))
+                    self._dirty = False
+                if self._dropped:
+                    self._events.append({
+                        "job_id": self.job_id, "kind": "dropped", "data": {"count": self._dropped}, "created_at": utcnow()
+                    })
+                    self._dropped = 0
+                if self._events:
+                    conn.execute(insert(_job_event), self._events)
+                    self._events = []
+                self.cancel_requested = bool(
+                    conn.execute(select(_job.c.cancel_requested).where(_job.c.id == self.job_id)).scalar()
+                )
+        except Exception as e:
+            log.error("Failed to save progress of job %s: %s", self.job_id, e)
+
+
+class ShardProgress(JobProgress):
+    """Progress of one shard of a job, in the shard's own process.
+
+    Events and cancel requests go through the job as usual. The job's
+    progress fields belong to the parent process, so counters are added to
+    ``counters`` (multiprocessing Values shared with the parent, which
+    reports them) and other fields are dropped.
+    """
+
+    def __init__(self, engine, job_id, counters):
+        super().__init__(engine, job_id)
+        self.counters = counters
+
+    def add(self, name, amount=1):
+        counter = self.counters.get(name)
+        if counter is not None:
+            with counter.get_lock():
+                counter.value += amount
+
+    def set(self, name, value):
+        pass
+
+
+@contextmanager
+def shard_progress(job_id, counters):
+    """Report into job ``job_id`` from a shard process; no-op without a job."""
+    if job_id is None:
+        yield
+        return
+    current = ShardProgress(db.engine, job_id, counters)
+    token = _current_progress.set(current)
+    try:
+        yield
+    finally:
+        _current_progress.reset(token)
+        current.flush(force=True)
+
+
+def handler(kind):
+    """Register the function that runs jobs of this kind: fn(store, payload) -> result."""
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, store_key=None, payload=None, priority="interactive"):
+    job = Job(
+        kind=kind,
+        priority=PRIORITIES[priority],
+        store_key=store_key,
+        payload=payload or {},
+        status="queued",
+        enqueued_at=utcnow(),
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def pending(kind, store_key):
+    """A queued or running job of this kind for the store, if any."""
+    return Job.query.filter(
+        Job.kind == kind, Job.store_key == store_key, Job.status.in_(("queued", "running"))
+    ).first()
+
+
+def claim(store_cap):
+    """Atomically take the next job to run, or None.
+
+    The most urgent priority class goes first. Within it, the store with the
+    fewest running jobs wins (oldest job breaks ties), so one store flooding
+    the queue cannot starve the others. A store already running ``store_cap``
+    jobs is skipped; the cap is re-checked inside the claiming UPDATE, so
+    concurrent dispatchers cannot overshoot it.
+    """
+    running = dict(
+        db.session.query(Job.store_key, func.count(Job.id))
+        .filter(Job.status == "running")
+        .group_by(Job.store_key)
+        .all()
+    )
+    candidates = (
+        db.session.query(Job.priority, Job.store_key, func.min(Job.id))
+        .filter(Job.status == "queued")
+        .group_by(Job.priority, Job.store_key)
+        .all()
+    )
+    db.session.rollback()  # don't hold the read transaction open
+
+    candidates = [c for c in candidates if running.get(c[1], 0) < store_cap]
+    candidates.sort(key=lambda c: (c[0], running.get(c[1], 0), c[2]))
+
+    for priority, store_key, job_id in candidates:
+        running_for_store = (
+            select(func.count())
+            .select_from(_job)
+            .where(_job.c.store_key == store_key, _job.c.status == "running")
+            .scalar_subquery()
+        )
+        with db.engine.begin() as conn:
+            claimed = conn.execute(
+                update(_job)
+                .where(_job.c.id == job_id, _job.c.status == "queued", running_for_store < store_cap)
+                .values(status="running", started_at=utcnow(), worker=lease.OWNER)
+            ).rowcount
+        if claimed:
+            return _started(db.session.get(Job, job_id, populate_existing=True))
+    return None
+
+
+def claim_job(job_id):
+    """Take one specific queued job, ignoring caps (used to run it inline)."""
+    with db.engine.begin() as conn:
+        claimed = conn.execute(
+            update(_job)
+            .where(_job.c.id == job_id, _job.c.status == "queued")
+            .values(status="running", started_at=utcnow(), worker=lease.OWNER)
+        ).rowcount
+    return _started(db.session.get(Job, job_id, populate_existing=True)) if claimed else None
+
+
+def _started(job):
+    wait = (job.started_at - job.enqueued_at).total_seconds()
+    metrics.job_wait_seconds.observe(wait, _priority_names.get(job.priority, str(job.priority)))
+    return job
+
+
+def run_job(job):
+    from app.utils.helper import STORES
+
+    job_id, kind = job.id, job.kind
+    fn = _handlers.get(kind)
+    status, result, error = "succeeded", None, None
+    job_progress = JobProgress(db.engine, job_id)
+    token = _current_progress.set(job_progress)
+    try:
+        if fn is None:
+            raise Exception(f"No handler for job kind '{kind}'")
+        with log_context(job_id=job_id, job_kind=kind), _profile_job(job):
+            result = fn(STORES.get(job.store_key), job.payload or {})
+    except Cancelled:
+        status, error = "cancelled", "Cancelled on request"
+        log.info("Job %s (%s) cancelled", job_id, kind)
+    except Exception as e:
+        status, error = "failed", str(e)
+        log.error("Job %s (%s) failed: %s", job_id, kind, e)
+    finally:
+        _current_progress.reset(token)
+
+    job_progress.flush(force=True)  # last events, before the stream sees the job finish
+    db.session.rollback()
+    _finish(job_id, status=status, result=result, error=error, progress=job_progress.values, finished_at=utcnow())
+    metrics.jobs_finished.inc(kind, status)
+    return db.session.get(Job, job_id, populate_existing=True)
+
+
+def _finish(job_id, **values):
+    """Write the job's outcome in its own transaction, retrying while the DB is locked.
+
+    A job left "running" by a live worker is never failed as orphaned, so
+    this gives a busy SQLite database time rather than giving up at once.
+    """
+    for attempt in range(1, FINISH_ATTEMPTS + 1):
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(update(_job).where(_job.c.id == job_id).values(**values))
+            return
+        except OperationalError as e:
+            if attempt == FINISH_ATTEMPTS:
+                raise
+            log.warning("Could not record the end of job %s (attempt %d): %s", job_id, attempt, e)
+            time.sleep(min(2 ** attempt * 0.25, 10))
+
+
+def _profile_job(job):
+    """Profile a job queued with ``{"profile": true}`` in its payload."""
+    if not (job.payload or {}).get("profile"):
+        return nullcontext()
+    from app.utils import profiling
+
+    return profiling.profile(job.kind, tag=f"job{job.id}", force=True)
+
+
+def current_job_id():
+    """ID of the job running in this context, or None."""
+    current = _current_progress.get()
+    return current.job_id if current is not None else None
+
+
+def progress(**values):
+    """Set progress fields of the running job; no-op outside a job."""
+    current = _current_progress.get()
+    if current is not None:
+        for name, value in values.items():
+            current.set(name, value)
+
+
+def advance(name, amount=1):
+    """Increment a progress counter of the running job; no-op outside a job."""
+    current = _current_progress.get()
+    if current is not None:
+        current.add(name, amount)
+
+
+def emit(kind, **data):
+    """Record a progress event of the running job for its event stream; no-op outside a job."""
+    current = _current_progress.get()
+    if current is not None:
+        current.event(kind, data)
+
+
+def events_since(job_id, after_id=0, limit=500):
+    return (
+        JobEvent.query.filter(JobEvent.job_id == job_id, JobEvent.id > after_id)
+        .order_by(JobEvent.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def prune_events(days=1):
+    """Delete events of jobs that finished more than ``days`` ago."""
+    finished_before = utcnow() - timedelta(days=days)
+    old_jobs = select(_job.c.id).where(_job.c.finished_at < finished_before)
+    with db.engine.begin() as conn:
+        return conn.execute(delete(_job_event).where(_job_event.c.job_id.in_(old_jobs))).rowcount
+
+
+def checkpoint():
+    """Save progress if due and stop the job here if it was cancelled.
+
+    Call it only where stopping is safe, e.g. between two products.
+    """
+    current = _current_progress.get()
+    if current is None:
+        return
+    current.flush()
+    if current.cancel_requested:
+        raise Cancelled()
+
+
+def cancel(job_id):
+    """Cancel a queued job outright, or ask a running one to stop at its next checkpoint."""
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(_job)
+            .where(_job.c.id == job_id, _job.c.status == "queued")
+            .values(status="cancelled", error="Cancelled on request", finished_at=utcnow())
+        )
+        conn.execute(
+            update(_job)
+            .where(_job.c.id == job_id, _job.c.status == "running")
+            .values(cancel_requested=True)
+        )
+    db.session.expire_all()
+    return db.session.get(Job, job_id)
+
+
+def dispatcher_alive():
+    return db.session.query(Lease.name).filter(
+        Lease.name.like(f"{WORKER_LEASE_PREFIX}%"), Lease.expires_at > utcnow()
+    ).first() is not None
+
+
+def wait(job, timeout, poll=0.2):
+    """Block until the job finishes or ``timeout`` seconds pass; returns the job.
+
+    With no worker process running, the job is run here instead so manual
+    actions keep working in a plain `flask run` setup.
+    """
+    job_id = job.id
+    if not dispatcher_alive():
+        with lease.hold_lease(f"{INLINE_LEASE_PREFIX}{job_id}"):
+            claimed = claim_job(job_id)
+            if claimed:
+                return run_job(claimed)
+
+    deadline = time.monotonic() + timeout
+    while True:
+        db.session.expire_all()
+        job = db.session.get(Job, job_id)
+        if job.finished or time.monotonic() >= deadline:
+            return job
+        time.sleep(poll)
+
+
+def fail_orphaned_jobs():
+    """Fail running jobs whose process is gone (its lease expired).
+
+    They are not retried: a half-done populate may already have uploaded
+    files, and the next sync picks up whatever is left.
+    """
+    live = {
+        owner
+        for (owner,) in db.session.query(Lease.owner).filter(
+            or_(Lease.name.like(f"{WORKER_LEASE_PREFIX}%"), Lease.name.like(f"{INLINE_LEASE_PREFIX}%")),
+            Lease.expires_at > utcnow(),
+        )
+    }
+    orphans = Job.query.filter(Job.status == "running", Job.worker.notin_(live)).all()
+    for job in orphans:
+        job.status = "failed"
+        job.error = f"Worker {job.worker} stopped while running the job"
+        job.finished_at = utcnow()
+    db.session.commit()
+    return len(orphans)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(fraction * len(values)))], 3)
+
+
+def queue_stats(window_seconds=3600):
+    """Queue depth and wait times (enqueue to start) per priority class."""
+    since = utcnow() - timedelta(seconds=window_seconds)
+    depth = dict(
+        db.session.query(Job.priority, func.count(Job.id))
+        .filter(Job.status == "queued")
+        .group_by(Job.priority)
+        .all()
+    )
+    running = dict(
+        db.session.query(Job.priority, func.count(Job.id))
+        .filter(Job.status == "running")
+        .group_by(Job.priority)
+        .all()
+    )
+    oldest = dict(
+        db.session.query(Job.priority, func.min(Job.enqueued_at))
+        .filter(Job.status == "queued")
+        .group_by(Job.priority)
+        .all()
+    )
+    waits = {}
+    for priority, enqueued_at, started_at in db.session.query(
+        Job.priority, Job.enqueued_at, Job.started_at
+    ).filter(Job.started_at >= since):
+        waits.setdefault(priority, []).append((started_at - enqueued_at).total_seconds())
+
+    now = utcnow()
+    stats = {}
+    for name, priority in PRIORITIES.items():
+        samples = waits.get(priority, [])
+        stats[name] = {
+            "queued": depth.get(priority, 0),
+            "running": running.get(priority, 0),
+            "oldest_queued_seconds": (now - oldest[priority]).total_seconds() if priority in oldest else None,
+            "started_in_window": len(samples),
+            "wait_p50_seconds": _percentile(samples, 0.5),
+            "wait_p95_seconds": _percentile(samples, 0.95),
+            "wait_max_seconds": round(max(samples), 3) if samples else None,
+        }
+    return {"window_seconds": window_seconds, "priorities": stats}
+
+
+def _queue_depth():
+    rows = (
+        db.session.query(Job.priority, Job.status, func.count(Job.id))
+        .filter(Job.status.in_(("queued", "running")))
+        .group_by(Job.priority, Job.status)
+        .all()
+    )
+    depth = {(name, status): 0 for name in PRIORITIES for status in ("queued", "running")}
+    for priority, status, count in rows:
+        depth[(_priority_names.get(priority, str(priority)), status)] = count
+    return depth
+
+
+metrics.Gauge("jobs", "Jobs queued or running right now.", ("priority", "status"), collect=_queue_depth)
+
+
+class JobDispatcher:
+    """Threads that claim and run queued jobs until stopped.
+
+    Every worker process runs one; while it is up it holds a
+    ``job-worker:<owner>`` lease so web requests know someone is serving the
+    queue and orphaned jobs can be told apart from running ones.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.threads = app.config["JOB_WORKERS"]
+        self.store_cap = app.config["JOB_STORE_CONCURRENCY"]
+        self.poll = app.config["JOB_POLL_SECONDS"]
+        self._stop = threading.Event()
+        self._threads = []
+        self._lease = None
+
+    def start(self):
+        with self.app.app_context():
+            name = f"{WORKER_LEASE_PREFIX}{lease.OWNER}"
+            ttl = lease.default_ttl()
+            lease.acquire(db.engine, name, ttl)
+            self._lease = lease.HeldLease(db.engine, name, ttl)
+            self._lease.start()
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._loop, name=f"job-dispatcher-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        log.info("Dispatcher started with %d threads, %d per store", self.threads, self.store_cap)
+
+    def _loop(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    job = claim(self.store_cap)
+                except Exception as e:
+                    db.session.rollback()
+                    log.error("Failed to claim a job: %s", e)
+                    job = None
+                if job is None:
+                    self._stop.wait(self.poll)
+                    continue
+                job_id = job.id
+                try:
+                    run_job(job)
+                except Exception as e:
+                    # Keep serving the queue; the lease says this thread is alive
+                    db.session.rollback()
+                    log.error("Failed to finish job %s: %s", job_id, e)
+                finally:
+                    db.session.remove()
+
+    def stop(self):
+        """Let running jobs finish, then release the worker lease."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        if self._lease:
+            self._lease.release()
+        log.info("Dispatcher stopped")
@@ -0,0 +1,73 @@
+import json
+import os
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional: use it when installed unless JSON_BACKEND=json
+try:
+    if os.getenv("JSON_BACKEND", "orjson").lower() == "json":
+        raise ImportError("stdlib JSON backend requested")
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def loads(data):
+    """Parse JSON from str or bytes."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj):
+    """Serialize to compact UTF-8 JSON bytes (the request body format)."""
+    if orjson:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits; let the stdlib handle it
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps(obj):
+    """Serialize to a compact JSON str."""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, with the default provider's output.
+
+    Values orjson cannot encode natively are passed to the default provider's
+    ``default`` hook (dates become HTTP dates, as before). Any call orjson
+    cannot express, or any encoding failure, falls back to the stdlib path.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.pop("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        indent = kwargs.pop("indent", None)
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        elif indent:
+            kwargs["indent"] = indent
+        if kwargs.get("separators") in (None, (",", ":")):
+            kwargs.pop("separators", None)  # orjson output is already compact
+        default = kwargs.pop("default", self.default)
+        kwargs.pop("ensure_ascii", None)  # orjson always writes UTF-8
+        if kwargs:
+            return super().dumps(obj, default=default, **kwargs)
+
+        try:
+            return orjson.dumps(obj, default=default, option=option).decode("utf-8")
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
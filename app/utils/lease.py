@@ -0,0 +1,132 @@
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import case, delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Lease, utcnow
+from app.utils.log import get_logger
+
+DEFAULT_TTL_SECONDS = 300
+
+# host:pid plus a random suffix, so a recycled pid never inherits a lease
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+log = get_logger(__name__)
+
+_lease = Lease.__table__
+
+# Leases held by this process; the DB row alone cannot tell our threads apart
+_held = set()
+_held_lock = threading.Lock()
+
+
+def default_ttl():
+    return current_app.config.get("LEASE_TTL_SECONDS", DEFAULT_TTL_SECONDS)
+
+
+def acquire(engine, name, ttl, owner=OWNER):
+    """Take or extend the lease; True if `owner` holds it afterwards.
+
+    The UPDATE only matches a lease we already own or one that has expired,
+    so two processes racing for the same name cannot both win.
+    """
+    now = utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    with engine.begin() as conn:
+        result = conn.execute(
+            update(_lease)
+            .where(_lease.c.name == name, or_(_lease.c.owner == owner, _lease.c.expires_at < now))
+            .values(
+                owner=owner,
+                expires_at=expires_at,
+                acquired_at=case((_lease.c.owner == owner, _lease.c.acquired_at), else_=now),
+            )
+        )
+        if result.rowcount:
+            return True
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(_lease).values(name=name, owner=owner, acquired_at=now, expires_at=expires_at))
+        return True
+    except IntegrityError:
+        return False  # someone else holds it
+
+
+def renew(engine, name, ttl, owner=OWNER):
+    """Push the expiry forward; False if the lease was lost to another owner."""
+    with engine.begin() as conn:
+        result = conn.execute(
+            update(_lease)
+            .where(_lease.c.name == name, _lease.c.owner == owner)
+            .values(expires_at=utcnow() + timedelta(seconds=ttl))
+        )
+    return result.rowcount == 1
+
+
+def release(engine, name, owner=OWNER):
+    with engine.begin() as conn:
+        conn.execute(delete(_lease).where(_lease.c.name == name, _lease.c.owner == owner))
+
+
+class HeldLease:
+    """A lease kept alive by a background thread until released."""
+
+    def __init__(self, engine, name, ttl, owner=OWNER):
+        self.engine = engine
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._keep_alive, name=f"lease:{name}", daemon=True)
+
+    def _keep_alive(self):
+        # Renew at a third of the TTL so one slow renewal does not drop the lease
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                if not renew(self.engine, self.name, self.ttl, self.owner):
+                    self.lost = True
+                    log.warning("Lost %s", self.name)
+                    return
+            except Exception as e:
+                log.error("Failed to renew %s: %s", self.name, e)
+
+    def start(self):
+        self._thread.start()
+
+    def release(self):
+        self._stop.set()
+        self._thread.join()
+        if not self.lost:
+            release(self.engine, self.name, self.owner)
+
+
+@contextmanager
+def hold_lease(name, ttl=None):
+    """Hold the named lease for the block; yields None if another process has it."""
+    engine = db.engine
+    ttl = ttl or default_ttl()
+    with _held_lock:
+        busy = name in _held
+        _held.add(name)
+    if busy:
+        yield None
+        return
+    try:
+        if not acquire(engine, name, ttl):
+            yield None
+            return
+        held = HeldLease(engine, name, ttl)
+        held.start()
+        try:
+            yield held
+        finally:
+            held.release()
+    finally:
+        with _held_lock:
+            _held.discard(name)
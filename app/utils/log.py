@@ -0,0 +1,118 @@
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from app.utils import json_codec
+
+# Attributes every LogRecord has; anything else came from extra= or context()
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_JSON_TYPES = (str, int, float, bool, type(None), list, dict)
+
+_context = ContextVar("log_context", default={})
+
+
+def get_logger(name):
+    """Per-module logger: ``log = get_logger(__name__)``.
+
+    Pass values as arguments (``log.debug("Saved %s", product_id)``) so the
+    message is only formatted when the record is actually emitted.
+    """
+    return logging.getLogger(name)
+
+
+@contextmanager
+def context(**fields):
+    """Add ``fields`` (job_id, store, ...) to every record logged inside the block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        for name, value in _context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Pass 1 in ``every`` DEBUG records of each call site; other levels always pass.
+
+    The per-variant debug lines of a sync repeat thousands of times; a sample
+    still shows what the sync is doing without flooding the log.
+    """
+
+    def __init__(self, every=1):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            seen = self._seen.get(site, 0)
+            self._seen[site] = seen + 1
+        if seen % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+def _fields(record):
+    return {name: value for name, value in vars(record).items() if name not in _RECORD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+    """``time LEVEL logger: message key=value ...``"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{name}={value}" for name, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log pipelines."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in _fields(record).items():
+            entry[name] = value if isinstance(value, _JSON_TYPES) else str(value)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json_codec.dumps(entry)
+
+
+_handler = None
+
+
+def configure(level="INFO", fmt="text", debug_sample=1):
+    """Send all logging to stderr at ``level``; safe to call more than once."""
+    global _handler
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    _handler.addFilter(ContextFilter())
+    _handler.addFilter(SampleFilter(debug_sample))
+    root.addHandler(_handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
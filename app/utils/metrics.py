@@ -0,0 +1,261 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import event
+from app.utils.log import get_logger
+
+# Seconds; suits both Shopify calls and local DB/diff work
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+INF_LE = 'le="+Inf"'
+
+log = get_logger(__name__)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    """Monotonic count per label set: ``counter.inc("US", "product", "ok")``."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in values
+        ]
+
+
+class Gauge(Metric):
+    """Current value per label set, set directly or read at scrape time.
+
+    ``collect`` is called on every scrape and returns ``{labels: value}``; it
+    is the way to expose numbers that live in the database (queue depth,
+    schedules) without keeping them in sync by hand.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+        self.collect = collect
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        if self.collect:
+            try:
+                values.update(self.collect())
+            except Exception as e:
+                log.error("Failed to collect %s: %s", self.name, e)
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in values.items()
+        ]
+
+
+class Histogram(Metric):
+    """Distribution of observed values (seconds) per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                row[index] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def totals(self):
+        """``{labels: (count, sum)}`` of everything observed so far."""
+        with self._lock:
+            return {labels: (row[-1], row[-2]) for labels, row in self._values.items()}
+
+    def render(self):
+        with self._lock:
+            values = [(labels, list(row)) for labels, row in self._values.items()]
+        lines = self.header()
+        for labels, row in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, INF_LE)} {row[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(float(row[-2]))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {row[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics of the sync hot paths ---
+
+shopify_requests = Counter(
+    "shopify_requests_total", "Shopify GraphQL calls.", ("store", "operation", "outcome")
+)
+shopify_request_seconds = Histogram(
+    "shopify_request_seconds", "Shopify GraphQL call latency.", ("store", "operation")
+)
+shopify_query_cost = Counter(
+    "shopify_query_cost_total", "GraphQL cost points actually used.", ("store", "operation")
+)
+shopify_throttle_wait = Counter(
+    "shopify_throttle_wait_seconds_total", "Time spent waiting for the shop's API budget.", ("store",)
+)
+product_save_seconds = Histogram(
+    "product_save_seconds", "Time in save_product_with_variants (diff, DB and writes).", ("store", "outcome")
+)
+db_query_seconds = Histogram(
+    "db_query_seconds", "SQL statement execution time.", ("statement",)
+)
+job_wait_seconds = Histogram(
+    "job_wait_seconds", "Time jobs spent queued before a worker took them.", ("priority",),
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+)
+jobs_finished = Counter(
+    "jobs_finished_total", "Jobs run to an end.", ("kind", "status")
+)
+scheduler_leader = Gauge(
+    "scheduler_leader", "1 while this process holds the scheduler leader lease."
+)
+product_cache_requests = Counter(
+    "product_cache_requests_total", "Product payload cache lookups.", ("store", "result")
+)
+product_cache_invalidations = Counter(
+    "product_cache_invalidations_total", "Cached product payloads dropped.", ("store", "reason")
+)
+single_flight_followers = Counter(
+    "single_flight_followers_total",
+    "Product fetches/saves that found the same one running and shared its result or waited for it.",
+    ("operation", "result"),
+)
+product_cache_evictions = Counter(
+    "product_cache_evictions_total", "Least recently used products dropped to stay within PRODUCT_CACHE_MAX_ENTRIES."
+)
+
+
+def _statement_kind(statement):
+    verb = statement.lstrip()[:6].lower()
+    return verb if verb in ("select", "insert", "update", "delete") else "other"
+
+
+def instrument_engine(engine):
+    """Time every SQL statement into db_query_seconds."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        db_query_seconds.observe(time.perf_counter() - started, _statement_kind(statement))
+
+
+def serve(port, app):
+    """Expose /metrics on ``port`` from a background thread (for worker processes)."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            with app.app_context():
+                body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes every few seconds would drown the worker log
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    log.info("Serving /metrics on port %d", port)
+    return server
@@ -0,0 +1,156 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from app.utils import json_codec, metrics
+from app.utils.log import get_logger
+
+KEY_PREFIX = "synergee:product:"
+
+log = get_logger(__name__)
+
+_backend = None
+_ttl = 0.0
+
+
+class MemoryBackend:
+    """In-process LRU of serialized entries, each expiring on its own."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.product_cache_evictions.inc()
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Entries in Redis, shared by the web and worker processes.
+
+    Needs the redis package. Redis expires the entries; bound its size with
+    the server's maxmemory and an LRU eviction policy (allkeys-lru).
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("PRODUCT_CACHE_URL needs the redis package (pip install redis)") from None
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, px=int(ttl * 1000))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+def configure(ttl, max_entries, url=""):
+    """Set up the cache from config: Redis if ``url`` is set, else in-process; TTL 0 turns it off."""
+    global _backend, _ttl
+    _ttl = ttl
+    if not ttl:
+        _backend = None
+    elif url:
+        _backend = RedisBackend(url)
+    else:
+        _backend = MemoryBackend(max_entries)
+
+
+def set_backend(backend):
+    """Plug in another shared store: any object with get(key), set(key, value, ttl) and delete(key)."""
+    global _backend
+    _backend = backend
+
+
+@lru_cache(maxsize=64)
+def shape(query):
+    # Payloads of different queries (with or without media, ...) are not interchangeable
+    return hashlib.blake2b(query.encode(), digest_size=8).hexdigest()
+
+
+def _key(store, product_id):
+    return f"{KEY_PREFIX}{store['url']}:{product_id}"
+
+
+def _label(store):
+    return store.get("name") or store["url"]
+
+
+def shared():
+    """Whether every process sees the same cache, i.e. it is not the in-process default."""
+    return _backend is not None and not isinstance(_backend, MemoryBackend)
+
+
+def get(store, product_id, query, stale=None):
+    """The product's cached payload, as ``query`` would return it, or None.
+
+    ``stale()``, if given, is asked before a hit is served; True makes it a miss.
+    """
+    if _backend is None or not product_id:
+        return None
+    try:
+        raw = _backend.get(_key(store, product_id))
+    except Exception as e:
+        log.warning("Product cache read failed: %s", e)
+        raw = None
+    entry = json_codec.loads(raw) if raw else None
+    hit = entry is not None and entry["shape"] == shape(query) and not (stale and stale())
+    metrics.product_cache_requests.inc(_label(store), "hit" if hit else "miss")
+    return entry["data"] if hit else None
+
+
+def put(store, product_id, query, data):
+    """Cache the payload ``query`` returned for the product."""
+    if _backend is None or not product_id or not data:
+        return
+    try:
+        _backend.set(_key(store, product_id), json_codec.dumps_bytes({"shape": shape(query), "data": data}), _ttl)
+    except Exception as e:
+        log.warning("Product cache write failed: %s", e)
+
+
+def invalidate(store, product_id, reason):
+    """Drop the product's payload: it changed in Shopify (``reason`` webhook) or we wrote to it (write)."""
+    if _backend is None or not product_id:
+        return
+    try:
+        _backend.delete(_key(store, product_id))
+    except Exception as e:
+        log.warning("Product cache invalidation failed: %s", e)
+    metrics.product_cache_invalidations.inc(_label(store), reason)
+
+
+def _entries():
+    return {(): len(_backend)} if isinstance(_backend, MemoryBackend) else {}
+
+
+metrics.Gauge("product_cache_entries", "Products in the in-process product cache.", collect=_entries)
@@ -0,0 +1,162 @@
+import cProfile
+import functools
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from flask import current_app, g, request
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Header that profiles a single request of a logged-in user
+PROFILE_HEADER = "X-Profile"
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_active = ContextVar("active_profile", default=None)
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval.
+
+    The result is in collapsed-stack format (``outer;inner;leaf count`` per
+    line), which flamegraph.pl, speedscope and inferno read directly. Unlike
+    cProfile it does not slow down the profiled code, only costs a little CPU
+    in its own thread.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _timestamp():
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+
+
+def _short_path(filename):
+    return os.path.relpath(filename, _ROOT) if filename.startswith(_ROOT) else os.path.basename(filename)
+
+
+def enabled(target):
+    """Whether PROFILE switches profiling on for ``target`` (or "all")."""
+    setting = current_app.config["PROFILE"]
+    if not setting:
+        return False
+    targets = {t.strip() for t in setting.split(",")}
+    return target in targets or "all" in targets
+
+
+@contextmanager
+def profile(target, tag=None, force=False):
+    """Profile the block if PROFILE enables ``target`` (or ``force``).
+
+    Writes ``<target>-<tag>-<pid>`` plus ``.collapsed`` (sampling, the
+    default) or ``.pstats`` (PROFILE_MODE=cprofile) to PROFILE_DIR and yields
+    its path, or None when not profiling. Nested blocks are part of the outer
+    profile. When profiling is off this only checks a setting.
+    """
+    if _active.get() is not None or not (force or enabled(target)):
+        yield None
+        return
+
+    from app.utils import jobs
+
+    cfg = current_app.config
+    tag = tag or _timestamp()
+    deterministic = cfg["PROFILE_MODE"] == "cprofile"
+    os.makedirs(cfg["PROFILE_DIR"], exist_ok=True)
+    path = os.path.join(
+        cfg["PROFILE_DIR"], f"{target}-{tag}-{os.getpid()}.{'pstats' if deterministic else 'collapsed'}"
+    )
+
+    if deterministic:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = StackSampler(threading.get_ident(), cfg["PROFILE_INTERVAL_SECONDS"])
+        profiler.start()
+    token = _active.set(path)
+    jobs.progress(profile=os.path.basename(path))
+    try:
+        yield path
+    finally:
+        _active.reset(token)
+        if deterministic:
+            profiler.disable()
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            profiler.write(path)
+        log.info("Wrote %s profile to %s", target, path)
+
+
+def profiled(target):
+    """Decorator form of profile(); tags the file with the current job's ID."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            from app.utils import jobs
+
+            job_id = jobs.current_job_id()
+            with profile(target, tag=f"job{job_id}" if job_id else None):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def init_app(app):
+    """Profile requests: all of them with PROFILE=requests, or one by header."""
+
+    @app.before_request
+    def _start_request_profile():
+        forced = request.headers.get(PROFILE_HEADER) == "1" and _may_profile()
+        if not forced and not enabled("requests"):
+            return
+        g._profile = profile("requests", tag=f"{request.endpoint}-{_timestamp()}", force=True)
+        g._profile.__enter__()
+
+    @app.teardown_request
+    def _stop_request_profile(exc):
+        ctx = g.pop("_profile", None)
+        if ctx is not None:
+            ctx.__exit__(None, None, None)
+
+
+def _may_profile():
+    from flask_login import current_user
+
+    return current_user.is_authenticated
@@ -14,3 +14,28 @@ def error_response(message="An error occurred", code=400, data=None):
         "message": message,
         "data": data
     }), code
+
+# Job handlers return plain dicts (stored as JSON on the job); job_response turns them into replies
+def success_result(data=None, message="Success", code=200, status="success"):
+    return {"status": status, "message": message, "data": data, "code": code}
+
+def error_result(message="An error occurred", code=400, data=None):
+    return {"status": "error", "message": message, "data": data, "code": code}
+
+def job_response(job):
+    """Reply with a finished job's result, or 202 with its ID while it is pending."""
+    if not job.finished:
+        return success_response(
+            message="The request is queued behind other work. Check the job for its result.",
+            status="queued",
+            data={"job_id": job.id, "job_status": job.status},
+            code=202
+        )
+    if job.status == "failed" or not job.result:
+        return error_response(f"Job failed: {job.error}", 500, data={"job_id": job.id})
+    result = job.result
+    return jsonify({
+        "status": result.get("status", "success"),
+        "message": result.get("message"),
+        "data": result.get("data")
+    }), result.get("code", 200)
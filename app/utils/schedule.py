@@ -0,0 +1,137 @@
+from datetime import timedelta
+from flask import current_app
+from app import db
+from app.models import Shop, StoreSchedule, utcnow
+from app.utils import metrics
+
+# Weight of the latest observation in the smoothed change/webhook rates
+RATE_SMOOTHING = 0.5
+
+# An interval moves at most this factor per sync, so one odd run cannot swing it
+MAX_STEP = 2.0
+
+
+def _config():
+    cfg = current_app.config
+    return {
+        "default": cfg["SYNC_INTERVAL_SECONDS"],
+        "min": cfg["SYNC_MIN_INTERVAL_SECONDS"],
+        "max": cfg["SYNC_MAX_INTERVAL_SECONDS"],
+        "target_changes": cfg["SYNC_TARGET_CHANGES"],
+    }
+
+
+def next_interval(current, change_rate, webhook_rate, cfg):
+    """Seconds until the next full sync of a store.
+
+    ``change_rate`` is what the sync itself found to fix (changes webhooks did
+    not cover), per hour. Aim for about ``target_changes`` such changes per
+    sync; with none observed, back off. A store without webhook traffic relies
+    on the sync alone, so it never backs off past the default interval.
+    """
+    upper = cfg["max"] if webhook_rate > 0 else min(cfg["max"], cfg["default"])
+    if change_rate > 0:
+        wanted = cfg["target_changes"] / change_rate * 3600
+    else:
+        wanted = current * MAX_STEP
+    wanted = max(current / MAX_STEP, min(current * MAX_STEP, wanted))
+    return int(max(cfg["min"], min(upper, wanted)))
+
+
+def _smooth(old, observed):
+    return RATE_SMOOTHING * observed + (1 - RATE_SMOOTHING) * old
+
+
+def get_schedule(store):
+    """The store's schedule row, created on first use.
+
+    A new row is due one default interval after the store's last full sync,
+    or right away if it was never synced.
+    """
+    schedule = StoreSchedule.query.filter_by(domain=store["url"]).first()
+    if schedule:
+        return schedule
+    interval = _config()["default"]
+    shop = Shop.query.filter_by(domain=store["url"]).first()
+    last_synced_at = shop.last_synced_at if shop else None
+    schedule = StoreSchedule(
+        domain=store["url"],
+        store_name=store["name"],
+        interval_seconds=interval,
+        last_run_at=last_synced_at,
+        next_run_at=last_synced_at + timedelta(seconds=interval) if last_synced_at else utcnow(),
+        change_rate=0.0,
+        webhook_rate=0.0,
+        webhooks_since_run=0,
+    )
+    db.session.add(schedule)
+    db.session.commit()
+    return schedule
+
+
+def is_due(store, now=None):
+    return get_schedule(store).next_run_at <= (now or utcnow())
+
+
+def record_webhook(store):
+    schedule = get_schedule(store)
+    StoreSchedule.query.filter_by(id=schedule.id).update(
+        {StoreSchedule.webhooks_since_run: StoreSchedule.webhooks_since_run + 1}
+    )
+    db.session.commit()
+
+
+def record_sync(store, products_changed):
+    """Fold a finished full sync into the store's rates and pick the next run."""
+    cfg = _config()
+    schedule = get_schedule(store)
+    now = utcnow()
+
+    if schedule.last_run_at:
+        hours = max((now - schedule.last_run_at).total_seconds(), 60) / 3600
+        schedule.change_rate = _smooth(schedule.change_rate, products_changed / hours)
+        schedule.webhook_rate = _smooth(schedule.webhook_rate, schedule.webhooks_since_run / hours)
+        schedule.interval_seconds = next_interval(
+            schedule.interval_seconds, schedule.change_rate, schedule.webhook_rate, cfg
+        )
+    # else: first sync of a fresh database changes everything; it says nothing about the rate
+
+    schedule.store_name = store["name"]
+    schedule.last_run_at = now
+    schedule.webhooks_since_run = 0
+    schedule.next_run_at = now + timedelta(seconds=schedule.interval_seconds)
+    db.session.commit()
+    return schedule
+
+
+def record_failure(store):
+    """Retry a failed sync after the minimum interval; rates are left alone."""
+    db.session.rollback()
+    schedule = get_schedule(store)
+    schedule.next_run_at = utcnow() + timedelta(seconds=_config()["min"])
+    db.session.commit()
+
+
+def _seconds_until_due():
+    now = utcnow()
+    return {
+        (schedule.store_name or schedule.domain,): round((schedule.next_run_at - now).total_seconds(), 3)
+        for schedule in StoreSchedule.query.all()
+    }
+
+
+def _interval_seconds():
+    return {
+        (schedule.store_name or schedule.domain,): schedule.interval_seconds
+        for schedule in StoreSchedule.query.all()
+    }
+
+
+metrics.Gauge(
+    "store_sync_due_in_seconds", "Seconds until the store's next full sync (negative: overdue).",
+    ("store",), collect=_seconds_until_due
+)
+metrics.Gauge(
+    "store_sync_interval_seconds", "Current adaptive sync interval of the store.",
+    ("store",), collect=_interval_seconds
+)
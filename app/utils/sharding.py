@@ -0,0 +1,98 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from app import db
+from app.models import Product, Shop
+from app.utils import jobs, throttle
+
+# Set in a shard worker process
+_app = None
+_job_id = None
+_counters = None
+
+
+def product_number(gid):
+    return int(gid.rsplit("/", 1)[-1])
+
+
+def plan_shards(store, count):
+    """Split the store's catalog into ``count`` disjoint product ID ranges.
+
+    Returns Shopify search queries for the products ``query`` argument. The
+    split points are quantiles of the product IDs we already know, and the
+    first and last ranges are open-ended, so products created since the last
+    sync still land in exactly one shard. ``[None]`` means no sharding.
+    """
+    shop = Shop.query.filter_by(domain=store["url"]).first()
+    if count <= 1 or not shop:
+        return [None]
+    ids = sorted(
+        product_number(shopify_id)
+        for (shopify_id,) in db.session.query(Product.shopify_id).filter(Product.shop_id == shop.id)
+    )
+    bounds = sorted({ids[len(ids) * i // count] for i in range(1, count)}) if len(ids) >= count else []
+    if not bounds:
+        return [None]
+
+    queries = [f"id:<{bounds[0]}"]
+    queries += [f"id:>={low} AND id:<{high}" for low, high in zip(bounds, bounds[1:])]
+    queries.append(f"id:>={bounds[-1]}")
+    return queries
+
+
+def _init_worker(shop_url, bucket, job_id, counters):
+    global _app, _job_id, _counters
+    from app import create_app
+    _app = create_app()
+    _job_id, _counters = job_id, counters
+    throttle.install(shop_url, bucket)
+
+
+def _run_in_app(fn, *args):
+    with _app.app_context(), jobs.shard_progress(_job_id, _counters):
+        return fn(*args)
+
+
+def _relay(counters, reported):
+    # Hand the shards' counters on to the job, as increments since the last call
+    for name, counter in counters.items():
+        value = counter.value
+        jobs.advance(name, value - reported.get(name, 0))
+        reported[name] = value
+
+
+def run_shards(store, queries, fn):
+    """Run ``fn(store, query)`` for every shard, each in its own process.
+
+    The processes share one throttle bucket for the store, so together they
+    stay inside the shop's API budget. Inside a job, the shards' events and
+    page/product counts show in the job's progress as they go, and a cancel
+    request stops them all at their next checkpoint (raising Cancelled here).
+    Returns the results in shard order; a shard that raised is returned as
+    its exception.
+    """
+    # spawn: never fork a process holding DB connections and lease threads
+    context = multiprocessing.get_context("spawn")
+    bucket = throttle.shared_bucket(store["url"], context)
+    counters = {name: context.Value("q", 0) for name in jobs.SHARD_COUNTERS}
+    reported = {}
+    with ProcessPoolExecutor(
+        max_workers=len(queries),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(store["url"], bucket, jobs.current_job_id(), counters),
+    ) as pool:
+        futures = [pool.submit(_run_in_app, fn, store, query) for query in queries]
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=jobs.PROGRESS_FLUSH_SECONDS)
+            _relay(counters, reported)
+            jobs.checkpoint()
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+    if any(isinstance(result, jobs.Cancelled) for result in results):
+        raise jobs.Cancelled()
+    return results
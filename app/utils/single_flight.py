@@ -0,0 +1,56 @@
+import threading
+from app.utils import metrics
+
+_flights = {}
+_lock = threading.Lock()
+
+
+class Flight:
+    """A call in progress; callers that join it wait for and share its outcome."""
+
+    __slots__ = ("context", "done", "result", "error")
+
+    def __init__(self, context):
+        self.context = context
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def do(key, fn, context=None, joins=None):
+    """Run ``fn`` once for concurrent callers with the same key in this process.
+
+    A caller that finds a call with the key running shares its result (or
+    exception) if ``joins(flight)`` says so, by default always. Otherwise it
+    waits for that call to finish and then runs its own. ``fn`` gets the
+    flight it waited behind, or None; ``context`` is kept on the caller's
+    own flight for the ones after it to look at. ``key[0]`` names the
+    operation in the metrics.
+    """
+    previous = None
+    while True:
+        with _lock:
+            flight = _flights.get(key)
+            if flight is None:
+                flight = _flights[key] = Flight(context)
+                break
+        if joins is None or joins(flight):
+            metrics.single_flight_followers.inc(key[0], "shared")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        metrics.single_flight_followers.inc(key[0], "waited")
+        flight.done.wait()
+        previous = flight
+
+    try:
+        flight.result = fn(previous)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            del _flights[key]
+        flight.done.set()
@@ -0,0 +1,86 @@
+from datetime import datetime
+from sqlalchemy import case, func
+from app import db
+from app.models import Product, Shop, Variant, utcnow
+
+
+def variant_image_count():
+    # Variant.urls holds a JSON array, but older rows were saved as a JSON-encoded
+    # string containing the array, so unwrap that case before counting.
+    url_type = func.json_type(Variant.urls)
+    return case(
+        (url_type == "array", func.json_array_length(Variant.urls)),
+        (url_type == "text", func.json_array_length(func.json_extract(Variant.urls, "$"))),
+        else_=0,
+    )
+
+
+def seconds_since(timestamp, now):
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, str):
+        # Aggregates like MAX() come back from SQLite as raw strings
+        timestamp = datetime.fromisoformat(timestamp)
+    return int((now - timestamp).total_seconds())
+
+
+def collect_shop_stats():
+    """Per-shop counts, image health and sync ages from two grouped queries."""
+    now = utcnow()
+
+    product_rows = (
+        db.session.query(
+            Shop.id,
+            Shop.name,
+            Shop.domain,
+            Shop.last_synced_at,
+            func.count(Product.id),
+            func.max(Product.updated_at),
+        )
+        .outerjoin(Product, Product.shop_id == Shop.id)
+        .group_by(Shop.id)
+        .order_by(Shop.id)
+        .all()
+    )
+
+    # Evaluate the JSON length once per variant, then aggregate per shop
+    per_variant = (
+        db.session.query(
+            Variant.product_id.label("product_id"),
+            variant_image_count().label("image_count"),
+        )
+        .subquery()
+    )
+    variant_rows = (
+        db.session.query(
+            Product.shop_id,
+            func.count(),
+            func.count(func.distinct(per_variant.c.product_id)),
+            func.coalesce(func.sum(per_variant.c.image_count), 0),
+            func.coalesce(func.sum(case((per_variant.c.image_count > 0, 1), else_=0)), 0),
+        )
+        .join(per_variant, per_variant.c.product_id == Product.id)
+        .group_by(Product.shop_id)
+        .all()
+    )
+    variants_by_shop = {row[0]: row[1:] for row in variant_rows}
+
+    shops = []
+    for shop_id, name, domain, last_synced_at, products, last_product_update in product_rows:
+        variants, products_with_variants, images, variants_with_images = variants_by_shop.get(shop_id, (0, 0, 0, 0))
+        shops.append({
+            "id": shop_id,
+            "name": name,
+            "domain": domain,
+            "products": products,
+            "variants": variants,
+            "images": images,
+            "health": {
+                "variants_with_images": variants_with_images,
+                "variants_without_images": variants - variants_with_images,
+                "products_without_variants": products - products_with_variants,
+            },
+            "last_sync_age_seconds": seconds_since(last_synced_at, now),
+            "last_product_update_age_seconds": seconds_since(last_product_update, now),
+        })
+    return shops
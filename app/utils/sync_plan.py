@@ -0,0 +1,140 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event, inspect
+from app.utils import json_codec
+
+# Shopify charges a flat 10 points for most mutations (fileCreate, metafieldsSet)
+MUTATION_COST = 10
+
+_current_plan = ContextVar("current_sync_plan", default=None)
+
+
+class PlannedResponse:
+    """Stands in for a requests.Response of a mutation that was not sent."""
+
+    status_code = 200
+
+    def __init__(self, data):
+        self._parsed_json = data
+        self.content = json_codec.dumps_bytes(data)
+
+    def json(self, **kwargs):
+        return self._parsed_json
+
+
+class SyncPlan:
+    """What a sync would do: Shopify writes, DB changes and their API cost."""
+
+    def __init__(self):
+        self.products = 0
+        self.products_changed = 0
+        self.uploads = []
+        self.metafield_writes = []
+        self.inserts = {}
+        self.updates = {}
+        self.read_calls = 0
+        self.read_cost = 0
+        self.write_calls = 0
+        self._planned_ids = 0
+
+    def _planned_id(self, kind):
+        self._planned_ids += 1
+        return f"gid://planned/{kind}/{self._planned_ids}"
+
+    def record_read(self, json_data):
+        self.read_calls += 1
+        cost = ((json_data or {}).get("extensions") or {}).get("cost") or {}
+        self.read_cost += int(cost.get("actualQueryCost") or cost.get("requestedQueryCost") or 0)
+
+    def record_mutation(self, variables):
+        """Record a mutation and answer it the way Shopify would on success."""
+        self.write_calls += 1
+        variables = variables or {}
+
+        if "files" in variables:
+            files = []
+            for f in variables["files"]:
+                file_id = self._planned_id("File")
+                self.uploads.append({"source": f.get("originalSource"), "alt": f.get("alt"), "planned_id": file_id})
+                files.append({"id": file_id, "alt": f.get("alt"), "fileStatus": "PLANNED"})
+            return PlannedResponse({"data": {"fileCreate": {"files": files, "userErrors": []}}})
+
+        if "metafields" in variables:
+            metafields = []
+            for mf in variables["metafields"]:
+                self.metafield_writes.append({
+                    "owner_id": mf.get("ownerId"),
+                    "namespace": mf.get("namespace"),
+                    "key": mf.get("key"),
+                    "value": json_codec.loads(mf["value"]) if mf.get("value") else mf.get("value"),
+                })
+                metafields.append({"id": self._planned_id("Metafield"), "key": mf.get("key"), "namespace": mf.get("namespace")})
+            return PlannedResponse({"data": {"metafieldsSet": {"metafields": metafields, "userErrors": []}}})
+
+        return PlannedResponse({"data": {}})
+
+    def record_row(self, obj, inserted):
+        table = obj.__tablename__
+        key = getattr(obj, "shopify_id", None) or getattr(obj, "domain", None) or getattr(obj, "id", None)
+        if inserted:
+            self.inserts.setdefault(table, set()).add(key)
+        elif key not in self.inserts.get(table, ()):
+            self.updates.setdefault(table, set()).add(key)
+
+    def to_dict(self):
+        write_cost = self.write_calls * MUTATION_COST
+        return {
+            "summary": {
+                "products": self.products,
+                "products_changed": self.products_changed,
+                "uploads": len(self.uploads),
+                "metafield_writes": len(self.metafield_writes),
+                "db_inserts": sum(len(keys) for keys in self.inserts.values()),
+                "db_updates": sum(len(keys) for keys in self.updates.values()),
+            },
+            "api": {
+                "read_calls": self.read_calls,
+                "read_cost": self.read_cost,
+                "write_calls": self.write_calls,
+                "write_cost_estimate": write_cost,
+                "total_cost_estimate": self.read_cost + write_cost,
+            },
+            "uploads": self.uploads,
+            "metafield_writes": self.metafield_writes,
+            "db": {
+                "inserts": {table: sorted(map(str, keys)) for table, keys in self.inserts.items()},
+                "updates": {table: sorted(map(str, keys)) for table, keys in self.updates.items()},
+            },
+        }
+
+
+def current_plan():
+    return _current_plan.get()
+
+
+@contextmanager
+def planning():
+    """Run the block as a dry run: nothing is written to Shopify or the DB."""
+    plan = SyncPlan()
+    token = _current_plan.set(plan)
+    try:
+        yield plan
+    finally:
+        _current_plan.reset(token)
+
+
+def _record_planned_rows(session, flush_context, instances):
+    plan = _current_plan.get()
+    if plan is None:
+        return
+    for obj in session.new:
+        plan.record_row(obj, inserted=True)
+    for obj in session.dirty:
+        if session.is_modified(obj) and inspect(obj).persistent:
+            plan.record_row(obj, inserted=False)
+
+
+def instrument_session(session):
+    """Record rows the sync would insert or update while a plan is active."""
+    if not event.contains(session, "before_flush", _record_planned_rows):
+        event.listen(session, "before_flush", _record_planned_rows)
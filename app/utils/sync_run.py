@@ -0,0 +1,196 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from app import db
+from app.models import Shop, SyncRun, utcnow
+from app.utils.jobs import Cancelled
+from app.utils.log import get_logger
+
+STAGES = ("fetch", "diff", "db", "write")
+
+log = get_logger(__name__)
+
+_current_run = ContextVar("current_sync_run", default=None)
+
+
+class SyncRunTracker:
+    """Counters and per-stage timings for one store sync.
+
+    Stage time is exclusive: time spent in a nested stage (e.g. a DB query
+    inside the diff) is charged to the inner stage only.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.counts = {
+            "pages": 0,
+            "products": 0,
+            "products_changed": 0,
+            "uploads": 0,
+            "metafield_writes": 0,
+            "api_calls": 0,
+            "api_cost": 0,
+        }
+        self.errors = []
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self._stack = []  # [name, started, child_seconds]
+
+    def count(self, name, amount=1):
+        self.counts[name] += amount
+
+    def error(self, message):
+        self.errors.append(message)
+
+    def enter(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def snapshot(self):
+        """Picklable totals, to ship a shard's work back to the parent run."""
+        return {"counts": dict(self.counts), "errors": list(self.errors), "stage_seconds": dict(self.stage_seconds)}
+
+    def merge(self, snapshot):
+        """Add a shard's totals; stage times are summed across shards."""
+        for name, value in snapshot["counts"].items():
+            self.counts[name] += value
+        self.errors.extend(snapshot["errors"])
+        for name, seconds in snapshot["stage_seconds"].items():
+            self.stage_seconds[name] += seconds
+
+    def exit(self, name):
+        if not self._stack or self._stack[-1][0] != name:
+            return
+        _, started, child_seconds = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        self.stage_seconds[name] += elapsed - child_seconds
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+
+def current_run():
+    return _current_run.get()
+
+
+def count(name, amount=1):
+    run = _current_run.get()
+    if run is not None:
+        run.count(name, amount)
+
+
+def record_error(message):
+    run = _current_run.get()
+    if run is not None:
+        run.error(message)
+
+
+@contextmanager
+def stage(name):
+    run = _current_run.get()
+    if run is None:
+        yield
+        return
+    run.enter(name)
+    try:
+        yield
+    finally:
+        run.exit(name)
+
+
+def record_api_response(query, variables, json_data):
+    """Account one Shopify GraphQL call against the active run."""
+    run = _current_run.get()
+    if run is None:
+        return
+    run.count("api_calls")
+    variables = variables or {}
+    if "files" in variables:
+        run.count("uploads", len(variables["files"]))
+    if "metafields" in variables:
+        run.count("metafield_writes", len(variables["metafields"]))
+    cost = ((json_data or {}).get("extensions") or {}).get("cost") or {}
+    used = cost.get("actualQueryCost")
+    if used is None:
+        used = cost.get("requestedQueryCost") or 0
+    run.count("api_cost", int(used))
+
+
+def is_mutation(query):
+    return query.lstrip().startswith("mutation")
+
+
+@contextmanager
+def track_sync_run(store):
+    """Record a SyncRun row for everything done inside the block."""
+    sync_run = SyncRun(store_name=store.get("name"), status="running", started_at=utcnow())
+    db.session.add(sync_run)
+    db.session.commit()
+    run_id = sync_run.id
+
+    tracker = SyncRunTracker(store)
+    token = _current_run.set(tracker)
+    status = "succeeded"
+    try:
+        yield tracker
+    except Cancelled:
+        status = "cancelled"
+        tracker.error("Sync cancelled")
+        raise
+    except Exception as e:
+        status = "failed"
+        tracker.error(f"Sync aborted: {e}")
+        raise
+    finally:
+        _current_run.reset(token)
+        finish_sync_run(run_id, tracker, status)
+
+
+@contextmanager
+def collect_run(store):
+    """Track the block like a sync run, without a SyncRun row of its own."""
+    tracker = SyncRunTracker(store)
+    token = _current_run.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_run.reset(token)
+
+
+def finish_sync_run(run_id, tracker, status):
+    try:
+        db.session.rollback()
+        sync_run = db.session.get(SyncRun, run_id)
+        shop = Shop.query.filter_by(domain=tracker.store.get("url")).first()
+        sync_run.shop_id = shop.id if shop else None
+        sync_run.status = status
+        sync_run.finished_at = utcnow()
+        for name, value in tracker.counts.items():
+            setattr(sync_run, name, value)
+        sync_run.errors = tracker.errors[-100:]  # keep the row small on very bad runs
+        for name, seconds in tracker.stage_seconds.items():
+            setattr(sync_run, f"{name}_seconds", round(seconds, 3))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.error("Failed to save run %s: %s", run_id, e)
+
+
+def instrument_engine(engine):
+    """Charge SQL execution time to the 'db' stage of the active run."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        run = _current_run.get()
+        if run is not None:
+            run.enter("db")
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        run = _current_run.get()
+        if run is not None:
+            run.exit("db")
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        run = _current_run.get()
+        if run is not None:
+            run.exit("db")
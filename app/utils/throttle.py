@@ -0,0 +1,107 @@
+import threading
+import time
+
+# Used until a query's real cost has been seen once
+DEFAULT_QUERY_COST = 50
+
+# Indexes into a bucket's state
+AVAILABLE, MAXIMUM, RESTORE_RATE, UPDATED_AT = range(4)
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_expected_cost = {}
+
+
+class CostBucket:
+    """Client-side mirror of Shopify's GraphQL leaky bucket for one shop.
+
+    Shopify reports the bucket after every call (``extensions.cost
+    .throttleStatus``); until the first report nothing is known and calls are
+    never delayed. ``state`` and ``lock`` can be multiprocessing objects so
+    worker processes syncing shards of one store share a single budget.
+    """
+
+    def __init__(self, state=None, lock=None):
+        self.state = state if state is not None else [0.0, 0.0, 0.0, 0.0]
+        self.lock = lock or threading.Lock()
+
+    def _available(self, now):
+        state = self.state
+        refill = (now - state[UPDATED_AT]) * state[RESTORE_RATE]
+        return min(state[MAXIMUM], state[AVAILABLE] + refill)
+
+    def acquire(self, cost):
+        """Reserve ``cost`` points, sleeping until the bucket has refilled enough.
+
+        Returns the seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                state = self.state
+                if not state[MAXIMUM] or not state[RESTORE_RATE]:
+                    return waited
+                now = time.time()
+                available = self._available(now)
+                cost = min(cost, state[MAXIMUM])
+                if available >= cost:
+                    state[AVAILABLE] = available - cost
+                    state[UPDATED_AT] = now
+                    return waited
+                delay = (cost - available) / state[RESTORE_RATE]
+            time.sleep(delay)
+            waited += delay
+
+    def update(self, throttle_status):
+        """Take Shopify's own view of the bucket after a call."""
+        with self.lock:
+            state = self.state
+            state[AVAILABLE] = float(throttle_status.get("currentlyAvailable", 0))
+            state[MAXIMUM] = float(throttle_status.get("maximumAvailable", 0))
+            state[RESTORE_RATE] = float(throttle_status.get("restoreRate", 0))
+            state[UPDATED_AT] = time.time()
+
+
+def bucket_for(shop_url):
+    with _buckets_lock:
+        bucket = _buckets.get(shop_url)
+        if bucket is None:
+            bucket = _buckets[shop_url] = CostBucket()
+        return bucket
+
+
+def shared_bucket(shop_url, context):
+    """A bucket backed by shared memory of a multiprocessing context.
+
+    It replaces this process's bucket for the shop and is picklable into
+    child processes started from ``context``; see install().
+    """
+    current = bucket_for(shop_url)
+    state = context.Array("d", 4, lock=False)
+    with current.lock:
+        state[:] = list(current.state)
+    bucket = CostBucket(state, context.Lock())
+    install(shop_url, bucket)
+    return bucket
+
+
+def install(shop_url, bucket):
+    with _buckets_lock:
+        _buckets[shop_url] = bucket
+
+
+def expected_cost(query):
+    return _expected_cost.get(query, DEFAULT_QUERY_COST)
+
+
+def wait_for_budget(shop_url, query):
+    return bucket_for(shop_url).acquire(expected_cost(query))
+
+
+def observe(shop_url, query, json_data):
+    """Learn the query's cost and the shop's bucket from a response."""
+    cost = ((json_data or {}).get("extensions") or {}).get("cost") or {}
+    if cost.get("requestedQueryCost") is not None:
+        _expected_cost[query] = cost["requestedQueryCost"]
+    if cost.get("throttleStatus"):
+        bucket_for(shop_url).update(cost["throttleStatus"])
@@ -0,0 +1,129 @@
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app
+from app.utils import json_codec
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+_current_span = ContextVar("current_trace_span", default=None)
+_export_lock = threading.Lock()
+
+
+class Span:
+    """One timed step of a trace; attributes are free-form tags."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def to_dict(self):
+        # Field names follow OpenTelemetry's span model, so a collector can take them as they are
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+
+
+def enabled(target):
+    """Whether TRACE switches tracing on for ``target`` (or "all")."""
+    setting = current_app.config["TRACE"]
+    if not setting:
+        return False
+    targets = {t.strip() for t in setting.split(",")}
+    return target in targets or "all" in targets
+
+
+def _run_span(span):
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        span.trace.spans.append(span)
+        _current_span.reset(token)
+
+
+@contextmanager
+def trace(name, target, **attributes):
+    """Trace the block as the root span of a new trace, if TRACE enables ``target``.
+
+    Inside an active trace this is an ordinary span. The trace is sampled at
+    TRACE_SAMPLE and exported when the root ends, if it took at least
+    TRACE_MIN_MS. Yields the span, or None when not tracing.
+    """
+    parent = _current_span.get()
+    if parent is not None:
+        yield from _run_span(Span(parent.trace, name, parent.span_id, attributes))
+        return
+    cfg = current_app.config
+    if not enabled(target) or random.random() >= cfg["TRACE_SAMPLE"]:
+        yield None
+        return
+
+    root = Span(Trace(), name, None, attributes)
+    try:
+        yield from _run_span(root)
+    finally:
+        if (root.end_ns - root.start_ns) / 1e6 >= cfg["TRACE_MIN_MS"]:
+            export(root.trace, cfg["TRACE_FILE"])
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the block as a child of the current span; no-op outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    yield from _run_span(Span(parent.trace, name, parent.span_id, attributes))
+
+
+def tag(**attributes):
+    """Add attributes to the current span; no-op outside a trace."""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def export(trace, path):
+    """Append the trace's spans to a JSONL file, root span last."""
+    lines = "".join(json_codec.dumps(s.to_dict()) + "\n" for s in trace.spans)
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _export_lock, open(path, "a") as f:
+            f.write(lines)
+    except OSError as e:
+        log.error("Failed to export trace %s: %s", trace.trace_id, e)
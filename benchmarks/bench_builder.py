@@ -0,0 +1,99 @@
+"""Parse cost of ShopifyProductBuilder for one /products page.
+
+Builds a page of synthetic product payloads and measures the time and
+memory of what the /products view does per product (construct the
+builder, then details()) and of the builders fetch_all_products keeps
+alive until each product is saved.
+
+    python benchmarks/bench_builder.py --products 250 --variants 20 --images 8
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.helper import ShopifyProductBuilder  # noqa: E402
+
+STORE = {"name": "Bench", "url": "https://bench.example.com", "token": "x"}
+
+
+def make_product(index, variants, images):
+    media = [
+        {"id": f"gid://shopify/MediaImage/{index}{k}",
+         "image": {"url": f"https://cdn.shopify.com/s/files/1/products/p{index}_{k}.jpg?v=1700000000"}}
+        for k in range(images)
+    ]
+    variant_nodes = []
+    for v in range(variants):
+        urls = [f"https://images.example.com/catalog/p{index}_{(k + v) % images}.jpg" for k in range(images)]
+        filled = v % 2 == 0
+        variant_nodes.append({
+            "title": f"Variant {v}",
+            "id": f"gid://shopify/ProductVariant/{index}{v:03d}",
+            "imagesUrl": {"jsonValue": urls},
+            "assetImagesJson": {"jsonValue": [m["id"] for m in media]} if filled else None,
+        })
+    return {
+        "id": f"gid://shopify/Product/{index}",
+        "title": f"Product {index}",
+        "variantsCount": {"count": variants},
+        "onlineStorePreviewUrl": f"https://bench.example.com/products/{index}",
+        "mediaCount": {"count": images},
+        "featuredMedia": {"image": {"url": media[0]["image"]["url"]}} if media else None,
+        "media": {"nodes": media},
+        "variants": {"nodes": variant_nodes},
+    }
+
+
+def render_page(payloads):
+    # Like the /products view: keep the details of every product on the page
+    pages = []
+    for payload in payloads:
+        product = ShopifyProductBuilder(payload, STORE)
+        pages.append(product.details())
+        product.data_for_put_into_metafield()
+    return pages
+
+
+def build_for_sync(payloads):
+    # Like fetch_all_products: every builder of the store is kept until saved
+    return [ShopifyProductBuilder(payload, STORE) for payload in payloads]
+
+
+def traced(fn, payloads):
+    tracemalloc.start()
+    result = fn(payloads)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=250)
+    parser.add_argument("--variants", type=int, default=20)
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = [make_product(i, args.variants, args.images) for i in range(args.products)]
+    render_page(payloads)  # warm-up
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        render_page(payloads)
+    elapsed = (time.perf_counter() - started) / args.repeat
+
+    page_current, page_peak = traced(render_page, payloads)
+    sync_current, _ = traced(build_for_sync, payloads)
+
+    print(f"{args.products} products x {args.variants} variants x {args.images} images")
+    print(f"time per page:             {elapsed * 1000:8.1f} ms")
+    print(f"time per product:          {elapsed / args.products * 1e6:8.1f} us")
+    print(f"page render peak memory:   {page_peak / 1024:8.1f} KiB")
+    print(f"page details retained:     {page_current / 1024:8.1f} KiB")
+    print(f"sync builders retained:    {sync_current / 1024:8.1f} KiB ({sync_current / args.products:.0f} B/product)")
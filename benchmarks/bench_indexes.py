@@ -0,0 +1,118 @@
+"""Query-time impact of the lookup indexes added in migration 0003.
+
+Builds two identical SQLite mirrors, one with and one without the
+indexes, and times the access patterns used by the sync and the UI.
+
+    python benchmarks/bench_indexes.py --products 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from app import db  # noqa: E402
+from app.models import Product, Shop, Variant, utcnow  # noqa: E402
+
+INDEXES = ("ix_product_shop_id_updated_at", "ix_variant_product_id")
+
+
+def build_database(path, products, variants_per_product, with_indexes):
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        if not with_indexes:
+            for name in INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+        shops = 3
+        conn.execute(Shop.__table__.insert(), [
+            {"id": s + 1, "name": f"Shop {s}", "domain": f"https://shop{s}.example.com"} for s in range(shops)
+        ])
+        rng = random.Random(42)
+        now = utcnow()
+        conn.execute(Product.__table__.insert(), [
+            {"id": p + 1, "shop_id": p % shops + 1, "title": f"Product {p}",
+             "shopify_id": f"gid://shopify/Product/{p}", "updated_at": now}
+            for p in range(products)
+        ])
+        # Insert variants in shuffled product order, as a long-running mirror
+        # ends up after many incremental syncs.
+        product_ids = list(range(1, products + 1))
+        rng.shuffle(product_ids)
+        rows = []
+        for product_id in product_ids:
+            for v in range(variants_per_product):
+                rows.append({
+                    "product_id": product_id,
+                    "shopify_id": f"gid://shopify/ProductVariant/{product_id}-{v}",
+                    "urls": [{"url": f"https://cdn.example.com/{product_id}_{v}.jpg", "name": f"{product_id}_{v}.jpg"}],
+                })
+        conn.execute(Variant.__table__.insert(), rows)
+    return engine
+
+
+def timed(label, fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return label, (time.perf_counter() - started) / repeat * 1000
+
+
+def run_queries(engine, products, repeat):
+    rng = random.Random(7)
+    sample = [rng.randint(1, products) for _ in range(200)]
+    results = []
+    with Session(engine) as session:
+        results.append(timed(
+            "product.variants x200 (lazy load)",
+            lambda: [session.execute(select(Variant.id).where(Variant.product_id == pid)).all() for pid in sample],
+            repeat,
+        ))
+        results.append(timed(
+            "shop.products (one shop)",
+            lambda: session.execute(select(Product.id).where(Product.shop_id == 2)).all(),
+            repeat,
+        ))
+        results.append(timed(
+            "latest changed products per shop",
+            lambda: session.execute(
+                select(Product.id).where(Product.shop_id == 2).order_by(Product.updated_at.desc()).limit(50)
+            ).all(),
+            repeat,
+        ))
+        results.append(timed(
+            "variant count per shop (join)",
+            lambda: session.execute(
+                select(Product.shop_id, func.count(Variant.id)).join(Variant, Variant.product_id == Product.id).group_by(Product.shop_id)
+            ).all(),
+            repeat,
+        ))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--variants", type=int, default=4, help="variants per product")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = {}
+        for with_indexes in (False, True):
+            path = os.path.join(tmp, f"bench_{with_indexes}.db")
+            engine = build_database(path, args.products, args.variants, with_indexes)
+            timings[with_indexes] = run_queries(engine, args.products, args.repeat)
+            engine.dispose()
+
+    print(f"{args.products} products x {args.variants} variants, mean of {args.repeat} runs")
+    print(f"{'query':<38} {'no index':>12} {'indexed':>12} {'speedup':>9}")
+    for (label, before), (_, after) in zip(timings[False], timings[True]):
+        speedup = before / after if after else float("inf")
+        print(f"{label:<38} {before:>10.2f}ms {after:>10.2f}ms {speedup:>8.1f}x")
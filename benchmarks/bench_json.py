@@ -0,0 +1,76 @@
+"""Parse/serialize Shopify product pages with the stdlib and orjson backends.
+
+Pass recorded GetAllProducts responses (raw JSON bodies saved from the
+Admin API) to benchmark real pages; without arguments a synthetic page
+of 250 products is used.
+
+    python benchmarks/bench_json.py recorded/page1.json recorded/page2.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_builder import make_product  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def synthetic_page(products, variants, images):
+    edges = [{"cursor": f"cursor{i}", "node": make_product(i, variants, images)} for i in range(products)]
+    body = {
+        "data": {
+            "productsCount": {"count": products},
+            "products": {
+                "edges": edges,
+                "pageInfo": {"hasNextPage": False, "hasPreviousPage": False,
+                             "endCursor": edges[-1]["cursor"], "startCursor": edges[0]["cursor"]},
+            },
+        },
+        "extensions": {"cost": {"requestedQueryCost": 752, "actualQueryCost": 612}},
+    }
+    return json.dumps(body).encode("utf-8")
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="recorded response bodies")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.pages:
+        bodies = []
+        for path in args.pages:
+            with open(path, "rb") as f:
+                bodies.append((os.path.basename(path), f.read()))
+    else:
+        bodies = [("synthetic 250 products", synthetic_page(250, 20, 8))]
+
+    backends = [("json", json.loads, lambda o: json.dumps(o).encode("utf-8"))]
+    if orjson:
+        backends.append(("orjson", orjson.loads, orjson.dumps))
+    else:
+        print("orjson is not installed; only the stdlib backend is measured")
+
+    print(f"{'page':<28} {'size':>9} {'backend':>8} {'loads ms':>9} {'dumps ms':>9}")
+    for name, body in bodies:
+        parsed = json.loads(body)
+        for backend, loads, dumps in backends:
+            load_ms = best_of(lambda: loads(body), args.repeat)
+            dump_ms = best_of(lambda: dumps(parsed), args.repeat)
+            print(f"{name[:28]:<28} {len(body) / 1024:>7.0f}KB {backend:>8} {load_ms:>9.2f} {dump_ms:>9.2f}")
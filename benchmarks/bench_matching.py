@@ -0,0 +1,94 @@
+"""Image matching cost as products grow to hundreds of media and variants.
+
+Times the three matching paths of ShopifyProductBuilder with Shopify
+calls replaced by canned responses: get_id_from_image_url for every
+variant image, create_not_found_images mapping returned files back to
+candidates, and put_images_into_metafield resolving per-variant errors.
+With hash lookups the per-item cost stays flat as the product grows.
+
+    python benchmarks/bench_matching.py
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.utils.helper as helper  # noqa: E402
+from app.utils.helper import ShopifyProductBuilder  # noqa: E402
+
+STORE = {"name": "Bench", "url": "https://bench.example.com", "token": "x"}
+
+
+class CannedResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self, **kwargs):
+        return self.data
+
+
+def canned_shopify_request(query, shop_url, access_token, variables=None):
+    variables = variables or {}
+    if "files" in variables:
+        # Shopify does not promise to return files in input order
+        files = [{"id": f"gid://shopify/MediaImage/new{i}", "alt": f.get("alt")}
+                 for i, f in enumerate(reversed(variables["files"]))]
+        return CannedResponse({"data": {"fileCreate": {"files": files, "userErrors": []}}})
+    metafields = variables.get("metafields", [])
+    errors = [{"field": ["metafields", str(i), "value"], "message": "invalid"} for i in range(len(metafields))]
+    return CannedResponse({"data": {"metafieldsSet": {"metafields": [], "userErrors": errors}}})
+
+
+def make_product(media_count, variant_count, images_per_variant):
+    media = [{"id": f"gid://shopify/MediaImage/{k}",
+              "image": {"url": f"https://cdn.shopify.com/s/files/1/products/img_{k}.jpg?v=1"}}
+             for k in range(media_count)]
+    variants = []
+    for v in range(variant_count):
+        urls = [f"https://images.example.com/img_{(v * images_per_variant + k) % media_count}.jpg"
+                for k in range(images_per_variant)]
+        variants.append({"title": f"Variant {v}", "id": f"gid://shopify/ProductVariant/{v}",
+                         "imagesUrl": {"jsonValue": urls}, "assetImagesJson": None})
+    return {"id": "gid://shopify/Product/1", "title": "Bench", "media": {"nodes": media},
+            "variants": {"nodes": variants}}
+
+
+def per_item_us(fn, items):
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) / max(items, 1) * 1e6
+
+
+def run(size, images_per_variant):
+    product = ShopifyProductBuilder(make_product(size, size, images_per_variant), STORE)
+    all_urls = [url for variant in product.variant_records for url in variant.image_urls]
+
+    lookup = per_item_us(lambda: [product.get_id_from_image_url(url) for url in all_urls], len(all_urls))
+
+    data = product.data_for_put_into_metafield()["results"]
+    for variant in data:
+        for img in variant["data_images"]:
+            img["needs_upload"] = True
+    upload = per_item_us(lambda: product.create_not_found_images(data), len(all_urls))
+
+    errors = per_item_us(lambda: product.put_images_into_metafield(data), len(data))
+    return lookup, upload, errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="50,100,200,400,800", help="media and variant counts to try")
+    parser.add_argument("--images", type=int, default=4, help="images per variant")
+    args = parser.parse_args()
+
+    helper.shopify_request = canned_shopify_request
+    # The error-map run fails writes on purpose; keep their warnings out of the output and timings
+    logging.getLogger(helper.__name__).setLevel(logging.ERROR)
+
+    print(f"{'media/variants':>15} {'lookup us/url':>14} {'upload map us/img':>18} {'error map us/variant':>21}")
+    for size in (int(n) for n in args.sizes.split(",")):
+        lookup, upload, errors = run(size, args.images)
+        print(f"{size:>15} {lookup:>14.2f} {upload:>18.2f} {errors:>21.2f}")
@@ -0,0 +1,251 @@
+"""Full and incremental sync throughput against the local Shopify stand-in.
+
+For every catalog size this generates a reproducible catalog (catalog.py),
+serves it from shopify_standin.py in its own process and syncs it into a
+fresh SQLite mirror with sync_store(): once from scratch, then again after
+catalog.mutate() edited a share of the variants. Each size is synced in a
+separate process, so peak RSS is that of the sync alone (with --shards > 1
+the shard processes are not included).
+
+Records products/s, API calls and cost per product, peak RSS, SQL time
+and the sync run's stage times as JSON; --compare prints the change
+against an earlier result file.
+
+    python benchmarks/bench_sync.py --sizes 1000,10000,100000 --output sync-baseline.json
+    python benchmarks/bench_sync.py --sizes 1000,10000 --compare sync-baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from catalog import describe, generate  # noqa: E402
+from shopify_standin import add_server_options  # noqa: E402
+
+SHOP_PREFIX = "/bench"
+
+# Compared by --compare; True when higher is better
+HEADLINE = {
+    "products_per_second": True,
+    "api_calls_per_product": False,
+    "api_cost_per_product": False,
+    "peak_rss_mb": False,
+    "db_seconds": False,
+}
+
+
+def http_json(url, method="GET"):
+    with urllib.request.urlopen(urllib.request.Request(url, method=method)) as response:
+        return json.loads(response.read())
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# --- child: one size, run inside the app ---
+
+def run_phase(store, standin_url):
+    from app.models import SyncRun
+    from app.routes.api import sync_store
+    from app.utils import metrics
+
+    def calls():
+        return http_json(f"{standin_url}/stats").get(SHOP_PREFIX, {}).get("calls", {})
+
+    def sql_seconds():
+        return sum(total for _, total in metrics.db_query_seconds.totals().values())
+
+    calls_before, sql_before = calls(), sql_seconds()
+    started = time.perf_counter()
+    sync_store(store)
+    seconds = time.perf_counter() - started
+    sql = sql_seconds() - sql_before
+    by_operation = {op: n - calls_before.get(op, 0) for op, n in calls().items() if n - calls_before.get(op, 0)}
+
+    run = SyncRun.query.order_by(SyncRun.id.desc()).first()
+    products = run.products or 1
+    api_calls = sum(by_operation.values())
+    return {
+        "seconds": round(seconds, 3),
+        "products": run.products,
+        "products_changed": run.products_changed,
+        "products_per_second": round(run.products / seconds, 1),
+        "api_calls": api_calls,
+        "api_calls_per_product": round(api_calls / products, 3),
+        "api_calls_by_operation": by_operation,
+        "api_cost_per_product": round(run.api_cost / products, 2),
+        "uploads": run.uploads,
+        "metafield_writes": run.metafield_writes,
+        "db_seconds": round(sql, 3),
+        "stage_seconds": {
+            "fetch": round(run.fetch_seconds, 3),
+            "diff": round(run.diff_seconds, 3),
+            "db": round(run.db_seconds, 3),
+            "write": round(run.write_seconds, 3),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_child(args):
+    from flask_migrate import upgrade
+    from app import create_app
+    from app.utils.helper import STORES
+
+    app = create_app()
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        store = STORES["shop1"]
+        results = {"full": run_phase(store, args.standin)}
+        http_json(f"{args.standin}/mutate?fraction={args.mutate}&seed={args.seed}", method="POST")
+        results["incremental"] = run_phase(store, args.standin)
+    print(json.dumps(results))
+
+
+# --- parent: catalogs, stand-in processes and the report ---
+
+def server_argv(args):
+    argv = []
+    for option in ("latency", "jitter", "product_cost", "restore_rate",
+                   "http_error_rate", "graphql_error_rate", "user_error_rate"):
+        argv += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    return argv
+
+
+def run_size(products, args, workdir):
+    catalog = generate(products, (args.min_variants, args.max_variants), (args.min_images, args.max_images), args.seed)
+    catalog_path = os.path.join(workdir, f"catalog-{products}.json")
+    with open(catalog_path, "w") as f:
+        json.dump(catalog, f)
+    summary = describe(catalog)
+    del catalog
+
+    server = subprocess.Popen(
+        [sys.executable, "-u", os.path.join(BENCH_DIR, "shopify_standin.py"),
+         "--port", "0", "--catalog", catalog_path, "--seed", str(args.seed)] + server_argv(args),
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        standin_url = server.stdout.readline().split(" on ")[1].split()[0]
+        db_path = os.path.join(workdir, f"mirror-{products}.db")
+        env = dict(
+            os.environ,
+            FLASK_ENV="development",
+            DEV_DATABASE_URI=f"sqlite:///{db_path}",
+            SHOPIFY_API_VERSION="2025-01",
+            SHOP1_NAME="Bench", SHOP1_URL=standin_url + SHOP_PREFIX, SHOP1_TOKEN="bench",
+            SHOP2_URL="", SHOP3_URL="",
+            SYNC_SHARDS=str(args.shards),
+            LOG_LEVEL="WARNING",
+        )
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--standin", standin_url,
+             "--mutate", str(args.mutate), "--seed", str(args.seed)],
+            env=env, cwd=ROOT, stdout=subprocess.PIPE, text=True, check=True,
+        )
+        phases = json.loads(child.stdout.strip().splitlines()[-1])
+    finally:
+        server.terminate()
+        server.wait()
+    return {"catalog": summary, **phases}
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        import orjson  # noqa: F401
+        json_backend = "orjson"
+    except ImportError:
+        json_backend = "stdlib"
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "json": json_backend,
+    }
+
+
+def compare(current, baseline):
+    old_by_size = {r["catalog"]["products"]: r for r in baseline["results"]}
+    for result in current["results"]:
+        size = result["catalog"]["products"]
+        old = old_by_size.get(size)
+        if old is None:
+            print(f"{size} products: no baseline")
+            continue
+        for phase in ("full", "incremental"):
+            print(f"{size} products, {phase} sync")
+            for metric, higher_is_better in HEADLINE.items():
+                before, after = old[phase][metric], result[phase][metric]
+                change = (after - before) / before * 100 if before else 0.0
+                better = (change > 0) == higher_is_better or change == 0
+                print(f"  {metric:24} {before:>10} -> {after:>10}  {change:+6.1f}% {'' if better else '(worse)'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated catalog sizes")
+    parser.add_argument("--min-variants", type=int, default=1)
+    parser.add_argument("--max-variants", type=int, default=8)
+    parser.add_argument("--min-images", type=int, default=1)
+    parser.add_argument("--max-images", type=int, default=6)
+    parser.add_argument("--mutate", type=float, default=0.05, help="share of variants edited before the incremental sync")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results to compare against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--standin", help=argparse.SUPPRESS)
+    add_server_options(parser)
+    # Measure our own code by default, not Shopify's rate limit
+    parser.set_defaults(restore_rate=1e6)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        sys.exit(0)
+
+    report = {
+        "benchmark": "sync",
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("child", "standin", "output", "compare", "verbose")},
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(s) for s in args.sizes.split(",")):
+            result = run_size(size, args, workdir)
+            report["results"].append(result)
+            full, incremental = result["full"], result["incremental"]
+            print(f"{size:>7} products: full {full['products_per_second']:>8} products/s, "
+                  f"{full['api_calls_per_product']} calls/product, {full['peak_rss_mb']} MB peak | "
+                  f"incremental {incremental['products_per_second']:>8} products/s, "
+                  f"{incremental['api_calls_per_product']} calls/product")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,294 @@
+"""Load test of the product webhook endpoints of a running app.
+
+Replays recorded or synthetic products/update deliveries at a steady rate,
+with optional bursts, against /api/us-webhook or /api/canada-webhook, then
+waits for the queued resyncs to finish. Reports accept latency percentiles
+(Shopify gives up after 5 s), end-to-end lag from delivery to finished
+resync, and work that was dropped, duplicated or redundant. Jobs are read
+straight from the app's database.
+
+Dropped: accepted deliveries without a resync job. Duplicated: jobs beyond
+the accepted deliveries, typically deliveries that timed out after queueing
+(Shopify would send them again). Redundant: resyncs queued while an earlier
+one for the same product had not started yet, so one would have done.
+
+Run the app against the stand-in, with a worker:
+
+    python benchmarks/shopify_standin.py --products 2000 --latency 0.05 &
+    export SHOP1_URL=http://127.0.0.1:8787/us SHOP1_TOKEN=x SHOPIFY_API_VERSION=2025-01
+    python worker.py & waitress-serve --threads 8 --port 5000 wsgi:app &
+    python benchmarks/bench_webhooks.py --app http://127.0.0.1:5000 --database-uri sqlite:////var/data/app.db \\
+        --rate 20 --duration 60 --burst-size 200 --burst-every 20 --duplicate-rate 0.1
+
+``--payloads deliveries.jsonl`` replays recorded bodies (one JSON object per
+line) in order, looping if the test outlasts them.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+from sqlalchemy import create_engine, text
+
+SHOPIFY_TIMEOUT_SECONDS = 5.0
+STORE_KEYS = {"/api/us-webhook": "shop1", "/api/canada-webhook": "shop2"}
+
+
+def utcnow():
+    # Naive UTC, like the app's timestamps
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(fraction * len(samples)))], 4)
+
+
+def distribution(samples):
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 0.5),
+        "p90": percentile(samples, 0.9),
+        "p99": percentile(samples, 0.99),
+        "max": round(max(samples), 4) if samples else None,
+    }
+
+
+def schedule(rate, duration, burst_size, burst_every, ramp):
+    """Send offsets in seconds from the start: a steady (or ramping) rate plus bursts."""
+    offsets = []
+    if rate > 0:
+        t = 0.0
+        while t < duration:
+            offsets.append(t)
+            current = rate * min(1.0, (t + 1) / ramp) if ramp else rate
+            t += 1.0 / current
+    if burst_size and burst_every:
+        t = burst_every
+        while t < duration:
+            offsets += [t] * burst_size
+            t += burst_every
+    return sorted(offsets)
+
+
+def synthetic_payloads(products, duplicate_rate, seed):
+    """Endless products/update bodies; a duplicate repeats the previous delivery's webhook ID."""
+    rng = random.Random(seed)
+    previous = None
+    while True:
+        if previous and rng.random() < duplicate_rate:
+            yield previous
+            continue
+        number = rng.randint(1, products)
+        body = {
+            "id": number,
+            "admin_graphql_api_id": f"gid://shopify/Product/{number}",
+            "title": f"Product {number}",
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        previous = (str(uuid.uuid4()), body)
+        yield previous
+
+
+def recorded_payloads(path):
+    with open(path) as f:
+        bodies = [json.loads(line) for line in f if line.strip()]
+    while True:
+        for body in bodies:
+            yield str(uuid.uuid4()), body
+
+
+class Delivery:
+    __slots__ = ("product", "webhook_id", "scheduled", "sent_at", "status", "latency", "error")
+
+    def __init__(self, product, webhook_id, scheduled):
+        self.product = product
+        self.webhook_id = webhook_id
+        self.scheduled = scheduled
+        self.sent_at = None
+        self.status = None
+        self.latency = None
+        self.error = None
+
+
+def send(session, url, delivery, body, shop_domain):
+    delivery.sent_at = utcnow()
+    started = time.perf_counter()
+    try:
+        response = session.post(url, json=body, timeout=SHOPIFY_TIMEOUT_SECONDS, headers={
+            "X-Shopify-Topic": "products/update",
+            "X-Shopify-Webhook-Id": delivery.webhook_id,
+            "X-Shopify-Shop-Domain": shop_domain,
+        })
+        delivery.status = response.status_code
+    except requests.Timeout:
+        delivery.error = "timeout"
+    except requests.RequestException as e:
+        delivery.error = type(e).__name__
+    delivery.latency = time.perf_counter() - started
+
+
+def run_load(args):
+    url = args.app.rstrip("/") + args.endpoint
+    payloads = recorded_payloads(args.payloads) if args.payloads else synthetic_payloads(
+        args.products, args.duplicate_rate, args.seed
+    )
+    offsets = schedule(args.rate, args.duration, args.burst_size, args.burst_every, args.ramp)
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    deliveries = []
+    send_delays = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        started = time.perf_counter()
+        for offset in offsets:
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                send_delays.append(-delay)
+            webhook_id, body = next(payloads)
+            delivery = Delivery(body.get("admin_graphql_api_id"), webhook_id, offset)
+            deliveries.append(delivery)
+            pool.submit(lambda d=delivery, b=body: send(session(), url, d, b, args.shop_domain))
+    return deliveries, send_delays
+
+
+def wait_for_jobs(engine, store_key, since, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with engine.connect() as conn:
+            open_jobs = conn.execute(text(
+                "SELECT COUNT(*) FROM job WHERE kind = 'product_change' AND store_key = :store "
+                "AND enqueued_at >= :since AND status IN ('queued', 'running')"
+            ), {"store": store_key, "since": since}).scalar()
+        if not open_jobs:
+            return True
+        time.sleep(1)
+    return False
+
+
+def load_jobs(engine, store_key, since):
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id, payload, status, enqueued_at, started_at, finished_at FROM job "
+            "WHERE kind = 'product_change' AND store_key = :store AND enqueued_at >= :since ORDER BY id"
+        ), {"store": store_key, "since": since}).mappings().all()
+    jobs = []
+    for row in rows:
+        payload = row["payload"]
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        jobs.append({**row, "product": (payload or {}).get("admin_graphql_api_id"),
+                     **{k: _as_datetime(row[k]) for k in ("enqueued_at", "started_at", "finished_at")}})
+    return jobs
+
+
+def _as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def report(deliveries, send_delays, jobs, drained, args):
+    accepted = [d for d in deliveries if d.status and 200 <= d.status < 300]
+    rejected = [d for d in deliveries if d.status and not 200 <= d.status < 300]
+    errors = defaultdict(int)
+    for d in deliveries:
+        if d.error:
+            errors[d.error] += 1
+
+    # Pair each product's accepted deliveries with its jobs, in order
+    deliveries_by_product = defaultdict(list)
+    for d in sorted(accepted, key=lambda d: d.sent_at):
+        deliveries_by_product[d.product].append(d)
+    jobs_by_product = defaultdict(list)
+    for job in jobs:
+        jobs_by_product[job["product"]].append(job)
+
+    lags, dropped, duplicated, redundant = [], 0, 0, 0
+    for product in set(deliveries_by_product) | set(jobs_by_product):
+        product_deliveries, product_jobs = deliveries_by_product[product], jobs_by_product[product]
+        dropped += max(0, len(product_deliveries) - len(product_jobs))
+        duplicated += max(0, len(product_jobs) - len(product_deliveries))
+        for delivery, job in zip(product_deliveries, product_jobs):
+            if job["finished_at"]:
+                lags.append((job["finished_at"] - delivery.sent_at).total_seconds())
+        # A job queued while an earlier one for the product had not started yet is coalescible work
+        for earlier, later in zip(product_jobs, product_jobs[1:]):
+            if earlier["started_at"] is None or later["enqueued_at"] < earlier["started_at"]:
+                redundant += 1
+
+    webhook_ids = defaultdict(int)
+    for d in accepted:
+        webhook_ids[d.webhook_id] += 1
+    return {
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "deliveries": {
+            "sent": len(deliveries),
+            "accepted": len(accepted),
+            "rejected": len(rejected),
+            "errors": dict(errors),
+            "over_shopify_timeout": sum(1 for d in deliveries if d.latency and d.latency >= SHOPIFY_TIMEOUT_SECONDS),
+            "duplicate_deliveries": sum(n - 1 for n in webhook_ids.values() if n > 1),
+            "harness_behind_schedule": distribution(send_delays),
+        },
+        "accept_latency_seconds": distribution([d.latency for d in accepted]),
+        "processing_lag_seconds": distribution(lags),
+        "work": {
+            "jobs": len(jobs),
+            "succeeded": sum(1 for j in jobs if j["status"] == "succeeded"),
+            "failed": sum(1 for j in jobs if j["status"] == "failed"),
+            "unfinished": sum(1 for j in jobs if j["status"] in ("queued", "running")),
+            "drained": drained,
+            "dropped": dropped,
+            "duplicated": duplicated,
+            "redundant_resyncs": redundant,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default="http://127.0.0.1:5000", help="base URL of the running app")
+    parser.add_argument("--endpoint", default="/api/us-webhook", choices=sorted(STORE_KEYS))
+    parser.add_argument("--database-uri", required=True, help="the app's database, to follow the queued jobs")
+    parser.add_argument("--shop-domain", default="bench.myshopify.com")
+    parser.add_argument("--payloads", help="JSONL file of recorded webhook bodies")
+    parser.add_argument("--products", type=int, default=1000, help="product IDs of synthetic deliveries")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="share of synthetic deliveries sent twice")
+    parser.add_argument("--rate", type=float, default=10.0, help="deliveries per second")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds to ramp up to --rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send for")
+    parser.add_argument("--burst-size", type=int, default=0, help="extra deliveries sent at once ...")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="... every this many seconds")
+    parser.add_argument("--concurrency", type=int, default=64, help="deliveries in flight at most")
+    parser.add_argument("--drain-timeout", type=float, default=600.0, help="seconds to wait for the resyncs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_uri)
+    store_key = STORE_KEYS[args.endpoint]
+    since = utcnow() - timedelta(seconds=1)
+
+    deliveries, send_delays = run_load(args)
+    print(f"Sent {len(deliveries)} deliveries, waiting for the resyncs...", file=sys.stderr)
+    drained = wait_for_jobs(engine, store_key, since, args.drain_timeout)
+    result = report(deliveries, send_delays, load_jobs(engine, store_key, since), drained, args)
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
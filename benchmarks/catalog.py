@@ -0,0 +1,153 @@
+"""Reproducible synthetic Shopify catalogs for the sync benchmarks.
+
+Products get a varying number of variants and variant images, drawn from
+the product's media so images are shared between variants (and a few
+from a store-wide pool shared between products). Some variant images are
+missing from the product media and need an upload. The variant_images
+metafield starts out filled, partially filled, stale (same IDs in another
+order) or empty, the way a long-lived store looks. mutate() then makes
+the edits an incremental sync has to catch up with.
+
+    python benchmarks/catalog.py --products 10000 --output catalog.json
+    python benchmarks/shopify_standin.py --catalog catalog.json
+"""
+import argparse
+import json
+import random
+
+CDN = "https://cdn.shopify.com/s/files/1/0000/0001/files"
+SOURCE = "https://images.example.com/catalog"
+SHARED_IMAGES = 50  # store-wide pool (brand logos, size charts, ...)
+
+
+def _media_id(product, k):
+    return f"gid://shopify/MediaImage/{product * 1000 + k}"
+
+
+def _variant_id(product, v):
+    return f"gid://shopify/ProductVariant/{product * 1000 + v}"
+
+
+def generate(products, variants=(1, 8), images=(1, 6), seed=42, shared=0.1, missing=0.05,
+             filled=0.5, partial=0.15, stale=0.1):
+    """A list of product nodes as GetAllProducts returns them.
+
+    ``variants`` and ``images`` are (min, max) per product and per variant.
+    ``shared`` is the chance a variant image comes from the store-wide pool,
+    ``missing`` the chance it is not in the product media. ``filled``,
+    ``partial`` and ``stale`` split the variants by metafield state; the
+    rest start empty.
+    """
+    rng = random.Random(seed)
+    catalog = []
+    for p in range(1, products + 1):
+        media_count = rng.randint(images[0], images[1] + 2)
+        files = [f"p{p}_{k}.jpg" for k in range(media_count)]
+        shared_files = sorted({f"shared_{rng.randrange(SHARED_IMAGES)}.jpg" for _ in range(2)})
+        files += shared_files
+        media = [{"id": _media_id(p, k), "image": {"url": f"{CDN}/{name}?v=1700000000"}} for k, name in enumerate(files)]
+        ids_by_name = {name: m["id"] for name, m in zip(files, media)}
+
+        variant_nodes = []
+        for v in range(rng.randint(*variants)):
+            names = []
+            for _ in range(rng.randint(*images)):
+                roll = rng.random()
+                if roll < missing:
+                    names.append(f"p{p}_new_{v}_{len(names)}.jpg")
+                elif roll < missing + shared:
+                    names.append(rng.choice(shared_files))
+                else:
+                    names.append(rng.choice(files[:media_count]))
+            names = list(dict.fromkeys(names))  # the same image twice in a variant is a data error
+
+            ids = [ids_by_name[n] for n in names if n in ids_by_name]
+            state = rng.random()
+            if state < filled:
+                asset_ids = ids
+            elif state < filled + partial:
+                asset_ids = ids[: len(ids) // 2]
+            elif state < filled + partial + stale:
+                asset_ids = rng.sample(ids, len(ids))
+            else:
+                asset_ids = []
+
+            variant_nodes.append({
+                "title": f"Variant {v}",
+                "id": _variant_id(p, v),
+                "imagesUrl": {"jsonValue": [f"{SOURCE}/{n}" for n in names]},
+                "assetImagesJson": {"jsonValue": asset_ids} if asset_ids else None,
+            })
+
+        catalog.append({
+            "id": f"gid://shopify/Product/{p}",
+            "title": f"Product {p}",
+            "variantsCount": {"count": len(variant_nodes)},
+            "onlineStorePreviewUrl": f"https://bench.example.com/products/{p}",
+            "mediaCount": {"count": len(media)},
+            "featuredMedia": {"image": {"url": media[0]["image"]["url"]}} if media else None,
+            "media": {"nodes": media},
+            "variants": {"nodes": variant_nodes},
+        })
+    return catalog
+
+
+def mutate(catalog, fraction=0.05, seed=7):
+    """Edit the image URLs of about ``fraction`` of the variants in place.
+
+    Each edited variant gets its images reordered, one image added from the
+    product media or one removed. Returns the number of products touched.
+    """
+    rng = random.Random(seed)
+    touched = 0
+    for product in catalog:
+        changed = False
+        names = [m["image"]["url"].rsplit("/", 1)[-1].split("?")[0] for m in product["media"]["nodes"]]
+        for variant in product["variants"]["nodes"]:
+            if rng.random() >= fraction:
+                continue
+            urls = list((variant.get("imagesUrl") or {}).get("jsonValue") or [])
+            edit = rng.random()
+            if edit < 0.4 and len(urls) > 1:
+                rng.shuffle(urls)
+            elif edit < 0.8 or len(urls) <= 1:
+                candidates = [f"{SOURCE}/{n}" for n in names if f"{SOURCE}/{n}" not in urls]
+                if candidates:
+                    urls.insert(rng.randrange(len(urls) + 1), rng.choice(candidates))
+            else:
+                urls.pop(rng.randrange(len(urls)))
+            variant["imagesUrl"] = {"jsonValue": urls}
+            changed = True
+        touched += changed
+    return touched
+
+
+def describe(catalog):
+    variants = [v for p in catalog for v in p["variants"]["nodes"]]
+    images = sum(len((v["imagesUrl"] or {}).get("jsonValue") or []) for v in variants)
+    return {
+        "products": len(catalog),
+        "variants": len(variants),
+        "variant_images": images,
+        "media": sum(len(p["media"]["nodes"]) for p in catalog),
+        "metafield_filled": sum(1 for v in variants if v["assetImagesJson"]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--min-variants", type=int, default=1)
+    parser.add_argument("--max-variants", type=int, default=8)
+    parser.add_argument("--min-images", type=int, default=1)
+    parser.add_argument("--max-images", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    catalog = generate(
+        args.products, (args.min_variants, args.max_variants), (args.min_images, args.max_images), args.seed
+    )
+    with open(args.output, "w") as f:
+        json.dump(catalog, f)
+    print(json.dumps(describe(catalog)))
@@ -0,0 +1,392 @@
+"""Local stand-in for the Shopify Admin GraphQL API.
+
+Serves the operations in app/graphql_queries/templates (GetAllProducts,
+GetProduct, FileCreate, metafieldSet) from a synthetic catalog held in
+memory, with Shopify's cost/throttle extensions, so syncs can be run and
+timed offline. Point a store at it by URL:
+
+    python benchmarks/shopify_standin.py --port 8787 --products 2000 --latency 0.05
+    SHOP1_URL=http://127.0.0.1:8787/us SHOP1_TOKEN=x SHOPIFY_API_VERSION=2025-01 python worker.py --once
+
+Every path prefix before /admin/api (``/us`` above) is a separate shop with
+its own copy of the catalog and its own cost bucket. Shopify IDs are unique
+across shops, so each shop adds its own base to the numeric part of every
+GID: the first shop asked for keeps the catalog's IDs, the next one adds
+SHOP_ID_STRIDE, and so on. ``--catalog`` loads a
+JSON list of product nodes (see catalog.py) instead of the built-in
+generator. GET /stats returns call counts and cost per shop; POST /reset
+restores the catalog and clears them; POST /mutate?fraction=0.05&seed=7
+edits variant images of every shop like catalog.mutate() does.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_builder import make_product  # noqa: E402
+from catalog import mutate  # noqa: E402
+
+GRAPHQL_PATH = re.compile(r"^(?P<shop>.*)/admin/api/[^/]+/graphql\.json$")
+OPERATION = re.compile(r"^\s*(?:query|mutation)\s+(\w+)")
+ID_FILTER = re.compile(r"^id:(<=|>=|<|>|)(\d+)$")
+GID = re.compile(r"(gid://shopify/\w+/)(\d+)")
+
+# Catalog IDs stay far below this (product * 1000 + n), so shops never overlap
+SHOP_ID_STRIDE = 10 ** 10
+
+# Shopify's defaults for a standard plan
+BUCKET_SIZE = 1000.0
+RESTORE_RATE = 50.0
+MUTATION_COST = 10
+
+
+def product_number(gid):
+    return int(gid.rsplit("/", 1)[-1])
+
+
+def offset_ids(catalog, base):
+    """A copy of the catalog with ``base`` added to every GID, references included."""
+    if not base:
+        return catalog
+    text = GID.sub(lambda m: f"{m.group(1)}{int(m.group(2)) + base}", json.dumps(catalog))
+    return json.loads(text)
+
+
+def matches(product, query):
+    """The subset of Shopify's product search the app uses.
+
+    Id ranges (sharding), exact ids joined by OR (bulk actions) and title words.
+    """
+    if not query:
+        return True
+    return any(_matches_all(product, alternative) for alternative in query.split(" OR "))
+
+
+def _matches_all(product, query):
+    number = product_number(product["id"])
+    for term in query.split(" AND "):
+        term = term.strip()
+        match = ID_FILTER.match(term)
+        if match:
+            op, bound = match.group(1), int(match.group(2))
+            if not {"": number == bound, "<": number < bound, "<=": number <= bound,
+                    ">": number > bound, ">=": number >= bound}[op]:
+                return False
+        elif term.lower() not in product["title"].lower():
+            return False
+    return True
+
+
+class Shop:
+    """One shop's catalog, cost bucket and call statistics."""
+
+    def __init__(self, catalog, options, id_base=0):
+        self.options = options
+        self.lock = threading.Lock()
+        self.id_base = id_base
+        self.original = offset_ids(catalog, id_base)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.products = copy.deepcopy(self.original)
+            self.by_id = {p["id"]: p for p in self.products}
+            self.variants = {v["id"]: v for p in self.products for v in p["variants"]["nodes"]}
+            self.available = BUCKET_SIZE
+            self.updated_at = time.monotonic()
+            self.files = 0
+            self.metafields = 0
+            self.calls = Counter()
+            self.errors = Counter()
+            self.cost = 0
+
+    # --- cost bucket ---
+
+    def _charge(self, requested):
+        """Take ``requested`` points, or return None when Shopify would throttle."""
+        now = time.monotonic()
+        self.available = min(BUCKET_SIZE, self.available + (now - self.updated_at) * self.options.restore_rate)
+        self.updated_at = now
+        if requested > self.available:
+            return None
+        self.available -= requested
+        return requested
+
+    def _cost_extension(self, requested, actual):
+        return {"cost": {
+            "requestedQueryCost": requested,
+            "actualQueryCost": actual,
+            "throttleStatus": {
+                "maximumAvailable": BUCKET_SIZE,
+                "currentlyAvailable": int(self.available),
+                "restoreRate": self.options.restore_rate,
+            },
+        }}
+
+    # --- operations ---
+
+    def execute(self, query, variables):
+        operation = (OPERATION.match(query) or [None, "anonymous"])[1]
+        handler = {
+            "GetAllProducts": self.products_page,
+            "GetProduct": self.product,
+            "FileCreate": self.file_create,
+            "metafieldSet": self.metafields_set,
+        }.get(operation)
+        if handler is None:
+            return {"errors": [{"message": f"Unknown operation {operation}"}]}
+
+        with self.lock:
+            self.calls[operation] += 1
+            requested = self.requested_cost(operation, variables)
+            if self._charge(requested) is None:
+                self.errors["throttled"] += 1
+                return {
+                    "errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+                    "extensions": self._cost_extension(requested, 0),
+                }
+            if random.random() < self.options.graphql_error_rate:
+                self.errors["graphql"] += 1
+                return {
+                    "errors": [{"message": "Internal error (injected)", "extensions": {"code": "INTERNAL_SERVER_ERROR"}}],
+                    "extensions": self._cost_extension(requested, requested),
+                }
+            data, actual = handler(query, variables)
+            self.available = min(BUCKET_SIZE, self.available + requested - actual)  # refund the difference
+            self.cost += actual
+            return {"data": data, "extensions": self._cost_extension(requested, actual)}
+
+    def requested_cost(self, operation, variables):
+        if operation == "GetAllProducts":
+            return 2 + (variables.get("first") or variables.get("last") or 0) * self.options.product_cost
+        if operation == "GetProduct":
+            return 1 + self.options.product_cost
+        return MUTATION_COST
+
+    def _node(self, product, query):
+        """A product shaped like the query asked for it (media and references are optional)."""
+        node = {k: v for k, v in product.items() if k not in ("media", "variants")}
+        if "media(" in query:
+            node["media"] = product["media"]
+        with_references = "assetImages:" in query
+        media_urls = {m["id"]: m["image"]["url"] for m in product["media"]["nodes"]}
+        variants = []
+        for variant in product["variants"]["nodes"]:
+            variant = dict(variant)
+            if with_references:
+                ids = (variant.get("assetImagesJson") or {}).get("jsonValue") or []
+                variant["assetImages"] = {"images": {"nodes": [
+                    {"id": i, "image": {"url": media_urls[i]}} for i in ids if i in media_urls
+                ]}} if ids else None
+            variants.append(variant)
+        node["variants"] = {"nodes": variants}
+        return node
+
+    def products_page(self, query, variables):
+        selected = [p for p in self.products if matches(p, variables.get("query"))]
+        first, last = variables.get("first"), variables.get("last")
+        after, before = variables.get("after"), variables.get("before")
+        start = int(after) if after else 0
+        end = int(before) - 1 if before else len(selected)
+        if last:
+            start = max(start, end - last)
+        else:
+            end = min(end, start + (first or 0))
+        edges = [{"cursor": str(i + 1), "node": self._node(selected[i], query)} for i in range(start, end)]
+        data = {
+            "productsCount": {"count": len(selected)},
+            "products": {
+                "edges": edges,
+                "pageInfo": {
+                    "hasNextPage": end < len(selected),
+                    "hasPreviousPage": start > 0,
+                    "startCursor": edges[0]["cursor"] if edges else None,
+                    "endCursor": edges[-1]["cursor"] if edges else None,
+                },
+            },
+        }
+        return data, 2 + len(edges) * self.options.product_cost
+
+    def product(self, query, variables):
+        product = self.by_id.get(variables.get("id"))
+        return {"product": self._node(product, query) if product else None}, 1 + self.options.product_cost
+
+    def file_create(self, query, variables):
+        files, errors = [], []
+        for index, f in enumerate(variables.get("files") or []):
+            if random.random() < self.options.user_error_rate:
+                errors.append({"field": ["files", str(index), "originalSource"], "message": "Invalid URL (injected)"})
+                continue
+            self.files += 1
+            files.append({"id": f"gid://shopify/MediaImage/{self.id_base + 9 * 10 ** 9 + self.files}", "fileStatus": "UPLOADED", "alt": f.get("alt")})
+        return {"fileCreate": {"files": files, "userErrors": errors}}, MUTATION_COST
+
+    def metafields_set(self, query, variables):
+        metafields, errors = [], []
+        for index, mf in enumerate(variables.get("metafields") or []):
+            variant = self.variants.get(mf.get("ownerId"))
+            if variant is None or random.random() < self.options.user_error_rate:
+                errors.append({"field": ["metafields", str(index), "ownerId"], "message": "Owner does not exist"})
+                continue
+            value = json.loads(mf["value"]) if mf.get("value") else None
+            alias = {"variant_images": "assetImagesJson", "variant_images_url": "imagesUrl"}.get(mf.get("key"))
+            if alias:
+                variant[alias] = {"jsonValue": value} if value else None
+            self.metafields += 1
+            metafields.append({"id": f"gid://shopify/Metafield/{self.metafields}", "key": mf.get("key"), "namespace": mf.get("namespace")})
+        return {"metafieldsSet": {"metafields": metafields, "userErrors": errors}}, MUTATION_COST
+
+    def stats(self):
+        with self.lock:
+            return {
+                "calls": dict(self.calls),
+                "errors": dict(self.errors),
+                "cost": self.cost,
+                "files_created": self.files,
+                "metafields_set": self.metafields,
+                "products": len(self.products),
+            }
+
+
+class StandIn:
+    """The stand-in server; use start()/stop() to run it inside a benchmark."""
+
+    def __init__(self, catalog, options, host="127.0.0.1", port=0):
+        self.catalog = catalog
+        self.options = options
+        self.shops = {}
+        self._shops_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def shop(self, prefix):
+        with self._shops_lock:
+            shop = self.shops.get(prefix)
+            if shop is None:
+                shop = self.shops[prefix] = Shop(self.catalog, self.options, len(self.shops) * SHOP_ID_STRIDE)
+            return shop
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="shopify-standin", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    self._send(200, {prefix or "/": shop.stats() for prefix, shop in standin.shops.items()})
+                else:
+                    self._send(404, {"errors": "Not Found"})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path == "/reset":
+                    for shop in list(standin.shops.values()):
+                        shop.reset()
+                    self._send(200, {"ok": True})
+                    return
+                if self.path.startswith("/mutate"):
+                    params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                    touched = {}
+                    for prefix, shop in list(standin.shops.items()):
+                        with shop.lock:
+                            touched[prefix or "/"] = mutate(
+                                shop.products, float(params.get("fraction", 0.05)), int(params.get("seed", 7))
+                            )
+                    self._send(200, {"products_touched": touched})
+                    return
+                match = GRAPHQL_PATH.match(self.path)
+                if not match:
+                    self._send(404, {"errors": "Not Found"})
+                    return
+                if not self.headers.get("X-Shopify-Access-Token"):
+                    self._send(401, {"errors": "[API] Invalid API key or access token"})
+                    return
+
+                options = standin.options
+                if options.latency or options.jitter:
+                    time.sleep(max(0.0, random.gauss(options.latency, options.jitter)))
+                if random.random() < options.http_error_rate:
+                    standin.shop(match.group("shop")).errors["http"] += 1
+                    self._send(random.choice((500, 502, 503)), {"errors": "Internal Server Error (injected)"})
+                    return
+
+                payload = json.loads(body or b"{}")
+                result = standin.shop(match.group("shop")).execute(payload.get("query", ""), payload.get("variables") or {})
+                self._send(200, result)
+
+            def log_message(self, format, *args):
+                if standin.options.verbose:
+                    super().log_message(format, *args)
+
+        return Handler
+
+
+def add_server_options(parser):
+    """Latency, cost and error options, shared with the benchmarks that embed the server."""
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency")
+    parser.add_argument("--product-cost", type=int, default=1, help="cost points per product returned")
+    parser.add_argument("--restore-rate", type=float, default=RESTORE_RATE, help="cost points restored per second")
+    parser.add_argument("--http-error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 5xx")
+    parser.add_argument("--graphql-error-rate", type=float, default=0.0, help="fraction of calls answered with a GraphQL error")
+    parser.add_argument("--user-error-rate", type=float, default=0.0, help="fraction of mutation inputs rejected with userErrors")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--catalog", help="JSON file with a list of product nodes")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--variants", type=int, default=4)
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42, help="seed of the injected errors and latency")
+    add_server_options(parser)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.catalog:
+        with open(args.catalog) as f:
+            catalog = json.load(f)
+    else:
+        catalog = [make_product(i, args.variants, args.images) for i in range(1, args.products + 1)]
+
+    standin = StandIn(catalog, args, args.host, args.port)
+    print(f"Shopify stand-in with {len(catalog)} products on {standin.url} (any path prefix is a shop)")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,28 +1,49 @@
-from app import create_app, db
-from app.models import Shop, Product, Variant
-
-app = create_app()
-
-with app.app_context():
-    # --- Counts ---
-    shop_count = Shop.query.count()
-    product_count = Product.query.count()
-    variant_count = Variant.query.count()
-
-    print("=== Row Counts ===")
-    print(f"Shops: {shop_count}")
-    print(f"Products: {product_count}")
-    print(f"Variants: {variant_count}")
-
-    # --- Full Data ---
-    print("\n=== Shops ===")
-    for shop in Shop.query.all():
-        print(f"ID: {shop.id}, Name: {shop.name}, Domain: {shop.domain}\n")
-
-    print("\n=== Products ===")
-    for product in Product.query.limit(1).all():
-        print(f"ID: {product.id}, Title: {product.title}, ShopifyID: {product.shopify_id}, ShopID: {product.shop_id}\n")
-
-    print("\n=== Variants ===")
-    for variant in Variant.query.limit(1).all():
-        print(f"ID: {variant.id}, ShopifyID: {variant.shopify_id}, ProductID: {variant.product_id}, URLs: {variant.urls}\n")
+import argparse
+import json
+import time
+from app import create_app
+from app.utils.stats import collect_shop_stats
+
+
+def format_age(seconds):
+    if seconds is None:
+        return "never"
+    if seconds < 3600:
+        return f"{seconds // 60}m ago"
+    if seconds < 86400:
+        return f"{seconds // 3600}h ago"
+    return f"{seconds // 86400}d ago"
+
+
+def print_text(shops, elapsed):
+    header = f"{'Shop':<20} {'Products':>9} {'Variants':>9} {'Images':>8} {'No images':>10} {'No variants':>12} {'Last sync':>10} {'Last change':>12}"
+    print("=== Shop Stats ===")
+    print(header)
+    print("-" * len(header))
+    for shop in shops:
+        health = shop["health"]
+        print(
+            f"{shop['name'][:20]:<20} {shop['products']:>9} {shop['variants']:>9} {shop['images']:>8} "
+            f"{health['variants_without_images']:>10} {health['products_without_variants']:>12} "
+            f"{format_age(shop['last_sync_age_seconds']):>10} {format_age(shop['last_product_update_age_seconds']):>12}"
+        )
+    if not shops:
+        print("No shops found.")
+    print(f"\n({elapsed * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print per-shop row counts, image health and sync ages.")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON instead of a table")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        shops = collect_shop_stats()
+        elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps({"shops": shops, "elapsed_ms": round(elapsed * 1000, 1)}, indent=4))
+    else:
+        print_text(shops, elapsed)
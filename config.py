@@ -7,6 +7,46 @@ class Config:
     TEMPLATES_AUTO_RELOAD = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Sync worker (worker.py)
+    SYNC_INTERVAL_SECONDS = int(os.getenv("SYNC_INTERVAL_SECONDS", 3 * 60 * 60))  # starting interval per store
+    SYNC_MIN_INTERVAL_SECONDS = int(os.getenv("SYNC_MIN_INTERVAL_SECONDS", 15 * 60))
+    SYNC_MAX_INTERVAL_SECONDS = int(os.getenv("SYNC_MAX_INTERVAL_SECONDS", 24 * 60 * 60))
+    SYNC_TARGET_CHANGES = float(os.getenv("SYNC_TARGET_CHANGES", 5))  # changes a sync should find
+    SYNC_TICK_SECONDS = int(os.getenv("SYNC_TICK_SECONDS", 60))  # how often the worker checks for due stores
+    SYNC_SHARDS = int(os.getenv("SYNC_SHARDS", 1))  # parallel processes per store sync; 1 = no sharding
+    LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", 300))
+
+    # Job queue (app/utils/jobs.py)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))  # dispatcher threads per worker process
+    JOB_STORE_CONCURRENCY = int(os.getenv("JOB_STORE_CONCURRENCY", 2))  # running jobs per store
+    JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1))
+    JOB_WAIT_SECONDS = int(os.getenv("JOB_WAIT_SECONDS", 60))  # how long manual actions wait for their job
+    BULK_MAX_PRODUCTS = int(os.getenv("BULK_MAX_PRODUCTS", 250))  # products per bulk populate/delete request
+    BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 25))  # products per bulk job; the jobs run side by side
+
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # worker's own /metrics port; 0 = off
+
+    # Product payload cache (app/utils/product_cache.py)
+    PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", 60))  # 0 = off
+    PRODUCT_CACHE_MAX_ENTRIES = int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", 2000))  # in-process LRU bound
+    PRODUCT_CACHE_URL = os.getenv("PRODUCT_CACHE_URL", "")  # e.g. redis://localhost:6379/0 to share it across processes
+
+    # Logging (app/utils/log.py)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")  # DEBUG shows per-variant sync detail
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text or json
+    LOG_DEBUG_SAMPLE = int(os.getenv("LOG_DEBUG_SAMPLE", 1))  # keep 1 in N debug lines per call site
+
+    # Profiling (app/utils/profiling.py); off unless PROFILE names a target
+    PROFILE = os.getenv("PROFILE", "")  # comma-separated: sync, webhook, requests, or all
+    PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")  # sample (collapsed stacks) or cprofile (pstats)
+    PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", 0.005))  # sampling interval
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "/var/data/profiles")
+    # Tracing (app/utils/tracing.py); off unless TRACE names a target
+    TRACE = os.getenv("TRACE", "")  # comma-separated: sync, webhook, populate, or all
+    TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", 1.0))  # share of traces kept
+    TRACE_MIN_MS = float(os.getenv("TRACE_MIN_MS", 0))  # only export traces at least this slow
+    TRACE_FILE = os.getenv("TRACE_FILE", "/var/data/traces.jsonl")
+
 class DevelopmentConfig(Config):
     DEBUG = True
     TEMPLATES_AUTO_RELOAD = True
@@ -1,7 +1,9 @@
-from app import create_app, db
+from flask_migrate import upgrade
+from app import create_app
 
-app = create_app()
+app = create_app(check_schema=False)  # about to bring the schema up to date
 
 with app.app_context():
-    db.create_all()
+    # Creates a fresh database or applies any pending migrations to an existing one
+    upgrade()
     print("✅ Database and all tables created successfully.")
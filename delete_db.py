@@ -4,4 +4,7 @@ app = create_app()
 
 with app.app_context():
     db.drop_all()
+    # Forget the applied migrations so create_db.py rebuilds everything
+    db.session.execute(db.text("DROP TABLE IF EXISTS alembic_version"))
+    db.session.commit()
     print("🗑️  Database and all tables deleted successfully.")
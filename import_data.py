@@ -1,10 +1,11 @@
+from flask_migrate import upgrade
 from app import create_app, db
 import json
 
 app = create_app()
 with app.app_context():
     # Make sure tables exist
-    db.create_all()
+    upgrade()
 
     with open("db_export.json", "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -0,0 +1,59 @@
+"""initial schema
+
+Revision ID: 0001_initial_schema
+Revises: 
+Create Date: 2026-10-19 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created before migrations existed already have these tables
+    # (from db.create_all()); only create what is missing so they can be stamped
+    # forward by a plain upgrade.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'shop' not in existing:
+        op.create_table('shop',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=150), nullable=False),
+            sa.Column('domain', sa.String(length=255), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('domain')
+        )
+    if 'product' not in existing:
+        op.create_table('product',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('shop_id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=False),
+            sa.Column('shopify_id', sa.String(length=100), nullable=False),
+            sa.ForeignKeyConstraint(['shop_id'], ['shop.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('shopify_id')
+        )
+    if 'variant' not in existing:
+        op.create_table('variant',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('shopify_id', sa.String(length=100), nullable=False),
+            sa.Column('urls', sqlite.JSON(), nullable=True),
+            sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('shopify_id')
+        )
+
+
+def downgrade():
+    op.drop_table('variant')
+    op.drop_table('product')
+    op.drop_table('shop')
@@ -0,0 +1,40 @@
+"""sync timestamps on shop and product
+
+Revision ID: 0002_sync_timestamps
+Revises: 0001_initial_schema
+Create Date: 2026-10-19 09:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_sync_timestamps'
+down_revision = '0001_initial_schema'
+branch_labels = None
+depends_on = None
+
+
+def column_names(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    # A database created with db.create_all() after these columns were added
+    # to the models already has them.
+    if 'last_synced_at' not in column_names('shop'):
+        with op.batch_alter_table('shop', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('last_synced_at', sa.DateTime(), nullable=True))
+
+    if 'updated_at' not in column_names('product'):
+        with op.batch_alter_table('product', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('shop', schema=None) as batch_op:
+        batch_op.drop_column('last_synced_at')
@@ -0,0 +1,34 @@
+"""foreign-key and lookup indexes
+
+Revision ID: 0003_lookup_indexes
+Revises: 0002_sync_timestamps
+Create Date: 2026-10-19 09:10:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_lookup_indexes'
+down_revision = '0002_sync_timestamps'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # shop.products and the per-shop listings filter on shop_id; the composite
+    # also serves "recently changed products of a shop" without a sort step.
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index('ix_product_shop_id_updated_at', ['shop_id', 'updated_at'], unique=False)
+
+    # product.variants and the eager loads in the catalog dump filter on product_id
+    with op.batch_alter_table('variant', schema=None) as batch_op:
+        batch_op.create_index('ix_variant_product_id', ['product_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('variant', schema=None) as batch_op:
+        batch_op.drop_index('ix_variant_product_id')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_shop_id_updated_at')
@@ -0,0 +1,53 @@
+"""sync run history
+
+Revision ID: 0004_sync_run
+Revises: 0003_lookup_indexes
+Create Date: 2026-10-19 09:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_sync_run'
+down_revision = '0003_lookup_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_run',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('shop_id', sa.Integer(), nullable=True),
+        sa.Column('store_name', sa.String(length=150), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('pages', sa.Integer(), nullable=False),
+        sa.Column('products', sa.Integer(), nullable=False),
+        sa.Column('products_changed', sa.Integer(), nullable=False),
+        sa.Column('uploads', sa.Integer(), nullable=False),
+        sa.Column('metafield_writes', sa.Integer(), nullable=False),
+        sa.Column('api_calls', sa.Integer(), nullable=False),
+        sa.Column('api_cost', sa.Integer(), nullable=False),
+        sa.Column('errors', sqlite.JSON(), nullable=True),
+        sa.Column('fetch_seconds', sa.Float(), nullable=False),
+        sa.Column('diff_seconds', sa.Float(), nullable=False),
+        sa.Column('db_seconds', sa.Float(), nullable=False),
+        sa.Column('write_seconds', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['shop_id'], ['shop.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('sync_run', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sync_run_shop_id'), ['shop_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_sync_run_started_at'), ['started_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sync_run', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sync_run_started_at'))
+        batch_op.drop_index(batch_op.f('ix_sync_run_shop_id'))
+
+    op.drop_table('sync_run')
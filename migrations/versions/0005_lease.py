@@ -0,0 +1,30 @@
+"""leases for the sync worker
+
+Revision ID: 0005_lease
+Revises: 0004_sync_run
+Create Date: 2026-10-19 11:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_lease'
+down_revision = '0004_sync_run'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('lease',
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('owner', sa.String(length=255), nullable=False),
+        sa.Column('acquired_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('lease')
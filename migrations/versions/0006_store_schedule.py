@@ -0,0 +1,41 @@
+"""adaptive per-store sync schedule
+
+Revision ID: 0006_store_schedule
+Revises: 0005_lease
+Create Date: 2026-10-19 13:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_store_schedule'
+down_revision = '0005_lease'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('store_schedule',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('domain', sa.String(length=255), nullable=False),
+        sa.Column('store_name', sa.String(length=150), nullable=True),
+        sa.Column('interval_seconds', sa.Integer(), nullable=False),
+        sa.Column('next_run_at', sa.DateTime(), nullable=False),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('change_rate', sa.Float(), nullable=False),
+        sa.Column('webhook_rate', sa.Float(), nullable=False),
+        sa.Column('webhooks_since_run', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('domain')
+    )
+    with op.batch_alter_table('store_schedule', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_store_schedule_next_run_at'), ['next_run_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('store_schedule', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_store_schedule_next_run_at'))
+
+    op.drop_table('store_schedule')
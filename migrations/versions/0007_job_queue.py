@@ -0,0 +1,44 @@
+"""priority job queue
+
+Revision ID: 0007_job_queue
+Revises: 0006_store_schedule
+Create Date: 2026-10-19 14:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_job_queue'
+down_revision = '0006_store_schedule'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False),
+        sa.Column('store_key', sa.String(length=50), nullable=True),
+        sa.Column('payload', sqlite.JSON(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('result', sqlite.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('worker', sa.String(length=255), nullable=True),
+        sa.Column('enqueued_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.create_index('ix_job_status_priority_id', ['status', 'priority', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_index('ix_job_status_priority_id')
+
+    op.drop_table('job')
@@ -0,0 +1,29 @@
+"""job progress and cancellation
+
+Revision ID: 0008_job_progress
+Revises: 0007_job_queue
+Create Date: 2026-10-19 16:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_job_progress'
+down_revision = '0007_job_queue'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('progress', sqlite.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('cancel_requested', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_column('cancel_requested')
+        batch_op.drop_column('progress')
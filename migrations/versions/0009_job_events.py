@@ -0,0 +1,38 @@
+"""job progress events
+
+Revision ID: 0009_job_events
+Revises: 0008_job_progress
+Create Date: 2026-10-19 17:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_job_events'
+down_revision = '0008_job_progress'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('data', sqlite.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['job.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('job_event', schema=None) as batch_op:
+        batch_op.create_index('ix_job_event_job_id_id', ['job_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('job_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_job_event_job_id_id')
+
+    op.drop_table('job_event')
@@ -0,0 +1,39 @@
+import argparse
+import json
+from app import create_app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Dry run the sync: fetch and diff, then print the change plan as JSON. Nothing is written."
+    )
+    parser.add_argument("--store", help="store key (e.g. shop1); default: every configured store")
+    parser.add_argument("--product-id", help="plan a single product (numeric Shopify ID) instead of the whole store")
+    parser.add_argument("--action", choices=["populate", "delete"], default="populate",
+                        help="single-product path to plan (default: populate)")
+    parser.add_argument("--output", help="write the plan to this file instead of stdout")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        from app.routes.api import plan_single_product, plan_store_sync
+        from app.utils.helper import STORES, ShopifyGIDBuilder
+
+        if args.store and args.store not in STORES:
+            parser.error(f"unknown store '{args.store}' (configured: {', '.join(STORES)})")
+        store_keys = [args.store] if args.store else [key for key, store in STORES.items() if store.get("url")]
+        plans = {}
+        for key in store_keys:
+            store = STORES[key]
+            if args.product_id:
+                product_gid = ShopifyGIDBuilder("Product").build(args.product_id)
+                plan = plan_single_product(store, product_gid, action=args.action)
+            else:
+                plan = plan_store_sync(store)
+            plans[key] = {"store": store["name"], **plan.to_dict()}
+
+    output = json.dumps({"plans": plans}, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
@@ -0,0 +1,108 @@
+import argparse
+import signal
+import threading
+from datetime import datetime
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+from app import create_app
+from app.utils import metrics
+from app.utils.jobs import JobDispatcher, fail_orphaned_jobs, prune_events
+from app.utils.lease import OWNER, hold_lease
+from app.utils.log import get_logger
+
+log = get_logger("worker")
+
+LEADER_LEASE = "scheduler-leader"
+
+
+def start_scheduler(app):
+    from app.routes.api import sync_due_stores
+    scheduler = BackgroundScheduler()
+
+    # Wrap job inside app.app_context()
+    def job_wrapper():
+        with app.app_context():
+            sync_due_stores()
+
+    # Each store has its own adaptive interval (app/utils/schedule.py); this
+    # job only checks which stores are due, so it starts right away.
+    tick = app.config["SYNC_TICK_SECONDS"]
+    scheduler.add_job(
+        func=job_wrapper,
+        trigger=IntervalTrigger(seconds=tick),
+        id="sync_due_stores_job",
+        name=f"Sync due stores, checked every {tick}s",
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now(),
+    )
+
+    def fail_orphans():
+        with app.app_context():
+            failed = fail_orphaned_jobs()
+            if failed:
+                log.warning("Failed %d jobs left running by dead workers", failed)
+            prune_events()
+
+    scheduler.add_job(
+        func=fail_orphans,
+        trigger=IntervalTrigger(seconds=60),
+        id="fail_orphaned_jobs_job",
+        name="Fail jobs of dead workers, prune old job events",
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.start()
+    log.info("Scheduler started, checking for due stores every %ds", tick)
+    return scheduler
+
+
+def run(app, stop):
+    """Stand by until this process holds the leader lease, then run the scheduler.
+
+    Only the leader schedules syncs. If the lease is lost (e.g. the database
+    was unreachable long enough for it to expire) the scheduler stops and the
+    process goes back to standby.
+    """
+    ttl = app.config["LEASE_TTL_SECONDS"]
+    while not stop.is_set():
+        with app.app_context(), hold_lease(LEADER_LEASE, ttl) as held:
+            if held is None:
+                stop.wait(ttl / 3)
+                continue
+            log.info("%s is the scheduler leader", OWNER)
+            metrics.scheduler_leader.set(1)
+            scheduler = start_scheduler(app)
+            while not held.lost and not stop.wait(1):
+                pass
+            # Syncs themselves run as jobs; this only waits for a tick in progress
+            scheduler.shutdown(wait=True)
+            metrics.scheduler_leader.set(0)
+            log.info("Scheduler stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync worker: runs queued jobs and, in exactly one process, schedules the periodic store syncs.")
+    parser.add_argument("--once", action="store_true", help="sync every store once and exit")
+    args = parser.parse_args()
+
+    app = create_app()
+
+    if args.once:
+        with app.app_context():
+            from app.routes.api import loop_over_all_stores
+            loop_over_all_stores()
+    else:
+        stop = threading.Event()
+        metrics.scheduler_leader.set(0)
+        if app.config["METRICS_PORT"]:
+            metrics.serve(app.config["METRICS_PORT"], app)
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        # Every worker runs queued jobs; only the leader schedules periodic syncs
+        dispatcher = JobDispatcher(app)
+        dispatcher.start()
+        try:
+            run(app, stop)
+        finally:
+            dispatcher.stop()